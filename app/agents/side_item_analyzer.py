@@ -1,6 +1,5 @@
 import json
-import base64
-from ..utils.bedrock import get_bedrock_client
+from ..utils.bedrock import get_bedrock_client, build_image_block
 
 class SideItemAnalyzerAgent:
     """Analyzes the image to identify side items and accompaniments"""
@@ -8,10 +7,10 @@ class SideItemAnalyzerAgent:
     def __init__(self, bedrock_client=None):
         self.bedrock_client = bedrock_client or get_bedrock_client()
     
-    def analyze_sides(self, dish_name, image_bytes, chef_analysis):
+    def analyze_sides(self, dish_name, image_bytes, chef_analysis, image_uri=None):
         """Identify side items and accompaniments in the dish"""
-        # Encode image as base64
-        base64_string = base64.b64encode(image_bytes).decode('utf-8')
+        # Reference the stored image by URI when possible, otherwise inline it
+        image_block = build_image_block(image_bytes, image_uri)
         
         # Define system prompt
         system_list = [{
@@ -55,12 +54,7 @@ class SideItemAnalyzerAgent:
         message_list = [{
             "role": "user",
             "content": [
-                {
-                    "image": {
-                        "format": "jpeg",
-                        "source": {"bytes": base64_string}
-                    }
-                },
+                image_block,
                 {
                     "text": prompt_text
                 }
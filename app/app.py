@@ -1,8 +1,12 @@
+import io
 import os
-import json
 import uuid
+import hashlib
+import collections
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import datetime
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from PIL import Image
 import sys
 
@@ -10,14 +14,13 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import modules using direct imports
-from visionary_chef import VisionaryChefAgent
-from authenticator import AuthenticatorAgent
-from dietary_detective import DietaryDetectiveAgent
-from side_item_analyzer import SideItemAnalyzerAgent
-from culinary_wordsmith import CulinaryWordsmithAgent
+from orchestrator import OrchestratorAgent, skipped_result
+from circuit_breaker import CircuitOpenError
+from prompt_compaction import PromptCompactor
 from storage import StorageService
 import bedrock_utils
 import config
+from model_routing import router
 
 # Set page configuration
 st.set_page_config(
@@ -32,78 +35,110 @@ os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
 # Initialize services
 storage_service = StorageService()
 
-class OrchestratorAgent:
-    """Manages the workflow between specialized agents"""
-    
-    def __init__(self):
-        self.visionary_chef = VisionaryChefAgent()
-        self.authenticator = AuthenticatorAgent()
-        self.dietary_detective = DietaryDetectiveAgent()
-        self.side_item_analyzer = SideItemAnalyzerAgent()
-        self.culinary_wordsmith = CulinaryWordsmithAgent()
-        self.storage = StorageService()
+@st.cache_resource
+def get_orchestrator():
+    """One orchestrator (and Bedrock client) per process, shared across sessions"""
+    return OrchestratorAgent()
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_upload(image_bytes):
+    """Hash and thumbnail an uploaded image once per upload"""
+    image = Image.open(io.BytesIO(image_bytes))
+    image.thumbnail((800, 800))
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=85)
+    return hashlib.sha256(image_bytes).hexdigest(), buffer.getvalue()
+
+# Stage results are cached per (image hash, dish name, spice level) so
+# repeating a request does no Bedrock work. Underscored arguments are not
+# part of the cache key.
+@st.cache_data(show_spinner=False, max_entries=256)
+def run_visionary_chef(image_hash, dish_name, spice_level, _image_bytes):
+    # A resized or recompressed re-upload of an analyzed photo reuses its analysis
+    chef_analysis, fingerprint = get_orchestrator().cached_analysis(_image_bytes, dish_name)
+    if chef_analysis is None:
+        chef_analysis = get_orchestrator().visionary_chef.analyze_image(dish_name, _image_bytes)
+        get_orchestrator().remember_analysis(fingerprint, chef_analysis)
+    chef_analysis["spice_level"] = spice_level
+    chef_analysis["dish_name"] = dish_name
+    return chef_analysis
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def run_authenticator(image_hash, dish_name, spice_level, _chef_analysis):
+    return get_orchestrator().authenticator.validate_name(
+        dish_name, _chef_analysis, compactor=PromptCompactor(_chef_analysis)
+    )
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def run_dietary_detective(image_hash, dish_name, spice_level, _chef_analysis):
+    return get_orchestrator().dietary_detective.analyze_dietary(
+        _chef_analysis, compactor=PromptCompactor(_chef_analysis)
+    )
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def run_side_item_analyzer(image_hash, dish_name, spice_level, _image_bytes, _chef_analysis):
+    return get_orchestrator().side_item_analyzer.analyze_sides(
+        dish_name, _image_bytes, _chef_analysis, compactor=PromptCompactor(_chef_analysis)
+    )
+
+@st.cache_resource
+def description_cache():
+    """Finished descriptions by (image hash, dish name, spice level, refined name).
+
+    Descriptions are streamed onto the page as they are written, which
+    st.cache_data cannot wrap, so they are kept here once complete.
+    """
+    return collections.OrderedDict()
+
+def stream_culinary_wordsmith(placeholder, image_hash, dish_name, spice_level, refined_name, chef_analysis, dietary_analysis, sides_analysis):
+    """Write the description into placeholder as it streams; return the final text"""
+    cache = description_cache()
+    key = (image_hash, dish_name, spice_level, refined_name)
+    if key in cache:
+        return cache[key]
     
-    def process_dish(self, dish_name, image_bytes, spice_level="Medium"):
-        """Process a dish through the entire agent pipeline"""
-        workflow_id = str(uuid.uuid4())
-        
-        # Step 1: Save the image
-        image_path = self.storage.save_image(image_bytes, workflow_id)
-        
-        # Step 2: Analyze the image with the Visionary Chef
-        chef_analysis = self.visionary_chef.analyze_image(dish_name, image_bytes)
-        chef_analysis["spice_level"] = spice_level
-        
-        # Check if the image contains food
-        if not chef_analysis.get("is_food", True):
-            return {
-                "error": "The uploaded image does not appear to contain food. Please upload an image of a food dish."
-            }
-        
-        # Step 3: Validate the dish name with the Authenticator
-        auth_result = self.authenticator.validate_name(dish_name, chef_analysis)
-        
-        # Step 4: Analyze dietary aspects with the Dietary Detective
-        dietary_analysis = self.dietary_detective.analyze_dietary(chef_analysis)
-        
-        # Step 5: Analyze side items with the Side Item Analyzer
-        sides_analysis = self.side_item_analyzer.analyze_sides(dish_name, image_bytes, chef_analysis)
-        
-        # Step 6: Generate the description with the Culinary Wordsmith
-        description = self.culinary_wordsmith.generate_description(
-            auth_result["suggested_name"], 
-            chef_analysis, 
+    description = ""
+    try:
+        for chunk in get_orchestrator().culinary_wordsmith.stream_description(
+            refined_name,
+            chef_analysis,
             dietary_analysis,
-            sides_analysis
-        )
-        
-        # Compile the final result
-        result = {
-            "dish_id": workflow_id,
-            "input_name": dish_name,
-            "processed_timestamp": datetime.datetime.now().isoformat(),
-            "refined_name": auth_result["suggested_name"],
-            "generated_description": description,
-            "validation": {
-                "status": auth_result["validation_status"],
-                "notes": auth_result.get("reason", "")
-            },
-            "dietary_analysis": {
-                "allergens": dietary_analysis["allergens"],
-                "potential_allergens": dietary_analysis.get("potential_allergens", []),
-                "tags": dietary_analysis["dietary_tags"],
-                "disclaimer": dietary_analysis["disclaimer"]
-            },
-            "sides_analysis": {
-                "main_dish_components": sides_analysis.get("main_dish_components", []),
-                "side_items": sides_analysis.get("side_items", []),
-                "sauces_and_garnishes": sides_analysis.get("sauces_and_garnishes", []),
-                "presentation_notes": sides_analysis.get("presentation_notes", "")
-            },
-            "identified_components": chef_analysis["items"]
-        }
-        
-        return result
+            sides_analysis,
+            compactor=PromptCompactor(chef_analysis)
+        ):
+            description += chunk
+            placeholder.markdown(f"*{description}▌*")
+    except CircuitOpenError:
+        # Not cached, so the next run tries again
+        return ""
+    description = description.strip()
+    
+    cache[key] = description
+    while len(cache) > 256:
+        cache.popitem(last=False)
+    return description
+
+def render_authenticator(auth_result):
+    with st.expander("✅ Authenticator Result", expanded=False):
+        st.write(f"Validation Status: {auth_result['validation_status']}")
+        if auth_result.get("reason"):
+            st.write(f"Reason: {auth_result['reason']}")
+        st.write(f"Suggested Name: {auth_result['suggested_name']}")
+
+def render_dietary_detective(dietary_analysis):
+    with st.expander("🍽️ Dietary Analysis", expanded=False):
+        if dietary_analysis["allergens"]:
+            st.write("Allergens:", ", ".join(dietary_analysis["allergens"]))
+        else:
+            st.write("No major allergens detected")
+        st.write("Dietary Tags:", ", ".join(dietary_analysis["dietary_tags"]))
+
+def render_side_item_analyzer(sides_analysis):
+    with st.expander("🍽️ Side Item Analysis", expanded=False):
+        if sides_analysis.get("main_dish_components"):
+            st.write("Main Dish Components:", ", ".join(sides_analysis["main_dish_components"][:3]))
+        if sides_analysis.get("side_items"):
+            st.write("Side Items:", ", ".join([item["name"] for item in sides_analysis["side_items"][:3]]))
 
 def main():
     # App title and description
@@ -118,6 +153,23 @@ def main():
     st.sidebar.text(f"Environment: {config.ENVIRONMENT}")
     st.sidebar.text(f"AWS Region: {config.AWS_REGION}")
     st.sidebar.text(f"Model ID: {config.BEDROCK_MODEL_ID}")
+    with st.sidebar.expander("Model routes"):
+        st.json({"routes": router.routes, "metrics": bedrock_utils.get_metrics()})
+    
+    # Dishes processed before, looked up in the results store
+    if config.RESULTS_STORE_ENABLED:
+        with st.sidebar.expander("Saved dishes"):
+            search_restaurant = st.text_input("Restaurant name", key="search_restaurant")
+            search_tags = st.text_input("Dietary tags", placeholder="gluten-free, vegetarian", key="search_tags")
+            search_free_of = st.text_input("Free of allergens", placeholder="tree nuts, peanuts", key="search_free_of")
+            dishes = get_orchestrator().find_results(
+                restaurant=search_restaurant or None,
+                tags=[tag.strip() for tag in search_tags.split(",") if tag.strip()],
+                free_of=[allergen.strip() for allergen in search_free_of.split(",") if allergen.strip()]
+            )
+            st.caption(f"{len(dishes)} dishes")
+            for dish in dishes:
+                st.markdown(f"**{dish['refined_name']}**  \n{', '.join(dish['dietary_analysis'].get('dietary_tags', []))}")
     
     # Initialize session state
     if 'result' not in st.session_state:
@@ -131,6 +183,9 @@ def main():
     with col1:
         st.subheader("Dish Information")
         
+        # Restaurant the dish is saved under in the results store
+        restaurant = st.text_input("Restaurant", placeholder="Optional: the restaurant whose menu this dish is on")
+        
         # Dish description input
         dish_name = st.text_input("Dish Description", placeholder="Describe your dish in a few words (e.g., House Burger with caramelized onions)")
         
@@ -139,9 +194,9 @@ def main():
         uploaded_file = st.file_uploader("Upload an image of your dish", type=["jpg", "jpeg", "png"])
         
         if uploaded_file is not None:
-            # Display the uploaded image
-            image = Image.open(uploaded_file)
-            st.image(image, caption="Uploaded Dish Image", width=None)
+            # Display the uploaded image (decoded once per upload)
+            image_hash, thumbnail = load_upload(uploaded_file.getvalue())
+            st.image(thumbnail, caption="Uploaded Dish Image", width=None)
         
         # Spice level
         st.subheader("Spice Level")
@@ -155,14 +210,23 @@ def main():
             # Get image bytes
             image_bytes = uploaded_file.getvalue()
             
-            # Create orchestrator and process the dish
-            orchestrator = OrchestratorAgent()
+            # Turn away blurry, dark or tiny photos before any Bedrock call
+            quality = get_orchestrator().check_quality(image_bytes)
+            if quality is not None:
+                if not quality["passed"]:
+                    for message in quality["messages"]:
+                        st.error(f"⚠️ {message}")
+                    st.stop()
+                for message in quality["messages"]:
+                    st.warning(f"⚠️ {message}")
             
             # Step 1: Analyze the image with the Visionary Chef
             with st.spinner("🧑‍🍳 Visionary Chef is analyzing the image..."):
-                chef_analysis = orchestrator.visionary_chef.analyze_image(dish_name, image_bytes)
-                chef_analysis["spice_level"] = spice_level
-                chef_analysis["dish_name"] = dish_name
+                try:
+                    chef_analysis = run_visionary_chef(image_hash, dish_name, spice_level, image_bytes)
+                except CircuitOpenError as e:
+                    st.error(f"⚠️ Image analysis is temporarily unavailable. Please try again in {e.retry_after:.0f} seconds.")
+                    st.stop()
                 
                 # Check if the image contains food
                 if not chef_analysis.get("is_food", True):
@@ -179,66 +243,90 @@ def main():
                     if len(chef_analysis["items"]) > 5:
                         st.write(f"...and {len(chef_analysis['items']) - 5} more items")
             
-            # Step 2: Validate the dish name with the Authenticator
-            with st.spinner("🔍 Authenticator is validating the dish description..."):
-                auth_result = orchestrator.authenticator.validate_name(dish_name, chef_analysis)
-                
-                # Show validation result
-                with st.expander("✅ Authenticator Result", expanded=False):
-                    st.write(f"Validation Status: {auth_result['validation_status']}")
-                    if auth_result.get("reason"):
-                        st.write(f"Reason: {auth_result['reason']}")
-                    st.write(f"Suggested Name: {auth_result['suggested_name']}")
+            # Steps 2-4 only depend on the chef analysis, so run them concurrently
+            # and fill each panel as soon as its agent returns
+            stages = {
+                "authenticator": ("🔍 Authenticator is validating the dish description...", render_authenticator,
+                                  run_authenticator, (image_hash, dish_name, spice_level, chef_analysis)),
+                "dietary_detective": ("🥗 Dietary Detective is identifying allergens and dietary tags...", render_dietary_detective,
+                                      run_dietary_detective, (image_hash, dish_name, spice_level, chef_analysis)),
+                "side_item_analyzer": ("🍟 Side Item Analyzer is identifying accompaniments...", render_side_item_analyzer,
+                                       run_side_item_analyzer, (image_hash, dish_name, spice_level, image_bytes, chef_analysis)),
+            }
+            # A near-identical dish seen before lends its validation and dietary analysis
+            reused = get_orchestrator().reusable_results(dish_name, chef_analysis)
+            placeholders = {}
+            results = {}
+            for stage, (waiting_text, render, _, _) in stages.items():
+                placeholders[stage] = st.empty()
+                if stage in reused:
+                    results[stage] = reused[stage]
+                    with placeholders[stage].container():
+                        render(results[stage])
+                else:
+                    placeholders[stage].info(waiting_text)
+            pending = {stage: spec for stage, spec in stages.items() if stage not in reused}
+            skipped_stages = []
             
-            # Step 3: Analyze dietary aspects with the Dietary Detective
-            with st.spinner("🥗 Dietary Detective is identifying allergens and dietary tags..."):
-                dietary_analysis = orchestrator.dietary_detective.analyze_dietary(chef_analysis)
-                
-                # Show dietary analysis preview
-                with st.expander("🍽️ Dietary Analysis", expanded=False):
-                    if dietary_analysis["allergens"]:
-                        st.write("Allergens:", ", ".join(dietary_analysis["allergens"]))
-                    else:
-                        st.write("No major allergens detected")
-                    st.write("Dietary Tags:", ", ".join(dietary_analysis["dietary_tags"]))
+            # Worker threads share this script run's context so the stage caches work
+            ctx = get_script_run_ctx()
+            with ThreadPoolExecutor(max_workers=len(pending), initializer=add_script_run_ctx, initargs=(None, ctx)) as executor:
+                futures = {executor.submit(run, *args): stage for stage, (_, _, run, args) in pending.items()}
+                for future in as_completed(futures):
+                    stage = futures[future]
+                    try:
+                        results[stage] = future.result()
+                    except CircuitOpenError:
+                        # The stage's model is failing; show a degraded result instead of waiting
+                        results[stage] = skipped_result(stage, dish_name, "model temporarily unavailable")
+                        skipped_stages.append(stage)
+                    with placeholders[stage].container():
+                        stages[stage][1](results[stage])
+            auth_result = results["authenticator"]
+            dietary_analysis = results["dietary_detective"]
+            sides_analysis = results["side_item_analyzer"]
+            get_orchestrator().remember_results(dish_name, chef_analysis, {
+                stage: results[stage] for stage in ("authenticator", "dietary_detective") if stage not in reused
+            })
             
-            # Step 4: Analyze side items with the Side Item Analyzer
-            with st.spinner("🍟 Side Item Analyzer is identifying accompaniments..."):
-                sides_analysis = orchestrator.side_item_analyzer.analyze_sides(dish_name, image_bytes, chef_analysis)
-                
-                # Show sides analysis preview
-                with st.expander("🍽️ Side Item Analysis", expanded=False):
-                    if sides_analysis.get("main_dish_components"):
-                        st.write("Main Dish Components:", ", ".join(sides_analysis["main_dish_components"][:3]))
-                    if sides_analysis.get("side_items"):
-                        st.write("Side Items:", ", ".join([item["name"] for item in sides_analysis["side_items"][:3]]))
+            # Step 5: Stream the description from the Culinary Wordsmith
+            st.markdown("✍️ **Culinary Wordsmith**")
+            description_placeholder = st.empty()
+            description_placeholder.info("✍️ Culinary Wordsmith is crafting the perfect description...")
+            description = stream_culinary_wordsmith(
+                description_placeholder,
+                image_hash,
+                dish_name,
+                spice_level,
+                auth_result["suggested_name"],
+                chef_analysis,
+                dietary_analysis,
+                sides_analysis
+            )
+            if description:
+                description_placeholder.markdown(f"*{description}*")
+            else:
+                description_placeholder.warning("⚠️ The description service is temporarily unavailable. Please try again shortly.")
             
-            # Step 5: Generate the description with the Culinary Wordsmith
-            with st.spinner("✍️ Culinary Wordsmith is crafting the perfect description..."):
-                description = orchestrator.culinary_wordsmith.generate_description(
-                    auth_result["suggested_name"], 
-                    chef_analysis, 
-                    dietary_analysis,
-                    sides_analysis
-                )
-                
-                # Compile the final result
-                result = {
-                    "dish_id": str(uuid.uuid4()),
-                    "input_name": dish_name,
-                    "processed_timestamp": datetime.datetime.now().isoformat(),
-                    "refined_name": auth_result["suggested_name"],
-                    "generated_description": description,
-                    "validation": {
-                        "status": auth_result["validation_status"],
-                        "notes": auth_result.get("reason", "")
-                    },
-                    "dietary_analysis": dietary_analysis,
-                    "sides_analysis": sides_analysis,
-                    "identified_components": chef_analysis["items"]
-                }
-                
-                st.session_state.result = result
+            # Compile the final result
+            result = {
+                "dish_id": str(uuid.uuid4()),
+                "input_name": dish_name,
+                "processed_timestamp": datetime.datetime.now().isoformat(),
+                "refined_name": auth_result["suggested_name"],
+                "generated_description": description,
+                "validation": {
+                    "status": auth_result["validation_status"],
+                    "notes": auth_result.get("reason", "")
+                },
+                "dietary_analysis": dietary_analysis,
+                "sides_analysis": sides_analysis,
+                "identified_components": chef_analysis["items"],
+                "skipped_stages": skipped_stages
+            }
+            
+            st.session_state.result = result
+            get_orchestrator().store_results([result], restaurant)
     
     with col2:
         st.subheader("Generated Menu Content")
@@ -344,7 +432,7 @@ def main():
                     
                     with st.spinner("Regenerating description based on your feedback..."):
                         # Get the orchestrator
-                        orchestrator = OrchestratorAgent()
+                        orchestrator = get_orchestrator()
                         
                         # Regenerate the description using the Culinary Wordsmith
                         new_description = orchestrator.culinary_wordsmith.generate_description(
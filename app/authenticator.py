@@ -1,5 +1,28 @@
 import json
-from bedrock_utils import get_bedrock_client
+import textwrap
+from prompt_compaction import PromptCompactor
+from prompt_cache import CACHE_POINT
+from bedrock_utils import get_bedrock_client, invoke_nova, extract_json
+
+# Instructions shared by every dish; sent ahead of the dish so they can be cached
+AUTHENTICATOR_GUIDELINES = textwrap.dedent("""
+    You will be given a dish name and the components identified in its image at the end of this message.
+    
+    IMPORTANT GUIDELINES:
+    1. Focus ONLY on the main dish type (e.g., if it's a burger, pizza, salad, pupusa, etc.)
+    2. ALWAYS trust user-provided details that cannot be easily verified from the image (like fillings, seasonings, cooking methods)
+    3. For example, if user says "Chicken Pupusas" and you see pupusas but can't verify the filling, CONFIRM the match
+    4. Only flag a "Mismatch" if the fundamental dish type is completely wrong (e.g., user says "Pizza" but image clearly shows "Soup")
+    5. If the description is too generic, suggest a more descriptive name based on the primary ingredients
+    6. When in doubt, CONFIRM the match and trust the user's description
+    
+    Format your response as a JSON object with the following structure:
+    {
+        "validation_status": "Confirmed" or "Mismatch",
+        "reason": "Explanation if there's a mismatch or empty string if confirmed",
+        "suggested_name": "Original or improved dish name"
+    }
+""").strip()
 
 class AuthenticatorAgent:
     """Validates that the dish description aligns with the main visual evidence"""
@@ -7,44 +30,49 @@ class AuthenticatorAgent:
     def __init__(self, bedrock_client=None):
         self.bedrock_client = bedrock_client or get_bedrock_client()
     
-    def validate_name(self, dish_name, chef_analysis):
+    def _is_clear_verdict(self, result_text):
+        """Whether a reply parses and gives a definite validation status"""
+        parsed = extract_json(result_text)
+        return parsed.get("validation_status") in ("Confirmed", "Mismatch") and bool(parsed.get("suggested_name"))
+    
+    def validate_name(self, dish_name, chef_analysis, compactor=None):
         """Validate the dish description against the identified components"""
-        # Define system prompt
+        request_body = self.build_request(dish_name, chef_analysis, compactor)
+        
+        # Call the Bedrock API; a cheap model's answer is re-asked on the
+        # escalation model if it is not a clear verdict
+        result_text = invoke_nova(self.bedrock_client, request_body, "authenticator", accept=self._is_clear_verdict)
+        
+        return self.parse_response(result_text, dish_name)
+    
+    def build_request(self, dish_name, chef_analysis, compactor=None):
+        """Build the Nova request payload for a name validation"""
+        # Define system prompt; it and the guidelines are identical for every
+        # dish, so both end in a prompt-cache checkpoint
         system_list = [{
             "text": "You are the Authenticator, a quality control expert for food menus. "
                     "Your task is to validate that the main dish type in the user's description is visible in the image. "
                     "Trust user-provided details that cannot be visually verified (like fillings, cooking methods, or ingredients). "
                     "Only flag major mismatches where the fundamental dish type is completely wrong."
-        }]
+        }, CACHE_POINT]
         
-        # Convert chef analysis to a string representation
-        chef_analysis_str = json.dumps(chef_analysis, indent=2)
+        # Serialize only the fields this stage uses, without pretty-print whitespace
+        compactor = compactor or PromptCompactor(chef_analysis)
         
-        # Define user message
-        prompt_text = f"""
+        # Define user message: static guidelines first, then this dish
+        prompt_text = compactor.build_prompt("authenticator", lambda chef_analysis_str: f"""
         Validate whether the main dish type in "{dish_name}" is visible in the identified components:
         
         {chef_analysis_str}
-        
-        IMPORTANT GUIDELINES:
-        1. Focus ONLY on the main dish type (e.g., if it's a burger, pizza, salad, pupusa, etc.)
-        2. ALWAYS trust user-provided details that cannot be easily verified from the image (like fillings, seasonings, cooking methods)
-        3. For example, if user says "Chicken Pupusas" and you see pupusas but can't verify the filling, CONFIRM the match
-        4. Only flag a "Mismatch" if the fundamental dish type is completely wrong (e.g., user says "Pizza" but image clearly shows "Soup")
-        5. If the description is too generic, suggest a more descriptive name based on the primary ingredients
-        6. When in doubt, CONFIRM the match and trust the user's description
-        
-        Format your response as a JSON object with the following structure:
-        {{
-            "validation_status": "Confirmed" or "Mismatch",
-            "reason": "Explanation if there's a mismatch or empty string if confirmed",
-            "suggested_name": "Original or improved dish name"
-        }}
-        """
+        """, static_text=AUTHENTICATOR_GUIDELINES)
         
         message_list = [{
             "role": "user",
             "content": [
+                {
+                    "text": AUTHENTICATOR_GUIDELINES
+                },
+                CACHE_POINT,
                 {
                     "text": prompt_text
                 }
@@ -67,16 +95,10 @@ class AuthenticatorAgent:
             "inferenceConfig": inf_params
         }
         
-        # Call the Bedrock API
-        response = self.bedrock_client.invoke_model(
-            modelId="us.amazon.nova-pro-v1:0",
-            body=json.dumps(request_body)
-        )
-        
-        # Parse the response
-        response_body = json.loads(response['body'].read())
-        result_text = response_body["output"]["message"]["content"][0]["text"]
-        
+        return request_body
+    
+    def parse_response(self, result_text, dish_name):
+        """Parse a validation reply, falling back to the input name"""
         # Extract JSON from the response
         try:
             # Find JSON content between triple backticks if present
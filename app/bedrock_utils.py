@@ -1,10 +1,24 @@
 import os
-import boto3
+import json
+import time
+import base64
 import config
+from budget import charge_active
+from model_routing import router
+from hedging import hedger
+import single_flight
+import prompt_cache
+from circuit_breaker import breakers, CircuitOpenError
 
-def get_bedrock_client():
-    """Get a Bedrock client based on the current environment"""
-    region = config.AWS_REGION
+_region_pool = None
+
+# Identical requests already in flight share one Bedrock call
+_invocations = single_flight.SingleFlight("invoke")
+
+def _region_client(region):
+    """Create a bedrock-runtime client for one region"""
+    # boto3 is imported on first use so importing the agents stays cheap
+    import boto3
     
     # Check if running in AWS environment
     if os.environ.get("AWS_EXECUTION_ENV") or os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
@@ -17,4 +31,181 @@ def get_bedrock_client():
             region_name=region,
             aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
             aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY")
-        )
\ No newline at end of file
+        )
+
+def get_bedrock_client():
+    """Get a Bedrock client based on the current environment.
+
+    With more than one region in BEDROCK_REGIONS this is a shared
+    RegionClientPool that routes each call to the fastest healthy region.
+    """
+    global _region_pool
+    if len(config.BEDROCK_REGIONS) > 1:
+        if _region_pool is None:
+            from region_pool import RegionClientPool
+            _region_pool = RegionClientPool.from_regions(config.BEDROCK_REGIONS, _region_client)
+        return _region_pool
+    return _region_client(config.AWS_REGION)
+
+def build_image_block(image_bytes=None, image_uri=None, image_format="jpeg"):
+    """Build a Nova image content block for the request payload.
+
+    Images already stored in S3 are referenced by URI (``s3Location``) so the
+    bytes never pass through this process; anything else is sent inline as
+    base64. Set IMAGE_PAYLOAD_MODE=inline to always send bytes.
+    """
+    if image_uri and image_uri.startswith("s3://") and config.IMAGE_PAYLOAD_MODE != "inline":
+        s3_location = {"uri": image_uri}
+        if config.S3_BUCKET_OWNER:
+            s3_location["bucketOwner"] = config.S3_BUCKET_OWNER
+        source = {"s3Location": s3_location}
+    elif image_bytes is None:
+        # Local mode with only a path: fall back to inline bytes
+        from storage import StorageService
+        with StorageService().open_image(image_uri) as buffer:
+            source = {"bytes": base64.b64encode(buffer).decode('utf-8')}
+    else:
+        source = {"bytes": base64.b64encode(image_bytes).decode('utf-8')}
+    
+    return {
+        "image": {
+            "format": image_format,
+            "source": source
+        }
+    }
+
+def extract_json(result_text):
+    """Extract the JSON object from a model reply, fenced or bare"""
+    if "```json" in result_text:
+        json_str = result_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in result_text:
+        json_str = result_text.split("```")[1].strip()
+    else:
+        start_idx = result_text.find('{')
+        end_idx = result_text.rfind('}') + 1
+        if start_idx >= 0 and end_idx > start_idx:
+            json_str = result_text[start_idx:end_idx]
+        else:
+            raise ValueError("Could not extract JSON from response")
+    return json.loads(json_str)
+
+def _call_model(bedrock_client, operation, model_id, body):
+    """Call a bedrock-runtime operation through the circuit breaker of its model and region.
+    A response stream counts against the breaker until its last event is read"""
+    def send():
+        return getattr(bedrock_client, operation)(modelId=model_id, body=body)
+    
+    if hasattr(bedrock_client, "ranked_regions"):
+        # A RegionClientPool checks the breaker of each region it tries
+        return send()
+    region = getattr(getattr(bedrock_client, "meta", None), "region_name", None) or config.AWS_REGION
+    if operation == "invoke_model_with_response_stream":
+        return breakers.stream(model_id, region, send)
+    return breakers.call(model_id, region, send)
+
+def _invoke(bedrock_client, request_body, agent, model_id):
+    """Send one request to a specific model and return the reply text"""
+    # Models without prompt caching get the request without cache checkpoints
+    body = json.dumps(prompt_cache.for_model(request_body, model_id))
+    
+    def send():
+        response = _call_model(bedrock_client, "invoke_model", model_id, body)
+        # Parse the response
+        return json.loads(response['body'].read())
+    
+    # A slow call may be hedged with a duplicate (see hedging.RequestHedger)
+    started = time.perf_counter()
+    response_body, shared = _invocations.do(
+        (model_id, single_flight.digest(body)),
+        lambda: hedger.call((agent, model_id), send)
+    )
+    # A follower's usage belongs to the leader's call
+    usage = {} if shared else response_body.get("usage", {})
+    router.record_call(agent, model_id, time.perf_counter() - started, usage)
+    if not shared:
+        charge_active(usage)
+    return response_body["output"]["message"]["content"][0]["text"]
+
+def invoke_nova_stream(bedrock_client, request_body, agent):
+    """Invoke the model routed for an agent stage, yielding reply text as it streams.
+
+    Streamed calls are not hedged, coalesced or escalated; usage from the
+    final metadata event is charged to the active workflow budget, and the
+    time to the first text chunk is recorded on the route.
+    """
+    model_id = router.model_for(agent)
+    started = time.perf_counter()
+    response = _call_model(
+        bedrock_client,
+        "invoke_model_with_response_stream",
+        model_id,
+        json.dumps(prompt_cache.for_model(request_body, model_id))
+    )
+    
+    usage = {}
+    first_token_latency = None
+    for event in response["body"]:
+        if "chunk" not in event:
+            continue
+        chunk = json.loads(event["chunk"]["bytes"])
+        text = chunk.get("contentBlockDelta", {}).get("delta", {}).get("text")
+        if text:
+            if first_token_latency is None:
+                first_token_latency = time.perf_counter() - started
+            yield text
+        if "metadata" in chunk:
+            usage = chunk["metadata"].get("usage", {})
+            charge_active(usage)
+    router.record_call(agent, model_id, time.perf_counter() - started, usage, first_token_latency)
+
+def invoke_nova(bedrock_client, request_body, agent, accept=None):
+    """Invoke the model routed for an agent stage and return the reply text.
+
+    When ``accept`` rejects a cheaper model's reply, the request is re-sent to
+    the escalation model. Token usage reported by Bedrock is charged to the
+    active workflow budget.
+    """
+    model_id = router.model_for(agent)
+    result_text = _invoke(bedrock_client, request_body, agent, model_id)
+    
+    if accept is not None:
+        try:
+            accepted = accept(result_text)
+        except Exception:
+            accepted = False
+        if router.should_escalate(model_id, accepted):
+            router.record_escalation(agent, model_id)
+            try:
+                result_text = _invoke(bedrock_client, request_body, agent, router.escalation_model)
+            except CircuitOpenError as e:
+                # Keep the cheaper answer rather than fail the stage
+                print(f"Not escalating {agent}: {str(e)}")
+    
+    return result_text
+
+def get_metrics():
+    """Invocation metrics: per-route calls/latency/escalations, hedging, region health,
+    coalesced calls, circuit breaker states, calls saved by the semantic and vision caches,
+    photos turned away by the image quality gate, ingredient names normalized,
+    results store writes and queries, menu index size and query time and menu exports"""
+    import ingredients
+    import menu_index
+    import menu_export
+    import results_store
+    import semantic_cache
+    import vision_cache
+    import image_quality
+    return {
+        "routes": router.stats(),
+        "hedging": hedger.stats(),
+        "regions": _region_pool.stats() if _region_pool is not None else {},
+        "single_flight": single_flight.stats(),
+        "circuit_breakers": breakers.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "vision_cache": vision_cache.stats(),
+        "image_quality": image_quality.stats(),
+        "ingredients": ingredients.stats(),
+        "results_store": results_store.stats(),
+        "menu_index": menu_index.stats(),
+        "menu_export": menu_export.stats()
+    }
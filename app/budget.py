@@ -0,0 +1,121 @@
+import time
+import threading
+import contextlib
+import contextvars
+import config
+
+# Rough per-stage cost used to decide whether a stage still fits the budget.
+# Image stages include ~1.5k tokens for the image itself.
+STAGE_ESTIMATES = {
+    "visionary_chef": {"tokens": 3500, "calls": 2},
+    "authenticator": {"tokens": 1200, "calls": 1},
+    "dietary_detective": {"tokens": 1800, "calls": 1},
+    "side_item_analyzer": {"tokens": 2800, "calls": 1},
+    "culinary_wordsmith": {"tokens": 1800, "calls": 1},
+    # process_plate's one detection call, made before any dish workflow starts
+    "plate_splitter": {"tokens": 2000, "calls": 1},
+}
+
+# Smallest Wordsmith output worth asking for when the budget is tight
+MIN_DESCRIPTION_TOKENS = 120
+
+_active_budget = contextvars.ContextVar("workflow_budget", default=None)
+
+def charge_active(usage):
+    """Charge a Bedrock response's token usage to the budget active in this context"""
+    budget = _active_budget.get()
+    if budget is not None:
+        budget.charge(usage.get("inputTokens", 0), usage.get("outputTokens", 0))
+
+class WorkflowBudget:
+    """Token, wall-clock and call limits for one process_dish workflow.
+
+    A limit of 0 means unlimited. The orchestrator checks the budget between
+    stages and degrades (skips optional stages, caps output) as it runs short.
+    """
+
+    def __init__(self, max_tokens=None, max_seconds=None, max_calls=None):
+        self.max_tokens = config.WORKFLOW_MAX_TOKENS if max_tokens is None else max_tokens
+        self.max_seconds = config.WORKFLOW_MAX_SECONDS if max_seconds is None else max_seconds
+        self.max_calls = config.WORKFLOW_MAX_CALLS if max_calls is None else max_calls
+        self.started_at = time.monotonic()
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.calls = 0
+        self.degradations = []
+        self._lock = threading.Lock()
+
+    @property
+    def tokens_used(self):
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def charge(self, input_tokens=0, output_tokens=0, calls=1):
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.calls += calls
+
+    def remaining_tokens(self):
+        """Tokens left, or None if unlimited"""
+        if not self.max_tokens:
+            return None
+        return max(self.max_tokens - self.tokens_used, 0)
+
+    def exhausted(self):
+        return not self.can_afford(tokens=1, calls=1)
+
+    def can_afford(self, tokens=0, calls=1, reserve=()):
+        """Whether a stage costing ``tokens``/``calls`` fits, keeping room for the ``reserve`` stages"""
+        for stage in reserve:
+            tokens += STAGE_ESTIMATES[stage]["tokens"]
+            calls += STAGE_ESTIMATES[stage]["calls"]
+        if self.max_tokens and self.tokens_used + tokens > self.max_tokens:
+            return False
+        if self.max_calls and self.calls + calls > self.max_calls:
+            return False
+        if self.max_seconds and self.elapsed >= self.max_seconds:
+            return False
+        return True
+
+    def can_afford_stage(self, stage, reserve=()):
+        estimate = STAGE_ESTIMATES[stage]
+        return self.can_afford(estimate["tokens"], estimate["calls"], reserve)
+
+    def output_token_cap(self, stage, default):
+        """Cap a stage's maxTokens to what is left after its estimated input"""
+        remaining = self.remaining_tokens()
+        if remaining is None:
+            return default
+        input_estimate = STAGE_ESTIMATES[stage]["tokens"] - default
+        return max(min(default, remaining - input_estimate), 0)
+
+    def degrade(self, action):
+        self.degradations.append(action)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Charge Bedrock calls made in this context to this budget"""
+        token = _active_budget.set(self)
+        try:
+            yield self
+        finally:
+            _active_budget.reset(token)
+
+    def report(self):
+        return {
+            "tokens_used": self.tokens_used,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "calls": self.calls,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "limits": {
+                "max_tokens": self.max_tokens,
+                "max_seconds": self.max_seconds,
+                "max_calls": self.max_calls
+            },
+            "degradations": list(self.degradations)
+        }
@@ -0,0 +1,380 @@
+import os
+import json
+import time
+import uuid
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+import config
+import prompt_cache
+from storage import StorageService
+from prompt_compaction import PromptCompactor
+from model_routing import router
+
+# Stages grouped into waves: every stage in a wave only needs results from
+# earlier waves, so a whole menu advances one wave (one batch job per model)
+# at a time.
+WAVES = [
+    ("food_check", "visionary_chef"),
+    ("authenticator", "dietary_detective", "side_item_analyzer"),
+    ("culinary_wordsmith",),
+]
+
+def reply_text(record):
+    """Reply text of one batch output record, or None if the record failed"""
+    try:
+        return record["modelOutput"]["output"]["message"]["content"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+class LocalBatchSubmitter:
+    """Runs a batch job in-process against a bedrock-runtime client.
+
+    Reads the staged input JSONL, answers each record with invoke_model and
+    writes the output JSONL in the batch-inference output format. Used for
+    local runs (with a fake client) and for menus too small for a real job.
+    """
+
+    def __init__(self, bedrock_client, storage=None):
+        self.bedrock_client = bedrock_client
+        self.storage = storage or StorageService()
+
+    def submit(self, job_name, model_id, input_uri, output_prefix):
+        """Run the job and return the path/URL of its output file"""
+        lines = []
+        for line in self.storage.get_file(input_uri).decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            try:
+                response = self.bedrock_client.invoke_model(
+                    modelId=model_id,
+                    body=json.dumps(record["modelInput"])
+                )
+                record["modelOutput"] = json.loads(response["body"].read())
+            except Exception as e:
+                record["error"] = {"errorMessage": str(e)}
+            lines.append(json.dumps(record))
+
+        output_key = f"{output_prefix}/{job_name}/{os.path.basename(input_uri)}.out"
+        return self.storage.save_file(("\n".join(lines) + "\n").encode("utf-8"), output_key)
+
+class BedrockBatchSubmitter:
+    """Submits a Bedrock batch inference job and waits for it to finish.
+
+    Needs S3 storage (USE_S3) and a service role that can read and write the
+    bucket (BATCH_ROLE_ARN). Bedrock requires a minimum number of records per
+    job (100 at the time of writing); smaller menus should use the
+    interactive path or LocalBatchSubmitter.
+    """
+
+    def __init__(self, role_arn=None, poll_seconds=None, bedrock_client=None, storage=None):
+        self.role_arn = role_arn or config.BATCH_ROLE_ARN
+        self.poll_seconds = config.BATCH_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self.storage = storage or StorageService()
+        if bedrock_client is None:
+            import boto3
+            bedrock_client = boto3.client("bedrock", region_name=config.AWS_REGION)
+        self.bedrock_client = bedrock_client
+
+    def submit(self, job_name, model_id, input_uri, output_prefix):
+        """Run the job and return the S3 URI of its output file"""
+        output_uri = f"s3://{self.storage.s3_bucket}/{output_prefix}/"
+        job = self.bedrock_client.create_model_invocation_job(
+            jobName=job_name,
+            modelId=model_id,
+            roleArn=self.role_arn,
+            inputDataConfig={"s3InputDataConfig": {"s3Uri": input_uri, "s3InputFormat": "JSONL"}},
+            outputDataConfig={"s3OutputDataConfig": {"s3Uri": output_uri}}
+        )
+        job_arn = job["jobArn"]
+
+        while True:
+            status = self.bedrock_client.get_model_invocation_job(jobIdentifier=job_arn)["status"]
+            if status in ("Completed", "PartiallyCompleted"):
+                break
+            if status in ("Failed", "Stopped", "Expired"):
+                raise RuntimeError(f"Batch job {job_name} ended with status {status}")
+            time.sleep(self.poll_seconds)
+
+        # Bedrock writes <output prefix>/<job id>/<input file name>.out
+        job_id = job_arn.split("/")[-1]
+        return f"{output_uri}{job_id}/{os.path.basename(input_uri)}.out"
+
+class BulkInferenceRunner:
+    """Runs the dish pipeline for a whole menu through batch jobs.
+
+    Each wave's requests for every dish are compiled into batch-inference
+    JSONL (one file per routed model), staged through StorageService and
+    handed to the submitter. The output files are ingested to advance every
+    workflow to its next wave. Answers are not escalated to a stronger model
+    as they are interactively; unparseable replies get the agents' usual
+    fallbacks. Photos already analyzed (or resized/recompressed copies of
+    them) reuse the vision cache's analysis, and dishes close enough to one
+    in the semantic cache reuse its name validation and dietary analysis,
+    instead of getting batch records. Photos failing the image quality gate
+    get none at all. Finished results go to the results store in one batch
+    per restaurant.
+    """
+
+    def __init__(self, submitter, bedrock_client=None, storage=None):
+        from visionary_chef import VisionaryChefAgent
+        from authenticator import AuthenticatorAgent
+        from dietary_detective import DietaryDetectiveAgent
+        from side_item_analyzer import SideItemAnalyzerAgent
+        from culinary_wordsmith import CulinaryWordsmithAgent
+        self.submitter = submitter
+        self.storage = storage or StorageService()
+        self.visionary_chef = VisionaryChefAgent(bedrock_client)
+        self.authenticator = AuthenticatorAgent(bedrock_client)
+        self.dietary_detective = DietaryDetectiveAgent(bedrock_client)
+        self.side_item_analyzer = SideItemAnalyzerAgent(bedrock_client)
+        self.culinary_wordsmith = CulinaryWordsmithAgent(bedrock_client)
+        self.stats = {"jobs": 0, "records": 0, "failed_records": 0, "rejected_images": 0, "reused_analyses": 0,
+                      "reused_results": 0, "stored_results": 0}
+
+    def run(self, dishes, run_id=None):
+        """Process dishes ({dish_name, image_bytes, spice_level, restaurant}); return results in input order"""
+        run_id = run_id or str(uuid.uuid4())
+        workflows = []
+        for index, dish in enumerate(dishes):
+            workflow_id = f"{run_id}-{index:05d}"
+            quality = self._check_quality(dish["image_bytes"])
+            wf = {
+                "id": workflow_id,
+                "dish_name": dish["dish_name"],
+                "spice_level": dish.get("spice_level", "Medium"),
+                "restaurant": dish.get("restaurant", ""),
+                "replies": {},
+                "reused": {},
+                "quality_warnings": quality["messages"] if quality is not None else []
+            }
+            if quality is not None and not quality["passed"]:
+                # Photos too poor to analyze get no batch records at all
+                wf["error"] = " ".join(quality["messages"])
+                self.stats["rejected_images"] += 1
+            else:
+                wf["image_uri"] = self.storage.save_image(dish["image_bytes"], workflow_id)
+            workflows.append(wf)
+
+        fingerprints = self._reuse_analyses(workflows, [dish["image_bytes"] for dish in dishes])
+        for wave_index, stages in enumerate(WAVES):
+            active = [wf for wf in workflows if "error" not in wf]
+            if wave_index == 1:
+                self._reuse_cached(active)
+            self._run_wave(run_id, wave_index, stages, active)
+            for wf in active:
+                self._advance(wf, wave_index)
+            if wave_index == 0:
+                self._remember_analyses(workflows, fingerprints)
+            elif wave_index == 1:
+                self._remember_fresh(active)
+
+        results = [self._result(wf) for wf in workflows]
+        self._store_results(workflows, results)
+        return results
+
+    def _store_results(self, workflows, results):
+        """Write the run's finished results to the results store, one batch per
+        restaurant, and add them to the menu index"""
+        if not config.RESULTS_STORE_ENABLED:
+            return
+        import results_store
+        by_restaurant = {}
+        for wf, result in zip(workflows, results):
+            if "error" not in result:
+                by_restaurant.setdefault(wf["restaurant"], []).append(result)
+        store = results_store.get_store()
+        index = None
+        if config.MENU_INDEX_ENABLED:
+            import menu_index
+            index = menu_index.get_index(store)
+        for restaurant, finished in by_restaurant.items():
+            store.add_many(finished, restaurant)
+            if index is not None:
+                index.add_many(finished, restaurant)
+        store.flush()
+        self.stats["stored_results"] += sum(len(finished) for finished in by_restaurant.values())
+
+    def _check_quality(self, image_bytes):
+        if not config.QUALITY_GATE_ENABLED:
+            return None
+        import image_quality
+        return image_quality.check_image(image_bytes)
+
+    def _reuse_analyses(self, workflows, images):
+        """Take analyses of already seen photos from the vision cache; return every photo's fingerprint"""
+        if not config.VISION_CACHE_ENABLED:
+            return [None] * len(workflows)
+        import vision_cache
+        fingerprints = []
+        for wf, image_bytes in zip(workflows, images):
+            if "error" in wf:
+                fingerprints.append(None)
+                continue
+            analysis, fingerprint = vision_cache.lookup(image_bytes, wf["dish_name"])
+            fingerprints.append(fingerprint)
+            if analysis is not None:
+                wf["reused"]["visionary_chef"] = analysis
+                self.stats["reused_analyses"] += 1
+        return fingerprints
+
+    def _remember_analyses(self, workflows, fingerprints):
+        if not config.VISION_CACHE_ENABLED:
+            return
+        import vision_cache
+        for wf, fingerprint in zip(workflows, fingerprints):
+            if "visionary_chef" not in wf["reused"] and "chef_analysis" in wf:
+                vision_cache.remember(fingerprint, wf["chef_analysis"])
+
+    def _reuse_cached(self, workflows):
+        """Look every dish up in the semantic cache in one batch"""
+        if not config.SEMANTIC_CACHE_ENABLED:
+            return
+        import semantic_cache
+        matches = semantic_cache.reusable_results_many([(wf["dish_name"], wf["chef_analysis"]) for wf in workflows])
+        for wf, reused in zip(workflows, matches):
+            wf["reused"].update(reused)
+            self.stats["reused_results"] += len(reused)
+
+    def _remember_fresh(self, workflows):
+        if not config.SEMANTIC_CACHE_ENABLED:
+            return
+        import semantic_cache
+        semantic_cache.remember_many([
+            (wf["dish_name"], wf["chef_analysis"], {
+                stage: wf[key] for stage, key in (("authenticator", "auth_result"), ("dietary_detective", "dietary_analysis"))
+                if stage not in wf["reused"]
+            })
+            for wf in workflows
+        ])
+
+    def _build_request(self, stage, wf):
+        if stage == "food_check":
+            return self.visionary_chef.build_food_check_request(image_uri=wf["image_uri"])
+        if stage == "visionary_chef":
+            return self.visionary_chef.build_request(wf["dish_name"], image_uri=wf["image_uri"])
+        if stage == "authenticator":
+            return self.authenticator.build_request(wf["dish_name"], wf["chef_analysis"], wf["compactor"])
+        if stage == "dietary_detective":
+            return self.dietary_detective.build_request(wf["chef_analysis"], wf["compactor"])
+        if stage == "side_item_analyzer":
+            return self.side_item_analyzer.build_request(
+                wf["dish_name"], None, wf["chef_analysis"], image_uri=wf["image_uri"], compactor=wf["compactor"]
+            )
+        return self.culinary_wordsmith.build_request(
+            wf["auth_result"]["suggested_name"],
+            wf["chef_analysis"],
+            wf["dietary_analysis"],
+            wf["sides_analysis"],
+            compactor=wf["compactor"]
+        )
+
+    def _run_wave(self, run_id, wave_index, stages, workflows):
+        """Compile, stage and submit one wave, one job per model, and collect the replies"""
+        records_by_model = {}
+        for wf in workflows:
+            for stage in stages:
+                # A reused analysis needs no food check either
+                if stage in wf["reused"] or (stage == "food_check" and "visionary_chef" in wf["reused"]):
+                    continue
+                # Batch jobs do not use prompt caching, so checkpoints are dropped
+                model_input = prompt_cache.strip_cache_points(self._build_request(stage, wf))
+                record = {"recordId": f"{wf['id']}:{stage}", "modelInput": model_input}
+                records_by_model.setdefault(router.model_for(stage), []).append(record)
+
+        def submit(model_id, records):
+            slug = model_id.replace(":", "-").replace(".", "-")
+            job_name = f"menu-{run_id[:8]}-w{wave_index}-{slug}"[:63]
+            body = "".join(json.dumps(record) + "\n" for record in records)
+            input_uri = self.storage.save_file(body.encode("utf-8"), f"batch/{run_id}/input/{job_name}.jsonl")
+            output_uri = self.submitter.submit(job_name, model_id, input_uri, f"batch/{run_id}/output")
+            return self.storage.get_file(output_uri).decode("utf-8")
+
+        # Jobs for different models in the same wave run side by side
+        with ThreadPoolExecutor(max_workers=max(len(records_by_model), 1)) as executor:
+            outputs = list(executor.map(lambda item: submit(*item), records_by_model.items()))
+
+        self.stats["jobs"] += len(records_by_model)
+        self.stats["records"] += sum(len(records) for records in records_by_model.values())
+        by_id = {wf["id"]: wf for wf in workflows}
+        for output in outputs:
+            for line in output.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                workflow_id, stage = record["recordId"].rsplit(":", 1)
+                text = reply_text(record)
+                if text is None:
+                    self.stats["failed_records"] += 1
+                by_id[workflow_id]["replies"][stage] = text
+
+    def _advance(self, wf, wave_index):
+        """Parse a workflow's replies for the wave it just finished"""
+        replies = wf["replies"]
+        if wave_index == 0:
+            if "visionary_chef" in wf["reused"]:
+                chef_analysis = wf["reused"]["visionary_chef"]
+                is_food = chef_analysis.get("is_food", True)
+            else:
+                # An unanswered food check defaults to food, as it does interactively
+                food_check = replies.get("food_check")
+                is_food = self.visionary_chef.parse_food_check_response(food_check) if food_check is not None else True
+                chef_analysis = self.visionary_chef.parse_response(replies.get("visionary_chef") or "", is_food)
+            if not is_food:
+                wf["error"] = "The uploaded image does not appear to contain food. Please upload an image of a food dish."
+                return
+            chef_analysis["spice_level"] = wf["spice_level"]
+            chef_analysis["dish_name"] = wf["dish_name"]
+            wf["chef_analysis"] = chef_analysis
+            wf["compactor"] = PromptCompactor(chef_analysis)
+        elif wave_index == 1:
+            reused = wf["reused"]
+            wf["auth_result"] = reused.get("authenticator") or self.authenticator.parse_response(
+                replies.get("authenticator") or "", wf["dish_name"]
+            )
+            wf["dietary_analysis"] = reused.get("dietary_detective") or self.dietary_detective.parse_response(
+                replies.get("dietary_detective") or ""
+            )
+            wf["sides_analysis"] = self.side_item_analyzer.parse_response(replies.get("side_item_analyzer") or "")
+        else:
+            wf["description"] = (replies.get("culinary_wordsmith") or "").replace('```', '').strip()
+
+    def _result(self, wf):
+        """Compile a workflow into the same shape process_dish returns"""
+        if "error" in wf:
+            return {"dish_id": wf["id"], "input_name": wf["dish_name"], "error": wf["error"]}
+        dietary_analysis = wf["dietary_analysis"]
+        sides_analysis = wf["sides_analysis"]
+        # Stages whose prompt lost items to its token budget saw only part of the dish
+        trimmed_stages = wf["compactor"].trimmed_stages()
+        return {
+            "dish_id": wf["id"],
+            "input_name": wf["dish_name"],
+            "processed_timestamp": datetime.datetime.now().isoformat(),
+            "image_uri": wf["image_uri"],
+            "refined_name": wf["auth_result"]["suggested_name"],
+            "generated_description": wf["description"],
+            "validation": {
+                "status": wf["auth_result"]["validation_status"],
+                "notes": wf["auth_result"].get("reason", "")
+            },
+            "dietary_analysis": {
+                "allergens": dietary_analysis.get("allergens", []),
+                "potential_allergens": dietary_analysis.get("potential_allergens", []),
+                "dietary_tags": dietary_analysis.get("dietary_tags", []),
+                "disclaimer": dietary_analysis.get("disclaimer", ""),
+                "parsed": dietary_analysis.get("parsed", True)
+            },
+            "sides_analysis": {
+                "main_dish_components": sides_analysis.get("main_dish_components", []),
+                "side_items": sides_analysis.get("side_items", []),
+                "sauces_and_garnishes": sides_analysis.get("sauces_and_garnishes", []),
+                "presentation_notes": sides_analysis.get("presentation_notes", "")
+            },
+            "identified_components": wf["chef_analysis"].get("items", []),
+            "partial": bool(trimmed_stages),
+            "skipped_stages": [],
+            "trimmed_stages": trimmed_stages,
+            "reused_stages": sorted(wf["reused"]),
+            "quality_warnings": wf["quality_warnings"]
+        }
@@ -0,0 +1,193 @@
+import time
+import threading
+from collections import deque
+import config
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Errors caused by the request itself say nothing about the model's health
+# and never trip a breaker
+REQUEST_ERROR_CODES = {
+    "ValidationException",
+    "AccessDeniedException",
+    "ResourceNotFoundException",
+    "UnrecognizedClientException",
+}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Bedrock while a model's breaker is open"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit for {name} is open, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+def counts_as_failure(error):
+    """Whether an error from a call should count against the model's health"""
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code") not in REQUEST_ERROR_CODES
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker for one model in one region.
+
+    Closed: calls go through and their outcomes fill a rolling window. A call
+    is bad if it raises (other than a request error) or takes longer than
+    ``slow_call_seconds``. Once the window holds ``min_calls`` outcomes and
+    the bad share reaches ``failure_rate``, the breaker opens.
+    Open: calls fail immediately with CircuitOpenError for ``open_seconds``.
+    Half-open: ``half_open_calls`` probe calls go through; any bad probe
+    reopens the breaker, and that many good ones close it again.
+
+    State is per process, so each Lambda container trips on its own.
+    """
+
+    def __init__(self, name, failure_rate=None, slow_call_seconds=None, min_calls=None, window=None,
+                 open_seconds=None, half_open_calls=None):
+        self.name = name
+        self.failure_rate = config.CIRCUIT_FAILURE_RATE if failure_rate is None else failure_rate
+        self.slow_call_seconds = config.CIRCUIT_SLOW_CALL_SECONDS if slow_call_seconds is None else slow_call_seconds
+        self.min_calls = config.CIRCUIT_MIN_CALLS if min_calls is None else min_calls
+        self.open_seconds = config.CIRCUIT_OPEN_SECONDS if open_seconds is None else open_seconds
+        self.half_open_calls = config.CIRCUIT_HALF_OPEN_CALLS if half_open_calls is None else half_open_calls
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=config.CIRCUIT_WINDOW if window is None else window)
+        self._opened_at = 0.0
+        self._half_opened_at = 0.0
+        self._probes_started = 0
+        self._probes_passed = 0
+        self._stats = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+        self._lock = threading.Lock()
+
+    def call(self, fn):
+        """Call fn() unless the breaker is open; record how it went"""
+        self._before_call()
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            self._after_call(time.perf_counter() - started, e)
+            raise
+        self._after_call(time.perf_counter() - started)
+        return result
+
+    def stream(self, open_stream):
+        """Open a response stream with open_stream() unless the breaker is open.
+
+        The response's "body" events are wrapped so the call's outcome is only
+        recorded once the stream ends: an error while reading counts as much
+        as one when opening. Slowness is judged on the time to open.
+        """
+        self._before_call()
+        started = time.perf_counter()
+        try:
+            response = open_stream()
+        except Exception as e:
+            self._after_call(time.perf_counter() - started, e)
+            raise
+        response["body"] = self._watch(response["body"], time.perf_counter() - started)
+        return response
+
+    def _watch(self, events, latency):
+        error = None
+        try:
+            yield from events
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Also runs when the reader stops early, so a probe is never left out
+            self._after_call(latency, error)
+
+    def _before_call(self):
+        with self._lock:
+            if self.state == OPEN:
+                retry_after = self._opened_at + self.open_seconds - time.monotonic()
+                if retry_after > 0:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, retry_after)
+                self.state = HALF_OPEN
+                self._half_opened_at = time.monotonic()
+                self._probes_started = 0
+                self._probes_passed = 0
+            if self.state == HALF_OPEN:
+                if self._probes_started >= self.half_open_calls:
+                    # Probes are still out; everyone else keeps failing fast
+                    # until they must have passed or counted as slow, or for
+                    # another open period once they are overdue
+                    self._stats["rejected"] += 1
+                    retry_after = self._half_opened_at + self.slow_call_seconds - time.monotonic()
+                    raise CircuitOpenError(self.name, retry_after if retry_after > 0 else self.open_seconds)
+                self._probes_started += 1
+            self._stats["calls"] += 1
+
+    def _after_call(self, latency, error=None):
+        failed = error is not None and counts_as_failure(error)
+        slow = error is None and latency > self.slow_call_seconds
+        with self._lock:
+            self._stats["failures"] += failed
+            self._stats["slow_calls"] += slow
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._open()
+                else:
+                    self._probes_passed += 1
+                    if self._probes_passed >= self.half_open_calls:
+                        self.state = CLOSED
+                        self._outcomes.clear()
+                return
+            self._outcomes.append(failed or slow)
+            if (self.state == CLOSED and len(self._outcomes) >= self.min_calls
+                    and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate):
+                self._open()
+
+    def _open(self):
+        print(f"Circuit for {self.name} opened")
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._stats["opened"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, state=self.state)
+            stats["bad_rate"] = round(sum(self._outcomes) / len(self._outcomes), 3) if self._outcomes else 0.0
+            if self.state == OPEN:
+                stats["retry_after_seconds"] = round(max(self._opened_at + self.open_seconds - time.monotonic(), 0.0), 1)
+        return stats
+
+class CircuitBreakerRegistry:
+    """One CircuitBreaker per (model, region), created on first use"""
+
+    def __init__(self, enabled=None, **settings):
+        self.enabled = config.CIRCUIT_BREAKER_ENABLED if enabled is None else enabled
+        self.settings = settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_id, region):
+        with self._lock:
+            breaker = self._breakers.get((model_id, region))
+            if breaker is None:
+                breaker = self._breakers[(model_id, region)] = CircuitBreaker(f"{model_id}@{region}", **self.settings)
+            return breaker
+
+    def call(self, model_id, region, fn):
+        """Call fn() through the breaker of (model_id, region)"""
+        if not self.enabled:
+            return fn()
+        return self.get(model_id, region).call(fn)
+
+    def stream(self, model_id, region, open_stream):
+        """Open a response stream through the breaker of (model_id, region)"""
+        if not self.enabled:
+            return open_stream()
+        return self.get(model_id, region).stream(open_stream)
+
+    def stats(self):
+        """State and counters of every breaker, keyed by model@region"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.stats() for breaker in breakers}
+
+breakers = CircuitBreakerRegistry()
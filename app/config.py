@@ -1,14 +1,20 @@
 import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env file if present
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
+import json
 
 # Environment detection
 def is_aws_environment():
     """Detect if running in AWS"""
     return os.environ.get("AWS_EXECUTION_ENV") is not None or os.environ.get("AWS_LAMBDA_FUNCTION_NAME") is not None
 
+# Load environment variables from .env file if present. Lambda gets its
+# configuration from the function environment, so skip dotenv there entirely.
+if not is_aws_environment():
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
+    except ImportError:
+        pass
+
 # Configuration
 ENVIRONMENT = os.environ.get("ENVIRONMENT", "local")
 # Try REGION first (for Lambda), fall back to AWS_REGION (for local development)
@@ -18,4 +24,177 @@ S3_BUCKET = os.environ.get("S3_BUCKET", "menu-maestro-images")
 USE_S3 = os.environ.get("USE_S3", "False").lower() == "true" or is_aws_environment()
 
 # Paths
-UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", "uploads")
\ No newline at end of file
+UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", "uploads")
+# Local caches that outlive a request; Lambda can only write under /tmp
+CACHE_DIR = os.environ.get("CACHE_DIR", "/tmp/menu-maestro" if is_aws_environment() else "cache")
+
+# Local image store
+UPLOAD_SHARD_DEPTH = int(os.environ.get("UPLOAD_SHARD_DEPTH", "2"))
+# Byte cap and TTL for the images in the local upload folder (0 disables);
+# batch files and exports saved alongside them are never evicted
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", "0"))
+UPLOAD_TTL_SECONDS = int(os.environ.get("UPLOAD_TTL_SECONDS", "0"))
+UPLOAD_JANITOR_INTERVAL = int(os.environ.get("UPLOAD_JANITOR_INTERVAL", "300"))
+UPLOAD_MMAP_MIN_BYTES = int(os.environ.get("UPLOAD_MMAP_MIN_BYTES", str(64 * 1024)))
+
+# Image payload mode for Bedrock requests: "auto" references images stored in
+# S3 by URI, "inline" always sends base64 bytes
+IMAGE_PAYLOAD_MODE = os.environ.get("IMAGE_PAYLOAD_MODE", "auto").lower()
+# Optional account ID that owns S3_BUCKET (needed for cross-account buckets)
+S3_BUCKET_OWNER = os.environ.get("S3_BUCKET_OWNER", "")
+
+# Prompt compaction: Visionary Chef items below this confidence are not sent
+# to downstream agents
+PROMPT_MIN_CONFIDENCE = float(os.environ.get("PROMPT_MIN_CONFIDENCE", "0.5"))
+# Estimated input-token budget per stage prompt (text only, 0 disables);
+# override with a JSON object, e.g. '{"dietary_detective": 1500}'. Over
+# budget, a stage's least confident items are dropped and the result is
+# marked partial, except for the Dietary Detective, which keeps every item
+# and only loses the cooking style
+STAGE_INPUT_TOKEN_BUDGETS = {
+    "authenticator": 1000,
+    "dietary_detective": 1500,
+    "side_item_analyzer": 1200,
+    "culinary_wordsmith": 1800,
+    **json.loads(os.environ.get("STAGE_INPUT_TOKEN_BUDGETS", "{}"))
+}
+
+# Per-workflow limits for process_dish (0 disables a limit, the default; set
+# them to opt in). When a workflow runs short it skips side analysis, caps the
+# description or returns partial results. Cascade escalations count as calls
+WORKFLOW_MAX_TOKENS = int(os.environ.get("WORKFLOW_MAX_TOKENS", "0"))
+WORKFLOW_MAX_SECONDS = float(os.environ.get("WORKFLOW_MAX_SECONDS", "0"))
+WORKFLOW_MAX_CALLS = int(os.environ.get("WORKFLOW_MAX_CALLS", "0"))
+
+# Per-agent model overrides as JSON, e.g. '{"food_check": "us.amazon.nova-lite-v1:0"}'.
+# Stages without a route use BEDROCK_MODEL_ID
+MODEL_ROUTES = json.loads(os.environ.get("MODEL_ROUTES", "{}"))
+# Re-ask on BEDROCK_MODEL_ID when a cheaper model's answer is low-confidence
+MODEL_CASCADE_ENABLED = os.environ.get("MODEL_CASCADE_ENABLED", "true").lower() == "true"
+
+# Hedged requests: when a Bedrock call runs past the rolling HEDGE_PERCENTILE
+# latency of its route, fire a duplicate and take whichever answers first.
+# HEDGE_MAX_RATE caps the share of calls that get hedged to protect quota
+HEDGE_ENABLED = os.environ.get("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "90"))
+HEDGE_MAX_RATE = float(os.environ.get("HEDGE_MAX_RATE", "0.1"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+
+# Comma-separated Bedrock regions to spread calls over, e.g.
+# "us-east-1,us-west-2,us-east-2". With more than one region, calls go to the
+# region with the lowest recent latency and fail over when one is throttled.
+# Keep the regions inside the geography of BEDROCK_MODEL_ID's inference
+# profile (us.* models -> us-* regions)
+BEDROCK_REGIONS = [r.strip() for r in os.environ.get("BEDROCK_REGIONS", AWS_REGION).split(",") if r.strip()]
+# Seconds a throttled region is skipped before it is tried again
+BEDROCK_REGION_COOLDOWN = float(os.environ.get("BEDROCK_REGION_COOLDOWN", "30"))
+
+# Plate mode: dishes detected per photo, crops analyzed in parallel, and how
+# crops are cut (padding as a fraction of the box, longest side in pixels)
+PLATE_MAX_DISHES = int(os.environ.get("PLATE_MAX_DISHES", "6"))
+PLATE_MAX_WORKERS = int(os.environ.get("PLATE_MAX_WORKERS", "4"))
+PLATE_CROP_PADDING = float(os.environ.get("PLATE_CROP_PADDING", "0.04"))
+PLATE_CROP_MAX_SIDE = int(os.environ.get("PLATE_CROP_MAX_SIDE", "1024"))
+PLATE_CROP_QUALITY = int(os.environ.get("PLATE_CROP_QUALITY", "85"))
+
+# Batched descriptions (generate_descriptions_batch): limits per request
+WORDSMITH_BATCH_MAX_DISHES = int(os.environ.get("WORDSMITH_BATCH_MAX_DISHES", "20"))
+WORDSMITH_BATCH_MAX_INPUT_TOKENS = int(os.environ.get("WORDSMITH_BATCH_MAX_INPUT_TOKENS", "8000"))
+WORDSMITH_BATCH_MAX_OUTPUT_TOKENS = int(os.environ.get("WORDSMITH_BATCH_MAX_OUTPUT_TOKENS", "4000"))
+
+# Bulk mode (bulk_inference.BedrockBatchSubmitter): service role Bedrock uses
+# to read and write batch files in S3_BUCKET, and how often to poll a job
+BATCH_ROLE_ARN = os.environ.get("BATCH_ROLE_ARN", "")
+BATCH_POLL_SECONDS = float(os.environ.get("BATCH_POLL_SECONDS", "60"))
+
+# Prompt caching: agents mark their static system/instruction prefixes with
+# Bedrock cache checkpoints; set to false to send requests without them
+PROMPT_CACHE_ENABLED = os.environ.get("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+
+# Circuit breaker per (model, region): once CIRCUIT_FAILURE_RATE of the last
+# CIRCUIT_WINDOW calls (at least CIRCUIT_MIN_CALLS) failed or took longer than
+# CIRCUIT_SLOW_CALL_SECONDS, calls fail fast for CIRCUIT_OPEN_SECONDS and the
+# stages degrade; then CIRCUIT_HALF_OPEN_CALLS probe calls decide whether it closes
+CIRCUIT_BREAKER_ENABLED = os.environ.get("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+CIRCUIT_FAILURE_RATE = float(os.environ.get("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.environ.get("CIRCUIT_SLOW_CALL_SECONDS", "20"))
+CIRCUIT_MIN_CALLS = int(os.environ.get("CIRCUIT_MIN_CALLS", "10"))
+CIRCUIT_WINDOW = int(os.environ.get("CIRCUIT_WINDOW", "20"))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_CALLS = int(os.environ.get("CIRCUIT_HALF_OPEN_CALLS", "2"))
+
+# Semantic result cache: reuse the Authenticator result of a near-identical
+# earlier dish (similar name, same ingredients) when the cosine similarity of
+# their hashed n-gram vectors reaches the threshold. SEMANTIC_CACHE_NAME_WEIGHT
+# is the name's share of the similarity. A similar dish may differ by exactly
+# the ingredient that matters for allergens, so its Dietary Detective result is
+# only reused with SEMANTIC_CACHE_REUSE_DIETARY, and then only when both dishes
+# have the same set of (canonical) ingredients
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_DIR = os.environ.get("SEMANTIC_CACHE_DIR", os.path.join(CACHE_DIR, "semantic"))
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_DIM = int(os.environ.get("SEMANTIC_CACHE_DIM", "256"))
+SEMANTIC_CACHE_NAME_WEIGHT = float(os.environ.get("SEMANTIC_CACHE_NAME_WEIGHT", "0.4"))
+SEMANTIC_CACHE_REUSE_DIETARY = os.environ.get("SEMANTIC_CACHE_REUSE_DIETARY", "false").lower() == "true"
+
+# Vision cache: reuse the Visionary Chef analysis of the same photo under the
+# same dish name (ignoring case and punctuation; the prompt names the dish),
+# matched by sha256 or by a perceptual hash ("phash" or "dhash") within
+# VISION_CACHE_MAX_DISTANCE of 64 bits whose 8x8 colour thumbnail differs by at
+# most VISION_CACHE_MAX_COLOR_DIFF (mean of 0-255), so resized, recompressed
+# or slightly cropped re-uploads skip both image calls
+VISION_CACHE_ENABLED = os.environ.get("VISION_CACHE_ENABLED", "true").lower() == "true"
+VISION_CACHE_DIR = os.environ.get("VISION_CACHE_DIR", os.path.join(CACHE_DIR, "vision"))
+VISION_CACHE_HASH = os.environ.get("VISION_CACHE_HASH", "phash")
+VISION_CACHE_MAX_DISTANCE = int(os.environ.get("VISION_CACHE_MAX_DISTANCE", "10"))
+VISION_CACHE_MAX_COLOR_DIFF = float(os.environ.get("VISION_CACHE_MAX_COLOR_DIFF", "8"))
+
+# Image quality gate: photos that are too small, blurry (variance of the
+# Laplacian at 512px below QUALITY_MIN_SHARPNESS), too dark or overexposed
+# (mean luminance out of range, or more than QUALITY_MAX_CLIPPED of pixels
+# within QUALITY_CLIP_LEVEL of black or white), or that can't be read, are
+# only warned about by default; with QUALITY_GATE_MODE "reject" they are turned
+# away before any Bedrock call
+QUALITY_GATE_ENABLED = os.environ.get("QUALITY_GATE_ENABLED", "true").lower() == "true"
+QUALITY_GATE_MODE = os.environ.get("QUALITY_GATE_MODE", "warn")
+QUALITY_MIN_SIDE = int(os.environ.get("QUALITY_MIN_SIDE", "256"))
+QUALITY_MIN_SHARPNESS = float(os.environ.get("QUALITY_MIN_SHARPNESS", "40"))
+QUALITY_MIN_BRIGHTNESS = float(os.environ.get("QUALITY_MIN_BRIGHTNESS", "40"))
+QUALITY_MAX_BRIGHTNESS = float(os.environ.get("QUALITY_MAX_BRIGHTNESS", "225"))
+QUALITY_CLIP_LEVEL = int(os.environ.get("QUALITY_CLIP_LEVEL", "8"))
+QUALITY_MAX_CLIPPED = float(os.environ.get("QUALITY_MAX_CLIPPED", "0.5"))
+
+# Ingredient normalization: map the Visionary Chef's free-text items
+# ("Tomatoes", "tomato slices", "Roma tomato") to canonical ingredient ids
+# that cache keys are built from. Items keep their own wording and are never
+# merged, so every one still reaches the Dietary Detective
+INGREDIENT_NORMALIZATION_ENABLED = os.environ.get("INGREDIENT_NORMALIZATION_ENABLED", "true").lower() == "true"
+
+# Results store: processed dishes are kept in a local SQLite database indexed
+# by restaurant, name, allergen and dietary tag, written in batches of
+# RESULTS_STORE_BATCH_SIZE or after RESULTS_STORE_FLUSH_SECONDS. With
+# RESULTS_STORE_S3_SYNC the database is merged with a copy at
+# RESULTS_STORE_S3_KEY in S3_BUCKET on start and every RESULTS_STORE_SYNC_SECONDS;
+# the Lambda handler writes and uploads its results before each invocation returns
+RESULTS_STORE_ENABLED = os.environ.get("RESULTS_STORE_ENABLED", "true").lower() == "true"
+RESULTS_STORE_PATH = os.environ.get("RESULTS_STORE_PATH", os.path.join(CACHE_DIR, "results.sqlite"))
+RESULTS_STORE_BATCH_SIZE = int(os.environ.get("RESULTS_STORE_BATCH_SIZE", "50"))
+RESULTS_STORE_FLUSH_SECONDS = float(os.environ.get("RESULTS_STORE_FLUSH_SECONDS", "2"))
+RESULTS_STORE_S3_SYNC = os.environ.get("RESULTS_STORE_S3_SYNC", "false").lower() == "true"
+RESULTS_STORE_S3_KEY = os.environ.get("RESULTS_STORE_S3_KEY", "results/results.sqlite")
+RESULTS_STORE_SYNC_SECONDS = float(os.environ.get("RESULTS_STORE_SYNC_SECONDS", "60"))
+
+# Menu index: in-memory bitsets of every stored dish's allergens and dietary
+# tags, built from the results store on first use and updated as dishes are
+# processed, so menu filters are answered without a database query
+MENU_INDEX_ENABLED = os.environ.get("MENU_INDEX_ENABLED", "true").lower() == "true"
+
+# Menu export: stored results are rendered to CSV, Markdown or HTML straight
+# from the results store, EXPORT_PAGE_SIZE dishes at a time and written in
+# chunks of about EXPORT_CHUNK_SIZE characters, while EXPORT_THUMBNAIL_WORKERS
+# threads write EXPORT_THUMBNAIL_SIZE px thumbnails of the dish photos
+EXPORT_PAGE_SIZE = int(os.environ.get("EXPORT_PAGE_SIZE", "500"))
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "65536"))
+EXPORT_THUMBNAIL_SIZE = int(os.environ.get("EXPORT_THUMBNAIL_SIZE", "240"))
+EXPORT_THUMBNAIL_QUALITY = int(os.environ.get("EXPORT_THUMBNAIL_QUALITY", "80"))
+EXPORT_THUMBNAIL_WORKERS = int(os.environ.get("EXPORT_THUMBNAIL_WORKERS", "8"))
@@ -0,0 +1,139 @@
+import time
+import functools
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import config
+
+class RequestHedger:
+    """Hedges slow Bedrock calls to cut tail latency.
+
+    Keeps a rolling latency window per route (agent, model). When a call has
+    not returned within that route's rolling percentile (p90 by default), a
+    duplicate is fired and whichever finishes first wins. Primaries run on
+    the caller's thread until a route has a percentile, then on a thread of
+    their own; only hedges go to the shared pool. Hedges are capped at
+    ``max_hedge_rate`` of recent calls to protect quota.
+    """
+
+    def __init__(self, enabled=None, percentile=None, max_hedge_rate=None, min_samples=None,
+                 window=200, max_workers=16):
+        self.enabled = config.HEDGE_ENABLED if enabled is None else enabled
+        self.percentile = config.HEDGE_PERCENTILE if percentile is None else percentile
+        self.max_hedge_rate = config.HEDGE_MAX_RATE if max_hedge_rate is None else max_hedge_rate
+        self.min_samples = config.HEDGE_MIN_SAMPLES if min_samples is None else min_samples
+        self.window = window
+        self.max_workers = max_workers
+        self._latencies = {}
+        self._recent_hedges = deque(maxlen=window)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "hedges_fired": 0, "hedges_won": 0, "hedges_capped": 0}
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="bedrock-hedge")
+            return self._executor
+
+    def record_latency(self, route, latency):
+        with self._lock:
+            self._latencies.setdefault(route, deque(maxlen=self.window)).append(latency)
+
+    def hedge_delay(self, route):
+        """Rolling percentile latency for a route, or None until enough samples exist"""
+        with self._lock:
+            samples = self._latencies.get(route)
+            if not samples or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        index = min(int(len(ordered) * self.percentile / 100.0), len(ordered) - 1)
+        return ordered[index]
+
+    def _allow_hedge(self):
+        with self._lock:
+            recent = len(self._recent_hedges)
+            if recent and sum(self._recent_hedges) / recent >= self.max_hedge_rate:
+                self._stats["hedges_capped"] += 1
+                return False
+            return True
+
+    def _timed(self, route, fn):
+        """fn wrapped to record its latency once it actually starts"""
+        def timed():
+            started = time.perf_counter()
+            result = fn()
+            self.record_latency(route, time.perf_counter() - started)
+            return result
+        return timed
+
+    def _submit(self, route, fn):
+        """Run fn on the pool in a copy of the caller's context, recording its latency"""
+        return self.executor.submit(contextvars.copy_context().run, self._timed(route, fn))
+
+    def _start(self, route, fn):
+        """Run fn on a thread of its own in a copy of the caller's context.
+
+        Primaries never queue behind other calls in the shared pool, so the
+        hedge timer only ever measures the call itself.
+        """
+        future = Future()
+        run = functools.partial(contextvars.copy_context().run, self._timed(route, fn))
+
+        def target():
+            try:
+                future.set_result(run())
+            except BaseException as e:
+                future.set_exception(e)
+        threading.Thread(target=target, name="bedrock-primary", daemon=True).start()
+        return future
+
+    def call(self, route, fn):
+        """Call fn(), hedging it with a duplicate if it runs past the route's percentile"""
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            self._stats["calls"] += 1
+        delay = self.hedge_delay(route)
+        if delay is None:
+            # Nothing to hedge against yet: run on the caller's thread
+            with self._lock:
+                self._recent_hedges.append(0)
+            return self._timed(route, fn)()
+
+        primary = self._start(route, fn)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._allow_hedge():
+            with self._lock:
+                self._recent_hedges.append(0)
+            return primary.result()
+
+        with self._lock:
+            self._recent_hedges.append(1)
+            self._stats["hedges_fired"] += 1
+        hedge = self._submit(route, fn)
+
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                # A failed attempt only loses if the other one can still succeed
+                if future.exception() is not None and pending:
+                    continue
+                if future is hedge and future.exception() is None:
+                    with self._lock:
+                        self._stats["hedges_won"] += 1
+                # A hedge still queued behind other calls is not worth running
+                hedge.cancel()
+                return future.result()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hedge_rate"] = round(stats["hedges_fired"] / stats["calls"], 3) if stats["calls"] else 0.0
+        return stats
+
+hedger = RequestHedger()
@@ -0,0 +1,466 @@
+import os
+import uuid
+import shutil
+import datetime
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import config
+from storage import StorageService
+from prompt_compaction import PromptCompactor
+from budget import WorkflowBudget, MIN_DESCRIPTION_TOKENS
+from circuit_breaker import CircuitOpenError
+import single_flight
+
+# Identical dishes being processed concurrently (several tabs, client retries)
+# share one pipeline run
+_pipelines = single_flight.SingleFlight("process_dish")
+
+def skipped_result(stage, dish_name, reason):
+    """Stand-in result for a stage that did not run"""
+    if stage == "authenticator":
+        return {
+            "validation_status": "Skipped",
+            "reason": f"Skipped: {reason}",
+            "suggested_name": dish_name
+        }
+    if stage == "dietary_detective":
+        return {
+            "allergens": [],
+            "potential_allergens": [],
+            "dietary_tags": [],
+            "disclaimer": "Allergen and dietary analysis was skipped for this dish. Please consult the restaurant for allergen information."
+        }
+    if stage == "culinary_wordsmith":
+        return ""
+    return {}
+
+class OrchestratorAgent:
+    """Manages the workflow between specialized agents"""
+    
+    def __init__(self, bedrock_client=None):
+        # Agents (and the boto3 client they share) are created on first use so
+        # a cold Lambda only pays for what the request actually needs
+        self._bedrock_client = bedrock_client
+        self._visionary_chef = None
+        self._authenticator = None
+        self._dietary_detective = None
+        self._side_item_analyzer = None
+        self._culinary_wordsmith = None
+        self._plate_splitter = None
+        self.storage = StorageService()
+    
+    @property
+    def bedrock_client(self):
+        if self._bedrock_client is None:
+            from bedrock_utils import get_bedrock_client
+            self._bedrock_client = get_bedrock_client()
+        return self._bedrock_client
+    
+    @property
+    def visionary_chef(self):
+        if self._visionary_chef is None:
+            from visionary_chef import VisionaryChefAgent
+            self._visionary_chef = VisionaryChefAgent(self.bedrock_client)
+        return self._visionary_chef
+    
+    @property
+    def authenticator(self):
+        if self._authenticator is None:
+            from authenticator import AuthenticatorAgent
+            self._authenticator = AuthenticatorAgent(self.bedrock_client)
+        return self._authenticator
+    
+    @property
+    def dietary_detective(self):
+        if self._dietary_detective is None:
+            from dietary_detective import DietaryDetectiveAgent
+            self._dietary_detective = DietaryDetectiveAgent(self.bedrock_client)
+        return self._dietary_detective
+    
+    @property
+    def side_item_analyzer(self):
+        if self._side_item_analyzer is None:
+            from side_item_analyzer import SideItemAnalyzerAgent
+            self._side_item_analyzer = SideItemAnalyzerAgent(self.bedrock_client)
+        return self._side_item_analyzer
+    
+    @property
+    def culinary_wordsmith(self):
+        if self._culinary_wordsmith is None:
+            from culinary_wordsmith import CulinaryWordsmithAgent
+            self._culinary_wordsmith = CulinaryWordsmithAgent(self.bedrock_client)
+        return self._culinary_wordsmith
+    
+    @property
+    def plate_splitter(self):
+        if self._plate_splitter is None:
+            from plate_splitter import PlateSplitterAgent
+            self._plate_splitter = PlateSplitterAgent(self.bedrock_client)
+        return self._plate_splitter
+    
+    def process_plate(self, image_bytes, spice_level="Medium", restaurant="", budget=None):
+        """Process a photo of several dishes: detect them, crop each and run the dish pipeline per crop.
+        
+        The detection call is charged to ``budget`` (a WorkflowBudget of its
+        own by default); each dish then runs with its own workflow budget.
+        """
+        from plate_splitter import crop_dishes
+        plate_id = str(uuid.uuid4())
+        
+        quality = self.check_quality(image_bytes)
+        if quality is not None and not quality["passed"]:
+            return {"error": " ".join(quality["messages"]), "quality": quality}
+        
+        # Step 1: Save the original image
+        image_path = self.storage.save_image(image_bytes, plate_id)
+        
+        # Step 2: Find the dishes in one call
+        budget = budget or WorkflowBudget()
+        if not budget.can_afford_stage("plate_splitter"):
+            return {
+                "error": "The workflow budget does not cover dish detection.",
+                "budget": budget.report()
+            }
+        try:
+            with budget.activate():
+                regions = self.plate_splitter.detect_dishes(image_bytes, image_uri=image_path)
+        except CircuitOpenError as e:
+            return {
+                "error": "Dish detection is temporarily unavailable. Please try again shortly.",
+                "retry_after": round(e.retry_after)
+            }
+        if not regions:
+            return {
+                "error": "No dishes could be found in the uploaded image. Please upload a photo of one or more food dishes."
+            }
+        
+        # Step 3: Crop locally and run the per-dish pipelines in parallel,
+        # each with its own workflow budget
+        crops = crop_dishes(image_bytes, regions)
+        with ThreadPoolExecutor(max_workers=min(len(crops), config.PLATE_MAX_WORKERS)) as executor:
+            futures = [
+                # The plate photo already passed the quality gate; crops of it
+                # are smaller and would be judged (and counted) again
+                executor.submit(self.process_dish, region["name"], crop, spice_level, restaurant=restaurant,
+                                quality_gate=False)
+                for region, crop in zip(regions, crops)
+            ]
+            dishes = [future.result() for future in futures]
+        
+        for region, dish in zip(regions, dishes):
+            dish["plate_region"] = region["box"]
+        
+        return {
+            "plate_id": plate_id,
+            "processed_timestamp": datetime.datetime.now().isoformat(),
+            "dish_count": len(dishes),
+            "dishes": dishes,
+            "budget": budget.report()
+        }
+    
+    def process_dish(self, dish_name, image_bytes, spice_level="Medium", budget=None, restaurant="", quality_gate=True):
+        """Process a dish through the entire agent pipeline; ``quality_gate=False``
+        skips the image quality check for photos already checked (plate crops)"""
+        key = (single_flight.digest(image_bytes), dish_name, spice_level, restaurant)
+        result, _ = _pipelines.do(
+            key, lambda: self._process_dish(dish_name, image_bytes, spice_level, budget, restaurant, quality_gate)
+        )
+        return result
+    
+    def _process_dish(self, dish_name, image_bytes, spice_level, budget, restaurant, quality_gate=True):
+        workflow_id = str(uuid.uuid4())
+        
+        # Every Bedrock call in this workflow is charged to its budget
+        budget = budget or WorkflowBudget()
+        with budget.activate():
+            result = self._run_pipeline(workflow_id, dish_name, image_bytes, spice_level, budget, quality_gate)
+        if "error" not in result:
+            self.store_results([result], restaurant)
+        return result
+    
+    def _skip_stage(self, stage, skipped_stages, budget, dish_name, reason="workflow budget exhausted"):
+        skipped_stages.append(stage)
+        budget.degrade(f"skipped {stage} ({reason})")
+        return skipped_result(stage, dish_name, reason)
+    
+    def check_quality(self, image_bytes):
+        """Local size, blur and exposure check of a photo, or None when the gate is off"""
+        if not config.QUALITY_GATE_ENABLED:
+            return None
+        try:
+            import image_quality
+            return image_quality.check_image(image_bytes)
+        except Exception as e:
+            print(f"Error checking image quality: {str(e)}")
+            return None
+    
+    def cached_analysis(self, image_bytes, dish_name):
+        """Visionary Chef analysis of the same or a near-identical photo under
+        the same dish name, if one was seen before, and the photo's
+        fingerprint for remember_analysis"""
+        if not config.VISION_CACHE_ENABLED:
+            return None, None
+        try:
+            # numpy and Pillow are only imported once a dish gets this far
+            import vision_cache
+            return vision_cache.lookup(image_bytes, dish_name)
+        except Exception as e:
+            print(f"Error reading vision cache: {str(e)}")
+            return None, None
+    
+    def remember_analysis(self, fingerprint, chef_analysis):
+        if not config.VISION_CACHE_ENABLED or fingerprint is None:
+            return
+        try:
+            import vision_cache
+            vision_cache.remember(fingerprint, chef_analysis)
+        except Exception as e:
+            print(f"Error writing vision cache: {str(e)}")
+    
+    def reusable_results(self, dish_name, chef_analysis):
+        """Stage results reusable from a near-identical dish in the semantic cache"""
+        if not config.SEMANTIC_CACHE_ENABLED:
+            return {}
+        try:
+            # numpy is only imported once a dish gets this far
+            import semantic_cache
+            return semantic_cache.reusable_results(dish_name, chef_analysis)
+        except Exception as e:
+            print(f"Error reading semantic cache: {str(e)}")
+            return {}
+    
+    def remember_results(self, dish_name, chef_analysis, fresh):
+        if not config.SEMANTIC_CACHE_ENABLED or not fresh:
+            return
+        try:
+            import semantic_cache
+            semantic_cache.remember(dish_name, chef_analysis, fresh)
+        except Exception as e:
+            print(f"Error writing semantic cache: {str(e)}")
+    
+    def store_results(self, results, restaurant=""):
+        """Queue finished dish results for the results store's next batched write
+        and add them to the menu index"""
+        if not config.RESULTS_STORE_ENABLED or not results:
+            return
+        try:
+            import results_store
+            store = results_store.get_store()
+            index = None
+            if config.MENU_INDEX_ENABLED:
+                import menu_index
+                # Built from what is stored so far, before these results join it
+                index = menu_index.get_index(store)
+            store.add_many(results, restaurant)
+            if index is not None:
+                index.add_many(results, restaurant)
+        except Exception as e:
+            print(f"Error writing results store: {str(e)}")
+    
+    def persist_results(self):
+        """Write queued results to the results store now, and upload them when
+        it syncs to S3 (see results_store.persist)"""
+        if not config.RESULTS_STORE_ENABLED:
+            return
+        try:
+            import results_store
+            results_store.persist()
+        except Exception as e:
+            print(f"Error writing results store: {str(e)}")
+    
+    def find_results(self, restaurant=None, tags=(), free_of=(), name=None, limit=100):
+        """Stored dish results matching the filters, without running any pipeline.
+        
+        Allergen and tag filters are answered by the menu index when it is
+        enabled (dishes in the order they were stored), anything else by
+        ResultsStore.find (dishes by name).
+        """
+        if not config.RESULTS_STORE_ENABLED:
+            return []
+        import results_store
+        store = results_store.get_store()
+        if config.MENU_INDEX_ENABLED and not name:
+            import menu_index
+            dish_ids = menu_index.get_index(store).find(restaurant=restaurant, tags=tags, free_of=free_of, limit=limit)
+            return store.get_many(dish_ids)
+        return store.find(restaurant=restaurant, tags=tags, free_of=free_of, name=name, limit=limit)
+    
+    def export_menu(self, path, fmt=None, restaurant=None, thumbnails=True):
+        """Write the stored menu, or one restaurant's, to a CSV, Markdown or
+        HTML file (see menu_export.export_menu)"""
+        if not config.RESULTS_STORE_ENABLED:
+            return {"error": "The results store is disabled, so there is no menu to export."}
+        import menu_export
+        return menu_export.export_menu(path, fmt=fmt, restaurant=restaurant, thumbnails=thumbnails)
+    
+    def publish_menu(self, fmt="html", restaurant=None):
+        """Export the stored menu to a temporary file and save it to storage
+        under exports/ (S3 or the upload folder); return its location. The
+        file is copied or uploaded from disk, never read into memory, and
+        carries no thumbnails, which would stay behind on local disk."""
+        import menu_export
+        extensions = {name: extension for extension, name in menu_export.FORMATS.items()}
+        if fmt not in extensions:
+            return {"error": f"Unknown export format {fmt!r}; use one of {', '.join(sorted(extensions))}."}
+        directory = tempfile.mkdtemp(prefix="menu-export-")
+        try:
+            path = os.path.join(directory, f"menu{extensions[fmt]}")
+            result = self.export_menu(path, fmt=fmt, restaurant=restaurant, thumbnails=False)
+            if "error" not in result:
+                result["path"] = self.storage.save_local_file(path, f"exports/{uuid.uuid4()}{extensions[fmt]}")
+            return result
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    
+    def _run_stage(self, stage, skipped_stages, budget, dish_name, run):
+        """Run a stage, or skip it at once while its model's circuit is open"""
+        try:
+            return run()
+        except CircuitOpenError as e:
+            print(f"Skipping {stage}: {str(e)}")
+            return self._skip_stage(stage, skipped_stages, budget, dish_name, "model temporarily unavailable")
+    
+    def _run_pipeline(self, workflow_id, dish_name, image_bytes, spice_level, budget, quality_gate=True):
+        """Run the agent stages, degrading as the workflow budget runs short"""
+        skipped_stages = []
+        
+        # Turn away photos too poor to analyze before anything is spent on them
+        quality = self.check_quality(image_bytes) if quality_gate else None
+        if quality is not None and not quality["passed"]:
+            return {"error": " ".join(quality["messages"]), "quality": quality}
+        
+        # Step 1: Save the image
+        image_path = self.storage.save_image(image_bytes, workflow_id)
+        
+        # Step 2: Analyze the image with the Visionary Chef (S3-stored images
+        # are passed to Bedrock by reference rather than re-sent inline),
+        # unless the same photo was analyzed before under this name
+        chef_analysis, fingerprint = self.cached_analysis(image_bytes, dish_name)
+        reused_stages = ["visionary_chef"] if chef_analysis is not None else []
+        if chef_analysis is None:
+            if not budget.can_afford_stage("visionary_chef"):
+                return {
+                    "error": "The workflow budget is too small to analyze the image.",
+                    "budget": budget.report()
+                }
+            try:
+                chef_analysis = self.visionary_chef.analyze_image(dish_name, image_bytes, image_uri=image_path)
+            except CircuitOpenError as e:
+                # Nothing downstream works without the analysis; fail fast
+                return {
+                    "error": "Image analysis is temporarily unavailable. Please try again shortly.",
+                    "retry_after": round(e.retry_after)
+                }
+            self.remember_analysis(fingerprint, chef_analysis)
+        chef_analysis["spice_level"] = spice_level
+        chef_analysis["dish_name"] = dish_name
+        
+        # Check if the image contains food
+        if not chef_analysis.get("is_food", True):
+            return {
+                "error": "The uploaded image does not appear to contain food. Please upload an image of a food dish."
+            }
+        
+        # Downstream agents share one compacted serialization of the analysis
+        compactor = PromptCompactor(chef_analysis)
+        
+        # Reuse the name validation and dietary analysis of a near-identical
+        # dish (similar name, same ingredients) seen before
+        reused = self.reusable_results(dish_name, chef_analysis)
+        
+        # Step 3: Validate the dish name with the Authenticator, keeping room
+        # for the dietary analysis, which matters more
+        reserve = () if "dietary_detective" in reused else ("dietary_detective",)
+        if "authenticator" in reused:
+            auth_result = reused["authenticator"]
+        elif budget.can_afford_stage("authenticator", reserve=reserve):
+            auth_result = self._run_stage("authenticator", skipped_stages, budget, dish_name, lambda: (
+                self.authenticator.validate_name(dish_name, chef_analysis, compactor=compactor)
+            ))
+        else:
+            auth_result = self._skip_stage("authenticator", skipped_stages, budget, dish_name)
+        
+        # Step 4: Analyze dietary aspects with the Dietary Detective
+        if "dietary_detective" in reused:
+            dietary_analysis = reused["dietary_detective"]
+        elif budget.can_afford_stage("dietary_detective"):
+            dietary_analysis = self._run_stage("dietary_detective", skipped_stages, budget, dish_name, lambda: (
+                self.dietary_detective.analyze_dietary(chef_analysis, compactor=compactor)
+            ))
+        else:
+            dietary_analysis = self._skip_stage("dietary_detective", skipped_stages, budget, dish_name)
+        
+        # Step 5: Analyze side items with the Side Item Analyzer. This stage is
+        # optional, so it is the first to go when the description would not fit
+        if budget.can_afford_stage("side_item_analyzer", reserve=("culinary_wordsmith",)):
+            sides_analysis = self._run_stage("side_item_analyzer", skipped_stages, budget, dish_name, lambda: (
+                self.side_item_analyzer.analyze_sides(
+                    dish_name, image_bytes, chef_analysis, image_uri=image_path, compactor=compactor
+                )
+            ))
+        else:
+            sides_analysis = self._skip_stage("side_item_analyzer", skipped_stages, budget, dish_name)
+        
+        # Step 6: Generate the description with the Culinary Wordsmith, capping
+        # its output to what is left of the budget
+        max_tokens = budget.output_token_cap("culinary_wordsmith", 500)
+        if budget.can_afford(calls=1) and max_tokens >= MIN_DESCRIPTION_TOKENS:
+            if max_tokens < 500:
+                budget.degrade(f"capped culinary_wordsmith output at {max_tokens} tokens")
+            description = self._run_stage("culinary_wordsmith", skipped_stages, budget, dish_name, lambda: (
+                self.culinary_wordsmith.generate_description(
+                    auth_result["suggested_name"], 
+                    chef_analysis, 
+                    dietary_analysis,
+                    sides_analysis,
+                    compactor=compactor,
+                    max_tokens=max_tokens
+                )
+            ))
+        else:
+            description = self._skip_stage("culinary_wordsmith", skipped_stages, budget, dish_name)
+        
+        # Keep what was worked out here for the next near-identical dish
+        fresh = {"authenticator": auth_result, "dietary_detective": dietary_analysis}
+        self.remember_results(dish_name, chef_analysis, {
+            stage: value for stage, value in fresh.items() if stage not in reused and stage not in skipped_stages
+        })
+        
+        # Stages whose prompt lost items to its token budget saw only part of the dish
+        trimmed_stages = compactor.trimmed_stages()
+        
+        # Compile the final result
+        result = {
+            "dish_id": workflow_id,
+            "input_name": dish_name,
+            "processed_timestamp": datetime.datetime.now().isoformat(),
+            "image_uri": image_path,
+            "refined_name": auth_result["suggested_name"],
+            "generated_description": description,
+            "validation": {
+                "status": auth_result["validation_status"],
+                "notes": auth_result.get("reason", "")
+            },
+            "dietary_analysis": {
+                "allergens": dietary_analysis["allergens"],
+                "potential_allergens": dietary_analysis.get("potential_allergens", []),
+                "dietary_tags": dietary_analysis["dietary_tags"],
+                "disclaimer": dietary_analysis["disclaimer"],
+                "parsed": dietary_analysis.get("parsed", True)
+            },
+            "sides_analysis": {
+                "main_dish_components": sides_analysis.get("main_dish_components", []),
+                "side_items": sides_analysis.get("side_items", []),
+                "sauces_and_garnishes": sides_analysis.get("sauces_and_garnishes", []),
+                "presentation_notes": sides_analysis.get("presentation_notes", "")
+            },
+            "identified_components": chef_analysis["items"],
+            "partial": bool(skipped_stages or trimmed_stages),
+            "skipped_stages": skipped_stages,
+            "trimmed_stages": trimmed_stages,
+            "reused_stages": reused_stages + sorted(reused),
+            "quality_warnings": quality["messages"] if quality is not None else [],
+            "budget": budget.report()
+        }
+        
+        return result
@@ -1,22 +1,170 @@
 import os
-import boto3
+import re
+import mmap
+import time
 import uuid
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
 import config
 
+# Shard directory names (two hex digits of the image id's hash)
+_SHARD_NAME = re.compile(r"[0-9a-f]{2}$")
+# Left by a write that never finished; no write takes this long
+STALE_TMP_SECONDS = 3600
+
+def shard_dir(image_id, root=None, depth=None):
+    """Return the sharded directory for an image id (e.g. uploads/3f/a2)"""
+    root = root or config.UPLOAD_FOLDER
+    depth = config.UPLOAD_SHARD_DEPTH if depth is None else depth
+    digest = hashlib.sha1(str(image_id).encode('utf-8')).hexdigest()
+    parts = [digest[i * 2:i * 2 + 2] for i in range(depth)]
+    return os.path.join(root, *parts)
+
+class LocalStorageJanitor(threading.Thread):
+    """Background thread that keeps the local image store under a byte cap.
+
+    Only images in the shard directories are evicted; batch files, exports
+    and anything else under the root are left alone. Images older than
+    ``ttl_seconds`` are removed outright. If the images still take more than
+    ``max_bytes``, the least recently used (reads bump the mtime) are removed
+    until usage drops to ``low_watermark * max_bytes``. ``*.tmp`` files left
+    anywhere by interrupted writes are removed once STALE_TMP_SECONDS old.
+    """
+
+    def __init__(self, root, max_bytes=0, ttl_seconds=0, interval=300, low_watermark=0.9, shard_depth=None):
+        super().__init__(name="local-storage-janitor", daemon=True)
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.interval = interval
+        self.low_watermark = low_watermark
+        self.shard_depth = config.UPLOAD_SHARD_DEPTH if shard_depth is None else shard_depth
+        self._stop_event = threading.Event()
+
+    def _scan(self):
+        """Yield (mtime, size, path, is_image) for every file under the root.
+
+        Images are the .jpg files exactly ``shard_depth`` shard directories
+        down, as save_image writes them.
+        """
+        # (directory, shard depth, or None outside the shard directories)
+        stack = [(self.root, 0)]
+        while stack:
+            directory, depth = stack.pop()
+            try:
+                entries = os.scandir(directory)
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        in_shards = depth is not None and depth < self.shard_depth and _SHARD_NAME.match(entry.name)
+                        stack.append((entry.path, depth + 1 if in_shards else None))
+                        continue
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    yield st.st_mtime, st.st_size, entry.path, depth == self.shard_depth and entry.name.endswith('.jpg')
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def run_once(self):
+        """Apply TTL and size-cap eviction once; returns (files_evicted, bytes_freed),
+        counting stale temporary files"""
+        now = time.time()
+        files = []
+        total = 0
+        evicted = 0
+        freed = 0
+
+        for mtime, size, path, is_image in self._scan():
+            if path.endswith('.tmp'):
+                if now - mtime > STALE_TMP_SECONDS and self._remove(path):
+                    evicted += 1
+                    freed += size
+                continue
+            if not is_image:
+                continue
+            if self.ttl_seconds and now - mtime > self.ttl_seconds:
+                if self._remove(path):
+                    evicted += 1
+                    freed += size
+                continue
+            files.append((mtime, size, path))
+            total += size
+
+        if self.max_bytes and total > self.max_bytes:
+            target = int(self.max_bytes * self.low_watermark)
+            files.sort()
+            for mtime, size, path in files:
+                if total <= target:
+                    break
+                if self._remove(path):
+                    evicted += 1
+                    freed += size
+                total -= size
+
+        return evicted, freed
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                evicted, freed = self.run_once()
+                if evicted:
+                    print(f"Storage janitor evicted {evicted} files ({freed} bytes)")
+            except Exception as e:
+                print(f"Error in storage janitor: {str(e)}")
+
+    def stop(self):
+        self._stop_event.set()
+
+_janitor = None
+_janitor_lock = threading.Lock()
+
+def _ensure_janitor():
+    """Start the process-wide janitor once if a cap or TTL is configured"""
+    global _janitor
+    if not (config.UPLOAD_MAX_BYTES or config.UPLOAD_TTL_SECONDS):
+        return None
+    with _janitor_lock:
+        if _janitor is None:
+            _janitor = LocalStorageJanitor(
+                config.UPLOAD_FOLDER,
+                max_bytes=config.UPLOAD_MAX_BYTES,
+                ttl_seconds=config.UPLOAD_TTL_SECONDS,
+                interval=config.UPLOAD_JANITOR_INTERVAL
+            )
+            _janitor.start()
+    return _janitor
+
+# Shard directories already created by this process
+_known_dirs = set()
+
 class StorageService:
     """Storage service that works locally or in AWS"""
-    
+
     def __init__(self):
         self.env = os.environ.get('ENVIRONMENT', 'local')
         self.s3_bucket = os.environ.get('S3_BUCKET', 'menu-maestro-images')
-    
+        if not config.USE_S3:
+            _ensure_janitor()
+
     def save_image(self, image_bytes, image_id=None):
         """Save an image to storage and return its path/URL"""
         if image_id is None:
             image_id = str(uuid.uuid4())
-            
+
         if config.USE_S3:
             # S3 implementation
+            import boto3
             s3_client = boto3.client('s3')
             key = f"uploads/{image_id}.jpg"
             s3_client.put_object(
@@ -26,23 +174,107 @@ class StorageService:
             )
             return f"s3://{self.s3_bucket}/{key}"
         else:
-            # Local filesystem implementation
-            os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
-            local_path = f"{config.UPLOAD_FOLDER}/{image_id}.jpg"
-            with open(local_path, 'wb') as f:
+            # Local filesystem implementation, sharded by a hash prefix so no
+            # single directory grows past a few thousand entries
+            directory = shard_dir(image_id)
+            if directory not in _known_dirs:
+                os.makedirs(directory, exist_ok=True)
+                _known_dirs.add(directory)
+            local_path = os.path.join(directory, f"{image_id}.jpg")
+            tmp_path = f"{local_path}.tmp"
+            with open(tmp_path, 'wb') as f:
                 f.write(image_bytes)
+            os.replace(tmp_path, local_path)
             return local_path
-    
+
     def get_image(self, path_or_key):
         """Get image bytes from storage"""
+        with self.open_image(path_or_key) as buffer:
+            return bytes(buffer)
+
+    @contextmanager
+    def open_image(self, path_or_key):
+        """Image bytes from storage, for use in a with block.
+
+        Local files of at least ``config.UPLOAD_MMAP_MIN_BYTES`` are yielded
+        as a read-only ``mmap`` rather than a bytes copy and unmapped when
+        the block ends; it supports the buffer protocol, so base64, hashlib
+        and ``io.BytesIO`` accept it directly.
+        """
         if path_or_key.startswith('s3://'):
             # S3 implementation
+            import boto3
+            s3_client = boto3.client('s3')
+            bucket = path_or_key.split('/')[2]
+            key = '/'.join(path_or_key.split('/')[3:])
+            response = s3_client.get_object(Bucket=bucket, Key=key)
+            yield response['Body'].read()
+            return
+        # Local filesystem implementation
+        with open(path_or_key, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0 or size < config.UPLOAD_MMAP_MIN_BYTES:
+                # Mapping costs more than copying for small files
+                buffer = f.read()
+            else:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Bump the mtime so the janitor evicts least recently used files first
+        try:
+            os.utime(path_or_key)
+        except OSError:
+            pass
+        try:
+            yield buffer
+        finally:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+
+    def save_file(self, data, key):
+        """Save arbitrary bytes (e.g. batch job files) under a relative key and return its path/URL"""
+        if config.USE_S3:
+            import boto3
+            s3_client = boto3.client('s3')
+            s3_client.put_object(
+                Bucket=self.s3_bucket,
+                Key=key,
+                Body=data
+            )
+            return f"s3://{self.s3_bucket}/{key}"
+        else:
+            local_path = os.path.join(config.UPLOAD_FOLDER, key)
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            tmp_path = f"{local_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, local_path)
+            return local_path
+
+    def save_local_file(self, source_path, key):
+        """Save a file on local disk (e.g. a menu export) under a relative key
+        without reading it into memory, and return its path/URL"""
+        if config.USE_S3:
+            import boto3
+            s3_client = boto3.client('s3')
+            # upload_file streams the file, in parts when it is large
+            s3_client.upload_file(source_path, self.s3_bucket, key)
+            return f"s3://{self.s3_bucket}/{key}"
+        else:
+            local_path = os.path.join(config.UPLOAD_FOLDER, key)
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            tmp_path = f"{local_path}.tmp"
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, local_path)
+            return local_path
+
+    def get_file(self, path_or_key):
+        """Get the bytes of a file saved with save_file"""
+        if path_or_key.startswith('s3://'):
+            import boto3
             s3_client = boto3.client('s3')
             bucket = path_or_key.split('/')[2]
             key = '/'.join(path_or_key.split('/')[3:])
             response = s3_client.get_object(Bucket=bucket, Key=key)
             return response['Body'].read()
         else:
-            # Local filesystem implementation
             with open(path_or_key, 'rb') as f:
-                return f.read()
\ No newline at end of file
+                return f.read()
@@ -1,4 +1,5 @@
 import os
+import base64
 import boto3
 
 def get_bedrock_client():
@@ -16,4 +17,23 @@ def get_bedrock_client():
             region_name=region,
             aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
             aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY")
-        )
\ No newline at end of file
+        )
+
+def build_image_block(image_bytes=None, image_uri=None, image_format="jpeg"):
+    """Build a Nova image content block, referencing S3 objects by URI when possible"""
+    payload_mode = os.environ.get("IMAGE_PAYLOAD_MODE", "auto").lower()
+    
+    if image_uri and image_uri.startswith("s3://") and payload_mode != "inline":
+        s3_location = {"uri": image_uri}
+        if os.environ.get("S3_BUCKET_OWNER"):
+            s3_location["bucketOwner"] = os.environ["S3_BUCKET_OWNER"]
+        source = {"s3Location": s3_location}
+    else:
+        source = {"bytes": base64.b64encode(image_bytes).decode('utf-8')}
+    
+    return {
+        "image": {
+            "format": image_format,
+            "source": source
+        }
+    }
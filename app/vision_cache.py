@@ -0,0 +1,260 @@
+import io
+import os
+import re
+import copy
+import json
+import hashlib
+import threading
+from functools import lru_cache
+import numpy as np
+from PIL import Image
+import config
+
+HASH_BITS = 64
+CHUNK_BITS = 16
+# Side of the colour thumbnail that confirms a perceptual-hash match
+COLOR_GRID = 8
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+def name_key(dish_name):
+    """The dish name as the analysis was asked for it, ignoring case, spacing and punctuation"""
+    return " ".join(_WORD.findall((dish_name or "").lower()))
+
+def decode(image_bytes):
+    """The photo as a small RGB image, enough for every hash"""
+    image = Image.open(io.BytesIO(image_bytes))
+    # JPEGs can be decoded straight at 1/2, 1/4 or 1/8 scale, far cheaper
+    # than a full decode
+    image.draft("RGB", (128, 128))
+    return image.convert("RGB")
+
+def _grayscale(image, width, height):
+    return np.asarray(image.convert("L").resize((width, height), Image.LANCZOS), dtype=np.float32)
+
+def _pack(bits):
+    return int(np.packbits(bits.ravel()).view(">u8")[0])
+
+def dhash(image):
+    """64-bit difference hash: is each pixel of a 9x8 thumbnail brighter than its right neighbour"""
+    pixels = _grayscale(image, 9, 8)
+    return _pack(pixels[:, 1:] > pixels[:, :-1])
+
+@lru_cache(maxsize=1)
+def _dct_matrix(size):
+    n = np.arange(size)
+    return np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size)).astype(np.float32)
+
+def phash(image):
+    """64-bit DCT hash: the 8x8 lowest frequencies of a 32x32 thumbnail against their median"""
+    dct = _dct_matrix(32)
+    low = (dct @ _grayscale(image, 32, 32) @ dct.T)[:8, :8].ravel()
+    # The DC term only encodes overall brightness
+    return _pack(low > np.median(low[1:]))
+
+def colors(image):
+    """COLOR_GRID x COLOR_GRID RGB thumbnail; grayscale hashes can't tell a
+    tomato sauce from a pesto on the same white plate"""
+    return np.asarray(image.resize((COLOR_GRID, COLOR_GRID), Image.BILINEAR), dtype=np.uint8)
+
+def color_difference(a, b):
+    """Mean absolute difference of two colour thumbnails, 0-255"""
+    return float(np.abs(a.astype(np.int16) - b.astype(np.int16)).mean())
+
+HASHES = {"dhash": dhash, "phash": phash}
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+@lru_cache(maxsize=None)
+def _flip_masks(radius):
+    """Every CHUNK_BITS-bit mask with at most ``radius`` bits set"""
+    masks = [0]
+    for _ in range(radius):
+        masks = sorted(set(masks) | {mask | (1 << bit) for mask in masks for bit in range(CHUNK_BITS)})
+    return masks
+
+class HammingIndex:
+    """Multi-index hashing over 64-bit hashes.
+
+    Each hash is split into four 16-bit chunks, each with its own table.
+    Two hashes within distance d differ in at least one chunk by at most
+    d // 4 bits, so probing every chunk value that close in every table
+    finds all matches (a few hundred dict lookups at d <= 11); candidates
+    are then checked by their full Hamming distance.
+    """
+
+    def __init__(self):
+        self.hashes = []
+        self._tables = [{} for _ in range(HASH_BITS // CHUNK_BITS)]
+
+    def _chunks(self, value):
+        return [(value >> (CHUNK_BITS * i)) & ((1 << CHUNK_BITS) - 1) for i in range(len(self._tables))]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, value):
+        row = len(self.hashes)
+        self.hashes.append(value)
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            table.setdefault(chunk, []).append(row)
+        return row
+
+    def search(self, value, max_distance):
+        """(distance, row) of every stored hash within max_distance, closest first"""
+        masks = _flip_masks(max_distance // len(self._tables))
+        candidates = set()
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            for mask in masks:
+                candidates.update(table.get(chunk ^ mask, ()))
+        matches = [(hamming(value, self.hashes[row]), row) for row in candidates]
+        return sorted(match for match in matches if match[0] <= max_distance)
+
+class VisionCache:
+    """Visionary Chef analyses keyed by the photo they were made from and the
+    dish name they were asked for (the prompt names the dish, so the same
+    photo under another name gets an analysis of its own).
+
+    A lookup first tries the photo's sha256, then its perceptual hash
+    (``method``, see HASHES): a stored photo within ``max_distance`` bits
+    whose colour thumbnail is within ``max_color_difference`` is taken to be
+    the same shot resized, recompressed or slightly cropped. Plated food
+    photos look alike in grayscale, so the hash alone would match different
+    dishes on the same plates. Entries are appended to a JSONL file under
+    ``directory`` and indexed in memory when the cache is opened.
+
+    One process should write to a directory at a time.
+    """
+
+    def __init__(self, directory=None, max_distance=None, max_color_difference=None, method=None):
+        self.directory = directory or config.VISION_CACHE_DIR
+        self.max_distance = config.VISION_CACHE_MAX_DISTANCE if max_distance is None else max_distance
+        self.max_color_difference = (config.VISION_CACHE_MAX_COLOR_DIFF if max_color_difference is None
+                                     else max_color_difference)
+        self.method = method or config.VISION_CACHE_HASH
+        self._hash = HASHES[self.method]
+        self._exact = {}
+        self._analyses = []
+        self._colors = []
+        self._names = []
+        self._index = HammingIndex()
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "exact_hits": 0, "near_hits": 0, "color_rejects": 0, "stored": 0}
+        os.makedirs(self.directory, exist_ok=True)
+
+        path = os.path.join(self.directory, f"analyses-{self.method}.jsonl")
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        # Entries from before names were kept match no name
+                        fingerprint = (entry["sha256"], int(entry["hash"], 16),
+                                       np.frombuffer(bytes.fromhex(entry["colors"]), dtype=np.uint8),
+                                       entry.get("name"))
+                        self._insert(fingerprint, entry["analysis"])
+        self._file = open(path, "a")
+
+    def _insert(self, fingerprint, analysis):
+        sha256, perceptual_hash, thumbnail, name = fingerprint
+        self._exact[(sha256, name)] = len(self._analyses)
+        self._analyses.append(analysis)
+        self._colors.append(thumbnail.ravel())
+        self._names.append(name)
+        self._index.add(perceptual_hash)
+
+    def __len__(self):
+        return len(self._analyses)
+
+    def fingerprint(self, image_bytes, dish_name=""):
+        """(sha256, perceptual hash, colour thumbnail, name key) of a photo
+        analyzed as ``dish_name``; the hash and thumbnail are None if Pillow
+        can't read it"""
+        sha256 = hashlib.sha256(image_bytes).hexdigest()
+        name = name_key(dish_name)
+        try:
+            image = decode(image_bytes)
+            return sha256, self._hash(image), colors(image).ravel(), name
+        except Exception as e:
+            print(f"Error hashing image: {str(e)}")
+            return sha256, None, None, name
+
+    def lookup(self, fingerprint):
+        """(analysis, distance) of the same or nearest matching photo under the
+        same dish name, or (None, None)"""
+        sha256, perceptual_hash, thumbnail, name = fingerprint
+        with self._lock:
+            self._stats["lookups"] += 1
+            row = self._exact.get((sha256, name))
+            if row is not None:
+                self._stats["exact_hits"] += 1
+                return copy.deepcopy(self._analyses[row]), 0
+            if perceptual_hash is None:
+                return None, None
+            for distance, row in self._index.search(perceptual_hash, self.max_distance):
+                if self._names[row] != name:
+                    continue
+                if color_difference(thumbnail, self._colors[row]) <= self.max_color_difference:
+                    self._stats["near_hits"] += 1
+                    return copy.deepcopy(self._analyses[row]), distance
+                self._stats["color_rejects"] += 1
+            return None, None
+
+    def add(self, fingerprint, analysis):
+        sha256, perceptual_hash, thumbnail, name = fingerprint
+        if perceptual_hash is None:
+            return
+        entry = {"sha256": sha256, "hash": f"{perceptual_hash:016x}", "colors": thumbnail.tobytes().hex(),
+                 "name": name, "analysis": analysis}
+        with self._lock:
+            if (sha256, name) in self._exact:
+                return
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            self._insert(fingerprint, copy.deepcopy(analysis))
+            self._stats["stored"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._analyses), method=self.method, max_distance=self.max_distance)
+        lookups = stats["lookups"]
+        stats["hit_rate"] = round((stats["exact_hits"] + stats["near_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """The process-wide cache in VISION_CACHE_DIR, or None when disabled"""
+    global _cache
+    if not config.VISION_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = VisionCache()
+        return _cache
+
+def stats():
+    return _cache.stats() if _cache is not None else {}
+
+def lookup(image_bytes, dish_name):
+    """(cached analysis of the photo as ``dish_name`` or None, fingerprint to
+    remember a fresh analysis under)"""
+    cache = get_cache()
+    if cache is None:
+        return None, None
+    fingerprint = cache.fingerprint(image_bytes, dish_name)
+    analysis, _ = cache.lookup(fingerprint)
+    return analysis, fingerprint
+
+def remember(fingerprint, chef_analysis):
+    """Store a fresh analysis, unless it is the empty fallback of an unparseable reply"""
+    cache = get_cache()
+    if cache is None or fingerprint is None:
+        return
+    if chef_analysis.get("items") or not chef_analysis.get("is_food", True):
+        # Per-request fields are set again by whoever reuses the analysis
+        cache.add(fingerprint, {
+            key: value for key, value in chef_analysis.items() if key not in ("dish_name", "spice_level")
+        })
@@ -1,6 +1,38 @@
 import json
-import base64
-from bedrock_utils import get_bedrock_client
+import textwrap
+import config
+from ingredients import normalize_items
+from prompt_cache import CACHE_POINT
+from bedrock_utils import get_bedrock_client, build_image_block, invoke_nova
+
+# Instructions shared by every image; sent ahead of the image so they can be cached
+FOOD_CHECK_INSTRUCTIONS = textwrap.dedent("""
+    Does the image below contain food? Answer with ONLY 'yes' or 'no'.
+    If the image shows any edible food items, even if they're part of a larger scene, answer 'yes'.
+    If the image contains NO food whatsoever (e.g., landscapes, people, objects, etc.), answer 'no'.
+""").strip()
+
+ANALYSIS_INSTRUCTIONS = textwrap.dedent("""
+    You will be given a food image and its dish name after these instructions. Analyze the dish in extreme detail.
+    
+    Identify:
+    1. Primary Components: The main protein, carbohydrate, and key vegetables
+    2. Secondary Ingredients & Garnishes: Herbs, sauces, seeds, spices, and other toppings
+    3. Cooking Method: Visual cues that suggest the cooking style (e.g., grilled, fried, steamed)
+    4. Presentation Style: How the dish is plated
+    
+    Format your response as a JSON object with the following structure:
+    {
+        "items": [
+            {"item": "ingredient name", "confidence": 0.XX},
+            ...
+        ],
+        "cooking_style": "method",
+        "presentation": "description"
+    }
+    
+    Assign a confidence score between 0 and 1 to each identified item based on your certainty.
+""").strip()
 
 class VisionaryChefAgent:
     """Analyzes the food image to identify ingredients and cooking style"""
@@ -8,33 +40,46 @@ class VisionaryChefAgent:
     def __init__(self, bedrock_client=None):
         self.bedrock_client = bedrock_client or get_bedrock_client()
     
-    def _verify_food_image(self, image_bytes):
+    def _verify_food_image(self, image_bytes=None, image_uri=None, image_block=None):
         """Verify that the image contains food"""
-        # Encode image as base64
-        base64_string = base64.b64encode(image_bytes).decode('utf-8')
-        
-        # Define system prompt
-        system_list = [{"text": "You are a food image verification expert. Your only task is to determine if an image contains food or not."}]
-        
-        # Define user message with image
-        prompt_text = """
-        Does this image contain food? Answer with ONLY 'yes' or 'no'.
-        If the image shows any edible food items, even if they're part of a larger scene, answer 'yes'.
-        If the image contains NO food whatsoever (e.g., landscapes, people, objects, etc.), answer 'no'.
-        """
+        request_body = self.build_food_check_request(image_bytes, image_uri, image_block)
         
+        try:
+            # Call the Bedrock API
+            result_text = invoke_nova(
+                self.bedrock_client,
+                request_body,
+                "food_check",
+                accept=lambda text: text.strip().lower().startswith(("yes", "no"))
+            )
+            return self.parse_food_check_response(result_text)
+        except Exception as e:
+            print(f"Error verifying food image: {str(e)}")
+            # Default to True in case of error to avoid blocking legitimate requests
+            return True
+    
+    def build_food_check_request(self, image_bytes=None, image_uri=None, image_block=None):
+        """Build the Nova request payload for the food check"""
+        # Reference the stored image by URI when possible, otherwise inline it
+        if image_block is None:
+            image_block = build_image_block(image_bytes, image_uri)
+        
+        # Define system prompt; everything before the image is static and
+        # ends in a prompt-cache checkpoint
+        system_list = [
+            {"text": "You are a food image verification expert. Your only task is to determine if an image contains food or not."},
+            CACHE_POINT
+        ]
+        
+        # Define user message: static question first, then the image
         message_list = [{
             "role": "user",
             "content": [
                 {
-                    "image": {
-                        "format": "jpeg",
-                        "source": {"bytes": base64_string}
-                    }
+                    "text": FOOD_CHECK_INSTRUCTIONS
                 },
-                {
-                    "text": prompt_text
-                }
+                CACHE_POINT,
+                image_block
             ]
         }]
         
@@ -54,71 +99,53 @@ class VisionaryChefAgent:
             "inferenceConfig": inf_params
         }
         
-        try:
-            # Call the Bedrock API
-            response = self.bedrock_client.invoke_model(
-                modelId="us.amazon.nova-pro-v1:0",
-                body=json.dumps(request_body)
-            )
-            
-            # Parse the response
-            response_body = json.loads(response['body'].read())
-            result_text = response_body["output"]["message"]["content"][0]["text"].strip().lower()
-            
-            # Check if the response indicates food
-            return "yes" in result_text
-        except Exception as e:
-            print(f"Error verifying food image: {str(e)}")
-            # Default to True in case of error to avoid blocking legitimate requests
-            return True
+        return request_body
     
-    def analyze_image(self, dish_name, image_bytes):
+    def parse_food_check_response(self, result_text):
+        """Whether a food check reply says the image contains food"""
+        return "yes" in result_text.strip().lower()
+    
+    def analyze_image(self, dish_name, image_bytes=None, image_uri=None):
         """Analyze the image and identify components"""
+        # Build the image block once and share it between both calls
+        image_block = build_image_block(image_bytes, image_uri)
+        
         # First verify the image contains food
-        is_food = self._verify_food_image(image_bytes)
+        is_food = self._verify_food_image(image_block=image_block)
         
-        # Encode image as base64
-        base64_string = base64.b64encode(image_bytes).decode('utf-8')
+        request_body = self.build_request(dish_name, image_block=image_block)
         
-        # Define system prompt
+        # Call the Bedrock API
+        result_text = invoke_nova(self.bedrock_client, request_body, "visionary_chef")
+        
+        return self.parse_response(result_text, is_food)
+    
+    def build_request(self, dish_name, image_bytes=None, image_uri=None, image_block=None):
+        """Build the Nova request payload for the image analysis"""
+        if image_block is None:
+            image_block = build_image_block(image_bytes, image_uri)
+        
+        # Define system prompt; it and the instructions are identical for
+        # every dish, so both end in a prompt-cache checkpoint
         system_list = [{
             "text": "You are the Visionary Chef, an expert culinary professional with decades of experience. "
                     "Your task is to analyze food images with exceptional detail and precision. "
                     "Provide structured, accurate information about the dish components, cooking methods, and presentation."
-        }]
+        }, CACHE_POINT]
         
-        # Define user message with image and text
+        # Define user message: static instructions first, then the image and dish name
         prompt_text = f"""
-        Analyze this image of a dish called "{dish_name}" in extreme detail.
-        
-        Identify:
-        1. Primary Components: The main protein, carbohydrate, and key vegetables
-        2. Secondary Ingredients & Garnishes: Herbs, sauces, seeds, spices, and other toppings
-        3. Cooking Method: Visual cues that suggest the cooking style (e.g., grilled, fried, steamed)
-        4. Presentation Style: How the dish is plated
-        
-        Format your response as a JSON object with the following structure:
-        {{
-            "items": [
-                {{"item": "ingredient name", "confidence": 0.XX}},
-                ...
-            ],
-            "cooking_style": "method",
-            "presentation": "description"
-        }}
-        
-        Assign a confidence score between 0 and 1 to each identified item based on your certainty.
+        Analyze this image of a dish called "{dish_name}".
         """
         
         message_list = [{
             "role": "user",
             "content": [
                 {
-                    "image": {
-                        "format": "jpeg",
-                        "source": {"bytes": base64_string}
-                    }
+                    "text": ANALYSIS_INSTRUCTIONS
                 },
+                CACHE_POINT,
+                image_block,
                 {
                     "text": prompt_text
                 }
@@ -141,16 +168,10 @@ class VisionaryChefAgent:
             "inferenceConfig": inf_params
         }
         
-        # Call the Bedrock API
-        response = self.bedrock_client.invoke_model(
-            modelId="us.amazon.nova-pro-v1:0",
-            body=json.dumps(request_body)
-        )
-        
-        # Parse the response
-        response_body = json.loads(response['body'].read())
-        result_text = response_body["output"]["message"]["content"][0]["text"]
-        
+        return request_body
+    
+    def parse_response(self, result_text, is_food=True):
+        """Parse an image analysis reply, falling back to an empty analysis"""
         # Extract JSON from the response
         try:
             # Find JSON content between triple backticks if present
@@ -170,6 +191,10 @@ class VisionaryChefAgent:
             parsed_result = json.loads(json_str)
             # Add the food verification result
             parsed_result["is_food"] = is_food
+            # Canonical ingredient ids keep cache keys and prompts stable
+            # however the items happen to be worded
+            if config.INGREDIENT_NORMALIZATION_ENABLED:
+                normalize_items(parsed_result)
             return parsed_result
         except Exception as e:
             print(f"Error parsing Visionary Chef response: {str(e)}")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Run a whole-menu refresh through bulk (batch-inference) mode locally.
+
+Generates N dishes, runs them through BulkInferenceRunner with
+LocalBatchSubmitter answering the staged JSONL files from the fake Bedrock
+client, and compares jobs, model calls and wall time with calling
+process_dish once per dish. Batch files are staged in a temporary upload
+folder.
+
+Usage:
+    python benchmarks/bench_bulk_inference.py [--dishes 50]
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+sys.path.insert(0, BENCH_DIR)
+
+# Stage batch files and images in a scratch folder, never in S3
+UPLOAD_ROOT = tempfile.mkdtemp(prefix="menu-bulk-")
+os.environ["UPLOAD_FOLDER"] = UPLOAD_ROOT
+os.environ["USE_S3"] = "false"
+
+from fake_bedrock import FakeBedrockClient  # noqa: E402
+from orchestrator import OrchestratorAgent  # noqa: E402
+from bulk_inference import BulkInferenceRunner, LocalBatchSubmitter  # noqa: E402
+
+def make_photo(seed, size=(320, 320)):
+    """A small JPEG of random shapes, distinct per seed, that the vision cache
+    can hash and the quality gate passes"""
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new("RGB", size, tuple(rng.randrange(60, 200) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(30):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randrange(width // 20, width // 4)
+        draw.ellipse((x, y, x + radius, y + radius), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+def build_menu(records, count):
+    return [
+        {
+            "dish_name": f"{records[index % len(records)]['dish_name']} #{index + 1}",
+            "spice_level": records[index % len(records)].get("spice_level", "Medium"),
+            "image_bytes": make_photo(index)
+        }
+        for index in range(count)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dishes", type=int, default=50)
+    parser.add_argument("--workload", default=os.path.join(BENCH_DIR, "workloads", "recorded_dishes.jsonl"))
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per model call")
+    args = parser.parse_args()
+
+    with open(args.workload) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    dishes = build_menu(records, args.dishes)
+
+    try:
+        client = FakeBedrockClient(latency=args.latency)
+        orchestrator = OrchestratorAgent(bedrock_client=client)
+        started = time.perf_counter()
+        interactive = [orchestrator.process_dish(d["dish_name"], d["image_bytes"], d["spice_level"]) for d in dishes]
+        interactive_time = time.perf_counter() - started
+        interactive_calls = len(client.calls)
+
+        client = FakeBedrockClient(latency=args.latency)
+        runner = BulkInferenceRunner(LocalBatchSubmitter(client), bedrock_client=client)
+        started = time.perf_counter()
+        bulk = runner.run(dishes)
+        bulk_time = time.perf_counter() - started
+
+        assert len(bulk) == len(dishes) and all(r.get("generated_description") for r in bulk)
+        assert set(bulk[0]) <= set(interactive[0])
+        staged = sum(len(files) for _, _, files in os.walk(os.path.join(UPLOAD_ROOT, "batch")))
+
+        print(f"{len(dishes)} dishes, {args.latency * 1000:.0f}ms per model call\n")
+        print(f"{'mode':<12} {'jobs':>5} {'records':>8} {'model calls':>12} {'wall s':>8}")
+        print(f"{'interactive':<12} {'-':>5} {'-':>8} {interactive_calls:>12} {interactive_time:>8.2f}")
+        print(f"{'bulk':<12} {runner.stats['jobs']:>5} {runner.stats['records']:>8} {len(client.calls):>12} {bulk_time:>8.2f}")
+        print(f"\n{staged} batch files staged ({runner.stats['failed_records']} failed records); "
+              "real batch jobs run asynchronously at batch pricing")
+    finally:
+        shutil.rmtree(UPLOAD_ROOT, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
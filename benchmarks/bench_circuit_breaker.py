@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Show how the per-model circuit breaker behaves through a Bedrock outage.
+
+Runs dishes through process_dish in three phases (healthy, outage, recovered)
+against the fake Bedrock client. During the outage every call to one model
+(the Authenticator's by default) hangs for --timeout seconds and then fails,
+as a call does when it runs into the botocore read timeout. The run is done
+with the breakers disabled and enabled; for each phase it reports complete,
+partial and failed dishes, per-dish latency and the calls that reached the
+failing model.
+
+Usage:
+    python benchmarks/bench_circuit_breaker.py [--outage-dishes 30] [--timeout 0.2]
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import statistics
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+sys.path.insert(0, BENCH_DIR)
+
+# Keep uploaded test images out of the repository and S3
+UPLOAD_ROOT = tempfile.mkdtemp(prefix="menu-breaker-")
+os.environ["UPLOAD_FOLDER"] = UPLOAD_ROOT
+os.environ["USE_S3"] = "false"
+
+from fake_bedrock import FakeBedrockClient, FakeClientError  # noqa: E402
+from circuit_breaker import breakers  # noqa: E402
+from model_routing import router  # noqa: E402
+from orchestrator import OrchestratorAgent  # noqa: E402
+
+def make_photo(seed, size=(320, 320)):
+    """A small JPEG of random shapes, distinct per seed, that the vision cache
+    can hash and the quality gate passes"""
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new("RGB", size, tuple(rng.randrange(60, 200) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(30):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randrange(width // 20, width // 4)
+        draw.ellipse((x, y, x + radius, y + radius), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+class DegradedClient(FakeBedrockClient):
+    """Fake client whose calls to one model time out while ``down`` is set"""
+
+    def __init__(self, failing_model, timeout, **kwargs):
+        super().__init__(**kwargs)
+        self.failing_model = failing_model
+        self.timeout = timeout
+        self.down = False
+        self.failing_calls = 0
+
+    def invoke_model(self, modelId, body, **kwargs):
+        if modelId == self.failing_model:
+            self.failing_calls += 1
+            if self.down:
+                time.sleep(self.timeout)
+                raise FakeClientError("ModelTimeoutException")
+        return super().invoke_model(modelId, body, **kwargs)
+
+def run(records, args, enabled):
+    breakers.enabled = enabled
+    client = DegradedClient(router.model_for(args.stage), args.timeout, latency=args.latency)
+    orchestrator = OrchestratorAgent(bedrock_client=client)
+    phases = [("healthy", args.healthy_dishes, False), ("outage", args.outage_dishes, True),
+              ("recovered", args.recovered_dishes, False)]
+
+    rows = []
+    index = 0
+    for phase, count, down in phases:
+        client.down = down
+        failing_calls = client.failing_calls
+        counts = {"complete": 0, "partial": 0, "failed": 0}
+        latencies = []
+        if phase == "recovered":
+            # Give open breakers time to let a probe through
+            time.sleep(args.open_seconds)
+        for _ in range(count):
+            record = records[index % len(records)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                result = orchestrator.process_dish(f"{record['dish_name']} #{index}", make_photo(f"{enabled}-{index}"))
+                counts["failed" if "error" in result else "partial" if result["partial"] else "complete"] += 1
+            except Exception:
+                counts["failed"] += 1
+            latencies.append(time.perf_counter() - started)
+        rows.append((phase, counts, statistics.median(latencies), max(latencies), client.failing_calls - failing_calls))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", default=os.path.join(BENCH_DIR, "workloads", "recorded_dishes.jsonl"))
+    parser.add_argument("--stage", default="authenticator", help="stage whose model fails during the outage")
+    parser.add_argument("--healthy-dishes", type=int, default=10)
+    parser.add_argument("--outage-dishes", type=int, default=30)
+    parser.add_argument("--recovered-dishes", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=0.2, help="seconds a failing call hangs before erroring")
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per healthy call")
+    parser.add_argument("--open-seconds", type=float, default=0.5, help="how long a tripped breaker stays open")
+    args = parser.parse_args()
+
+    with open(args.workload) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    breakers.settings.update(open_seconds=args.open_seconds)
+
+    try:
+        print(f"{router.model_for(args.stage)} ({args.stage}) fails after {args.timeout * 1000:.0f}ms during the outage\n")
+        print(f"{'breaker':<8} {'phase':<10} {'complete':>9} {'partial':>8} {'failed':>7} "
+              f"{'p50 ms':>8} {'max ms':>8} {'calls to failing model':>23}")
+        for enabled in (False, True):
+            for phase, counts, p50, worst, failing_calls in run(records, args, enabled):
+                print(f"{'on' if enabled else 'off':<8} {phase:<10} {counts['complete']:>9} {counts['partial']:>8} "
+                      f"{counts['failed']:>7} {p50 * 1000:>8.1f} {worst * 1000:>8.1f} {failing_calls:>23}")
+        print(f"\nbreakers: {json.dumps(breakers.stats())}")
+    finally:
+        shutil.rmtree(UPLOAD_ROOT, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Compare Bedrock call latency with and without request hedging.
+
+Sends Dietary Detective requests through RequestHedger to a fake Bedrock
+client with a long-tail latency distribution (most calls fast, a few very
+slow), once with hedging disabled and once enabled, and reports p50/p90/p99
+latency plus how many hedges were fired and won.
+
+Usage:
+    python benchmarks/bench_hedging.py [--requests 400] [--tail-rate 0.05]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_bedrock import FakeBedrockClient  # noqa: E402
+from hedging import RequestHedger  # noqa: E402
+
+REQUEST = {
+    "system": [{"text": "You are the Dietary Detective."}],
+    "messages": [{"role": "user", "content": [{"text": "Identify allergens in a cheeseburger."}]}],
+    "inferenceConfig": {"maxTokens": 500}
+}
+
+def long_tail(fast, slow, tail_rate):
+    def latency(rng):
+        if rng.random() < tail_rate:
+            return slow * rng.uniform(0.8, 1.2)
+        return fast * rng.uniform(0.7, 1.3)
+    return latency
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100.0), len(ordered) - 1)]
+
+def run(hedger, client, requests):
+    route = ("dietary_detective", "fake-model")
+    body = json.dumps(REQUEST)
+
+    def send():
+        response = client.invoke_model(modelId=route[1], body=body)
+        return json.loads(response["body"].read())
+
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        hedger.call(route, send)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--fast", type=float, default=0.02, help="typical latency in seconds")
+    parser.add_argument("--slow", type=float, default=0.4, help="tail latency in seconds")
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--max-hedge-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    latency = long_tail(args.fast, args.slow, args.tail_rate)
+    print(f"{args.requests} requests, {args.fast * 1000:.0f}ms typical, "
+          f"{args.tail_rate:.0%} at ~{args.slow * 1000:.0f}ms\n")
+    print(f"{'mode':<10} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'calls sent':>11} {'fired':>6} {'won':>5}")
+    for enabled in (False, True):
+        client = FakeBedrockClient(latency=latency, seed=args.seed)
+        hedger = RequestHedger(enabled=enabled, percentile=90, max_hedge_rate=args.max_hedge_rate, min_samples=20)
+        latencies = run(hedger, client, args.requests)
+        stats = hedger.stats()
+        print(f"{'hedged' if enabled else 'baseline':<10} "
+              f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 90) * 1000:>8.1f} "
+              f"{percentile(latencies, 99) * 1000:>8.1f} {len(client.calls):>11} "
+              f"{stats['hedges_fired']:>6} {stats['hedges_won']:>5}")
+
+if __name__ == "__main__":
+    main()
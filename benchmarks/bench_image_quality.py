@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Measure the local image quality gate: what it measures, what it turns away
+and how long it takes.
+
+Builds a synthetic dish photo (see bench_vision_cache.py) with a little
+sensor noise and derives the uploads that waste Bedrock calls in practice:
+soft and blurry shots, dark and overexposed ones and tiny thumbnails. For
+each it reports the sharpness (variance of the Laplacian) and brightness,
+the gate's verdict and the median check time at phone-camera and web
+sizes. Then a mixed batch of uploads is run through process_dish against
+the fake Bedrock client with the gate off and on, counting the Bedrock
+calls made.
+
+Usage:
+    python benchmarks/bench_image_quality.py [--repeat 20] [--uploads 40]
+"""
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import statistics
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+sys.path.insert(0, BENCH_DIR)
+
+# Keep uploaded test images out of the repository and S3
+UPLOAD_ROOT = tempfile.mkdtemp(prefix="menu-quality-")
+os.environ["UPLOAD_FOLDER"] = UPLOAD_ROOT
+os.environ["CACHE_DIR"] = UPLOAD_ROOT
+os.environ["USE_S3"] = "false"
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageEnhance, ImageFilter  # noqa: E402
+import config  # noqa: E402
+import image_quality  # noqa: E402
+from bench_vision_cache import make_photo  # noqa: E402
+from fake_bedrock import FakeBedrockClient  # noqa: E402
+from budget import WorkflowBudget  # noqa: E402
+from orchestrator import OrchestratorAgent  # noqa: E402
+
+SIZES = [(4032, 3024), (1024, 768)]
+
+def jpeg(image, quality=90):
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+def uploads(rng, width, height):
+    """(kind, JPEG bytes) of one photo as it might be uploaded"""
+    photo = np.asarray(Image.open(io.BytesIO(make_photo(rng, width, height))), dtype=np.float32)
+    noise_rng = np.random.default_rng(rng.randrange(2 ** 32))
+    # Food and table texture at a few pixels' scale, plus sensor noise
+    texture = Image.fromarray(noise_rng.normal(128, 40, (height // 3, width // 3)).clip(0, 255).astype(np.uint8))
+    texture = np.asarray(texture.resize((width, height), Image.BILINEAR), dtype=np.float32)[:, :, None] - 128
+    noise = noise_rng.normal(0, 4, photo.shape)
+    sharp = Image.fromarray(np.clip(photo + 0.5 * texture + noise, 0, 255).astype(np.uint8))
+    scale = max(width, height) / 1024
+    return [
+        ("sharp", jpeg(sharp)),
+        ("soft", jpeg(sharp.filter(ImageFilter.GaussianBlur(1.5 * scale)))),
+        ("blurry", jpeg(sharp.filter(ImageFilter.GaussianBlur(4 * scale)))),
+        ("very blurry", jpeg(sharp.filter(ImageFilter.GaussianBlur(8 * scale)))),
+        ("dark", jpeg(ImageEnhance.Brightness(sharp).enhance(0.2))),
+        ("overexposed", jpeg(ImageEnhance.Brightness(sharp).enhance(3))),
+        ("tiny", jpeg(sharp.resize((200, 150), Image.LANCZOS))),
+    ]
+
+def calls_made(batch, enabled):
+    config.QUALITY_GATE_ENABLED = enabled
+    # Warnings save no calls; measure what turning photos away saves
+    config.QUALITY_GATE_MODE = "reject"
+    # Count only what the gate saves
+    config.VISION_CACHE_ENABLED = False
+    config.SEMANTIC_CACHE_ENABLED = False
+    client = FakeBedrockClient(latency=0)
+    orchestrator = OrchestratorAgent(bedrock_client=client)
+    # The fake client counts inline image bytes as input tokens, so lift the
+    # token budget to keep every stage running
+    rejected = sum("quality" in orchestrator.process_dish(f"Dish {index}", data, budget=WorkflowBudget(max_tokens=10 ** 9))
+                   for index, data in enumerate(batch))
+    return len(client.calls), rejected
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="checks per upload for the timing")
+    parser.add_argument("--uploads", type=int, default=40, help="uploads in the mixed batch, one in four poor")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    try:
+        print(f"thresholds: min side {config.QUALITY_MIN_SIDE}px, sharpness >= {config.QUALITY_MIN_SHARPNESS:g}, "
+              f"brightness {config.QUALITY_MIN_BRIGHTNESS:g}-{config.QUALITY_MAX_BRIGHTNESS:g}\n")
+        print(f"{'size':<10} {'upload':<12} {'KB':>5} {'sharpness':>10} {'brightness':>11} {'verdict':<25} {'p50 ms':>7}")
+        for width, height in SIZES:
+            for kind, data in uploads(rng, width, height):
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    report = image_quality.check_image(data)
+                    timings.append(time.perf_counter() - started)
+                metrics = report["metrics"]
+                verdict = "pass" if not report["problems"] else "reject: " + ", ".join(report["problems"])
+                print(f"{width}x{height:<5} {kind:<12} {len(data) // 1024:>5} {metrics['sharpness']:>10.1f} "
+                      f"{metrics['brightness']:>11.1f} {verdict:<25} {statistics.median(timings) * 1000:>7.1f}")
+
+        # A realistic mix: most uploads fine, one in four too poor to use
+        batch = []
+        while len(batch) < args.uploads:
+            kinds = dict(uploads(rng, 1024, 768))
+            batch.extend([kinds["sharp"], kinds["soft"], kinds["sharp"], rng.choice(
+                [kinds["blurry"], kinds["very blurry"], kinds["dark"], kinds["overexposed"], kinds["tiny"]]
+            )])
+        batch = batch[:args.uploads]
+        print(f"\n{len(batch)} mixed uploads through process_dish")
+        for enabled in (False, True):
+            calls, rejected = calls_made(batch, enabled)
+            print(f"gate {'on ' if enabled else 'off'}: {calls:>4} Bedrock calls, {rejected} uploads turned away")
+    finally:
+        shutil.rmtree(UPLOAD_ROOT, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
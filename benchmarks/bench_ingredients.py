@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Measure how much ingredient normalization raises cache hit rates.
+
+The Visionary Chef words the same ingredient differently from one photo to
+the next ("Tomatoes", "tomato slices", "Roma tomato"). This fills a
+SemanticCache (in a temporary directory) with synthetic dish analyses, then
+looks the same dishes up again as a fresh analysis would word them, and
+looks up new dishes to count false hits. It reports, with normalization off
+and on: distinct item strings or ids, the hit rate of an exact
+(name, ingredient set) key, the semantic cache hit rate and false hit rate,
+and the time to normalize an analysis.
+
+Usage:
+    python benchmarks/bench_ingredients.py [--dishes 20000] [--queries 2000]
+"""
+import os
+import sys
+import copy
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+sys.path.insert(0, BENCH_DIR)
+
+import ingredients  # noqa: E402
+from semantic_cache import SemanticCache, ingredients_of  # noqa: E402
+from bench_semantic_cache import FILLERS, STYLES, PROTEINS, DISHES  # noqa: E402
+
+# Ways the Visionary Chef has been seen to word each ingredient, a few of
+# them beyond what the normalization rules cover
+WORDINGS = [
+    ["Tomato", "Tomatoes", "Tomato slices", "Roma tomato", "Sliced tomatoes", "Cherry tomatoes", "Tomato concasse"],
+    ["Lettuce", "Shredded lettuce", "Romaine lettuce", "Lettuce leaves", "Iceberg lettuce"],
+    ["Red onion", "Red onions", "Sliced red onion", "Red onion rings", "Pickled red onion"],
+    ["Scallions", "Green onions", "Spring onion", "Sliced scallions"],
+    ["Cilantro", "Fresh cilantro", "Cilantro leaves", "Coriander"],
+    ["Cheddar cheese", "Cheddar", "Melted cheddar cheese", "Shredded cheddar", "Aged white cheddar"],
+    ["Parmesan", "Parmesan cheese", "Grated parmesan", "Parmigiano Reggiano", "Parmesan shavings"],
+    ["Avocado", "Avocado slices", "Sliced avocado", "Avocado chunks", "Avocado fan"],
+    ["Bacon", "Bacon strips", "Crispy bacon", "Slices of bacon"],
+    ["Pickles", "Pickle slices", "Pickle"],
+    ["Bell pepper", "Red bell pepper", "Sliced bell peppers", "Capsicum"],
+    ["Chickpeas", "Garbanzo beans", "Roasted chickpeas"],
+    ["Shrimp", "Prawns", "Grilled shrimp", "King prawns"],
+    ["French fries", "Fries", "Shoestring fries"],
+    ["Mixed greens", "Greens", "Spring mix", "Salad greens"],
+    ["Bun", "Burger bun", "Hamburger bun", "Toasted bun"],
+    ["Fried egg", "Egg", "Soft egg", "Eggs"],
+    ["Mayonnaise", "Mayo", "Garlic aioli"],
+    ["Basil", "Fresh basil", "Basil leaves"],
+    ["Garlic", "Minced garlic", "Garlic cloves"],
+    ["Mushrooms", "Sliced mushrooms", "Sauteed mushrooms", "Mushroom"],
+    ["Cucumber", "Cucumbers", "Cucumber slices"],
+    ["Olives", "Black olives", "Olive"],
+    ["Jalapeno", "Jalapenos", "Sliced jalapenos", "Jalapeno peppers"],
+    ["Potatoes", "Roasted potatoes", "Baby potatoes", "Potato wedges"],
+    ["Zucchini", "Courgette", "Grilled zucchini"],
+    ["Eggplant", "Aubergine", "Roasted eggplant"],
+    ["Arugula", "Rocket", "Baby arugula"],
+    ["Yogurt", "Greek yogurt", "Yoghurt"],
+    ["Sesame seeds", "Toasted sesame seeds", "Sesame"],
+    ["Lime", "Lime wedges", "Lime wedge"],
+    ["Rice", "Steamed rice", "White rice", "Rice pilaf"],
+]
+
+def make_dish(rng):
+    """(name, ingredient indexes) of a dish"""
+    kind = rng.choice(list(DISHES))
+    name = " ".join(part for part in (rng.choice(FILLERS), rng.choice(STYLES), rng.choice(PROTEINS), kind) if part)
+    return name, rng.sample(range(len(WORDINGS)), rng.randint(5, 9))
+
+def analysis(rng, dish):
+    """A Visionary Chef analysis of the dish, each ingredient worded one way or another"""
+    _, ingredient_indexes = dish
+    return {"items": [{"item": rng.choice(WORDINGS[i]), "confidence": round(rng.uniform(0.6, 1.0), 2)}
+                      for i in ingredient_indexes]}
+
+def run(directory, stored, queries, new_dishes, normalize):
+    def prepared(analyses):
+        analyses = copy.deepcopy(analyses)
+        if normalize:
+            for chef_analysis in analyses:
+                ingredients.normalize_items(chef_analysis)
+        return analyses
+
+    stored_analyses = prepared([chef_analysis for _, chef_analysis in stored])
+    query_analyses = prepared([chef_analysis for _, chef_analysis in queries])
+    new_analyses = prepared([chef_analysis for _, chef_analysis in new_dishes])
+
+    distinct = {name for chef_analysis in stored_analyses for name in ingredients_of(chef_analysis)}
+    exact = {(name, frozenset(ingredients_of(chef_analysis))) for (name, _), chef_analysis in zip(stored, stored_analyses)}
+    exact_hits = sum((name, frozenset(ingredients_of(chef_analysis))) in exact
+                     for (name, _), chef_analysis in zip(queries, query_analyses))
+
+    cache = SemanticCache(directory)
+    cache.add_many([(name, ingredients_of(chef_analysis), {"dish": index})
+                    for index, ((name, _), chef_analysis) in enumerate(zip(stored, stored_analyses))])
+    matches = cache.lookup_many([(name, ingredients_of(chef_analysis)) for (name, _), chef_analysis in zip(queries, query_analyses)])
+    hits = sum(results is not None for results, _ in matches)
+    false_hits = sum(results is not None for results, _ in cache.lookup_many(
+        [(name, ingredients_of(chef_analysis)) for (name, _), chef_analysis in zip(new_dishes, new_analyses)]
+    ))
+    return len(distinct), exact_hits / len(queries), hits / len(queries), false_hits / len(new_dishes)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dishes", type=int, default=20000, help="dishes in the cache")
+    parser.add_argument("--queries", type=int, default=2000, help="re-analyzed dishes (and as many new ones) looked up")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    dishes = [make_dish(rng) for _ in range(args.dishes)]
+    stored = [(name, analysis(rng, (name, indexes))) for name, indexes in dishes]
+    queries = [(name, analysis(rng, (name, indexes))) for name, indexes in rng.sample(dishes, args.queries)]
+    new_dishes = [(name, analysis(rng, (name, indexes))) for name, indexes in (make_dish(rng) for _ in range(args.queries))]
+
+    print(f"{args.dishes} cached dishes, {args.queries} re-analyzed and {args.queries} new dishes looked up\n")
+    print(f"{'normalization':<14} {'distinct items':>14} {'exact key hits':>15} {'semantic hits':>14} {'false hits':>11}")
+    directory = tempfile.mkdtemp(prefix="menu-ingredients-")
+    try:
+        for normalize in (False, True):
+            distinct, exact_rate, hit_rate, false_rate = run(os.path.join(directory, str(normalize)),
+                                                             stored, queries, new_dishes, normalize)
+            print(f"{'on' if normalize else 'off':<14} {distinct:>14} {exact_rate:>15.1%} {hit_rate:>14.1%} {false_rate:>11.1%}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    # Normalizing an analysis, with every wording already memoized and cold
+    sample = [copy.deepcopy(chef_analysis) for _, chef_analysis in queries[:1000]]
+    started = time.perf_counter()
+    for chef_analysis in sample:
+        ingredients.normalize_items(chef_analysis)
+    warm = (time.perf_counter() - started) / len(sample)
+    ingredients.canonical_id.cache_clear()
+    names = [item["item"] for _, chef_analysis in queries[:1000] for item in chef_analysis["items"]]
+    started = time.perf_counter()
+    for name in names:
+        ingredients.canonical_id.__wrapped__(name)
+    cold = (time.perf_counter() - started) / len(names)
+    print(f"\nnormalize an analysis: {warm * 1e6:.1f} us memoized; an unseen wording costs {cold * 1e6:.1f} us")
+
+if __name__ == "__main__":
+    main()
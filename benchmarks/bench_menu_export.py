@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Measure streaming menu exports at 50k dishes.
+
+Fills a ResultsStore (in a temporary directory) with N synthetic
+process_dish results spread over many restaurants, some with a stored dish
+photo, then exports the whole catalogue as CSV, Markdown and HTML two ways:
+streamed from the store by export_menu, and the in-memory way (every result
+loaded into a list, the document built as one string, then written). For
+each it reports the time, the peak Python memory (tracemalloc) and the
+output size. Finally it writes thumbnails of the photos with one worker
+and with EXPORT_THUMBNAIL_WORKERS, read from local disk and from a storage
+that answers after --storage-latency ms, as S3 would.
+
+Usage:
+    python benchmarks/bench_menu_export.py [--dishes 50000] [--restaurants 200] [--images 2000] [--storage-latency 30]
+"""
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+sys.path.insert(0, BENCH_DIR)
+
+import config  # noqa: E402
+import menu_export  # noqa: E402
+from storage import StorageService  # noqa: E402
+from results_store import ResultsStore  # noqa: E402
+from bench_results_store import make_result  # noqa: E402
+
+def make_photos(directory, count, rng):
+    """``count`` dish photos on disk (copies of a few distinct 1024x768 JPEGs)"""
+    from PIL import Image, ImageDraw
+    sources = []
+    for _ in range(8):
+        image = Image.new("RGB", (1024, 768), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(40):
+            x, y = rng.randrange(1024), rng.randrange(768)
+            draw.ellipse((x, y, x + rng.randrange(40, 200), y + rng.randrange(40, 200)),
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        sources.append(buffer.getvalue())
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"photo-{i}.jpg")
+        with open(path, "wb") as f:
+            f.write(sources[i % len(sources)])
+        paths.append(path)
+    return paths
+
+class LatentStorage(StorageService):
+    """Local storage that takes ``latency`` seconds to answer each read"""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+
+    def open_image(self, path_or_key):
+        time.sleep(self.latency)
+        return super().open_image(path_or_key)
+
+def in_memory(store, path, fmt):
+    """What exporting meant without streaming: every result in a list, one string"""
+    results = list(store.iter_results())
+    text = "".join(menu_export.render(results, fmt))
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+
+def measure(run):
+    """(seconds, peak traced MB) of a run, timed without tracing"""
+    started = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 2 ** 20
+
+def thumbnail_rate(directory, photos, workers, storage):
+    shutil.rmtree(directory, ignore_errors=True)
+    writer = menu_export.ThumbnailWriter(directory, workers=workers, storage=storage)
+    started = time.perf_counter()
+    for i, photo in enumerate(photos):
+        writer.submit(f"dish-{i}", photo)
+    writer.close()
+    return len(photos) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dishes", type=int, default=50_000)
+    parser.add_argument("--restaurants", type=int, default=200)
+    parser.add_argument("--images", type=int, default=2000, help="dishes with a stored photo")
+    parser.add_argument("--storage-latency", type=float, default=30, help="ms per photo read from remote storage")
+    parser.add_argument("--seed", type=int, default=23)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    directory = tempfile.mkdtemp(prefix="menu-export-")
+    try:
+        photos = make_photos(os.path.join(directory, "photos"), args.images, rng)
+        store = ResultsStore(os.path.join(directory, "results.sqlite"), batch_size=1000)
+        per_restaurant = args.dishes // args.restaurants
+        for r in range(args.restaurants):
+            menu = [make_result(rng) for _ in range(per_restaurant)]
+            for i, result in enumerate(menu):
+                if r * per_restaurant + i < len(photos):
+                    result["image_uri"] = photos[r * per_restaurant + i]
+            store.add_many(menu, f"Restaurant {r}")
+        store.flush()
+
+        print(f"{len(store):,} dishes over {args.restaurants} restaurants, {len(photos):,} with a photo\n")
+        print(f"{'format':<9} {'streamed s':>11} {'peak MB':>8} {'in memory s':>12} {'peak MB':>8} {'output MB':>10}")
+        for extension, fmt in menu_export.FORMATS.items():
+            path = os.path.join(directory, f"menu{extension}")
+            streamed, streamed_peak = measure(lambda: menu_export.export_menu(path, store=store, thumbnails=False))
+            size = os.path.getsize(path) / 2 ** 20
+            loaded, loaded_peak = measure(lambda: in_memory(store, path, fmt))
+            print(f"{fmt:<9} {streamed:>11.2f} {streamed_peak:>8.1f} {loaded:>12.2f} {loaded_peak:>8.1f} {size:>10.1f}")
+
+        thumbnails = os.path.join(directory, "thumbnails")
+        workers = config.EXPORT_THUMBNAIL_WORKERS
+        print(f"\n{'thumbnails from':<22} {'1 worker /s':>12} {f'{workers} workers /s':>14}   ({os.cpu_count()} CPUs)")
+        for label, storage in (("local disk", StorageService()),
+                               (f"{args.storage_latency:g} ms storage", LatentStorage(args.storage_latency / 1000))):
+            serial = thumbnail_rate(thumbnails, photos, 1, storage)
+            parallel = thumbnail_rate(thumbnails, photos, workers, storage)
+            print(f"{label:<22} {serial:>12,.0f} {parallel:>14,.0f}   ({parallel / serial:.1f}x)")
+
+        # A full HTML export, writing the thumbnails as it goes
+        shutil.rmtree(thumbnails, ignore_errors=True)
+        result = menu_export.export_menu(os.path.join(directory, "menu.html"), store=store)
+        print(f"HTML export with {len(photos):,} new thumbnails: {result['seconds']:.2f}s")
+        store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
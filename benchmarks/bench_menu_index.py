@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Measure the bitset menu index at 1M dishes.
+
+Builds a MenuIndex from N synthetic dishes spread over many restaurants
+(each with random allergens, potential allergens and dietary tags, as the
+results store would hand them over), then times the filters an ordering
+front-end runs on every page view: one restaurant's menu and the whole
+catalogue, with one to three tags and allergens excluded: the first page of
+matches and their count. Each filter is checked against boolean columns,
+and timed against them and against a plain Python scan of per-dish sets.
+Also reports how fast process_dish results are added one at a time and the
+memory the bitsets take.
+
+Usage:
+    python benchmarks/bench_menu_index.py [--dishes 1000000] [--restaurants 1000] [--queries 200] [--page 100]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np  # noqa: E402
+from results_store import key, allergen_keys  # noqa: E402
+from menu_index import MenuIndex  # noqa: E402
+from bench_results_store import ALLERGENS, TAGS, make_result  # noqa: E402
+
+ALLERGEN_KEYS = [allergen_keys(allergen) for allergen in ALLERGENS]
+TAG_KEYS = [key(tag) for tag in TAGS]
+FILTERS = [
+    ("gluten-free", ["gluten-free"], []),
+    ("vegetarian, nut-free", ["vegetarian"], ["tree nuts", "peanuts"]),
+    ("vegan, gluten-free, no soy/sesame", ["vegan", "gluten-free"], ["soy", "sesame"]),
+    ("no dairy/eggs/fish/shellfish", [], ["dairy", "eggs", "fish", "shellfish"]),
+]
+
+def make_columns(rng, count, restaurants):
+    """Boolean columns of every dish: certain and potential allergens, tags, analysis done"""
+    certain = rng.random((count, len(ALLERGENS))) < 0.2
+    potential = (rng.random((count, len(ALLERGENS))) < 0.05) & ~certain
+    return {
+        "restaurant": rng.integers(0, restaurants, count),
+        "certain": certain,
+        "potential": potential,
+        "tags": rng.random((count, len(TAGS))) < 0.15,
+        "checked": rng.random(count) < 0.98,
+    }
+
+def store_rows(columns, start, stop):
+    """The (dishes, allergens, tags) rows ResultsStore.index_rows would return"""
+    dishes = [(f"dish-{row}", f"restaurant {code}", int(checked)) for row, code, checked in
+              zip(range(start, stop), columns["restaurant"][start:stop].tolist(), columns["checked"][start:stop].tolist())]
+    allergens = []
+    for name, potential in (("certain", 0), ("potential", 1)):
+        rows, cols = np.nonzero(columns[name][start:stop])
+        allergens.extend((allergen, f"dish-{start + row}", potential) for row, col in zip(rows.tolist(), cols.tolist())
+                         for allergen in ALLERGEN_KEYS[col])
+    rows, cols = np.nonzero(columns["tags"][start:stop])
+    tags = [(TAG_KEYS[col], f"dish-{start + row}") for row, col in zip(rows.tolist(), cols.tolist())]
+    return dishes, allergens, tags
+
+def allergen_columns(free_of):
+    """Columns of the ALLERGENS sharing a canonical allergen with any of ``free_of``"""
+    wanted = {allergen for text in free_of for allergen in allergen_keys(text)}
+    return {col for col, keys in enumerate(ALLERGEN_KEYS) if wanted.intersection(keys)}
+
+def reference(columns, restaurant, tags, free_of):
+    """Rows matching the filter, from the boolean columns"""
+    selected = columns["restaurant"] == restaurant if restaurant is not None else np.ones(len(columns["checked"]), bool)
+    for tag in tags:
+        selected &= columns["tags"][:, TAG_KEYS.index(key(tag))]
+    if free_of:
+        selected &= columns["checked"]
+        for col in allergen_columns(free_of):
+            selected &= ~columns["certain"][:, col] & ~columns["potential"][:, col]
+    return np.flatnonzero(selected)
+
+def ms(samples):
+    return statistics.median(samples) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dishes", type=int, default=1_000_000)
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200, help="runs of each filter")
+    parser.add_argument("--page", type=int, default=100, help="dishes per page of results")
+    parser.add_argument("--seed", type=int, default=17)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    columns = make_columns(rng, args.dishes, args.restaurants)
+
+    index = MenuIndex()
+    build = 0.0
+    for start in range(0, args.dishes, 100_000):
+        rows = store_rows(columns, start, min(start + 100_000, args.dishes))
+        started = time.perf_counter()
+        index.add_rows(*rows)
+        build += time.perf_counter() - started
+    stats = index.stats()
+    print(f"{len(index):,} dishes over {args.restaurants:,} restaurants, numpy {np.__version__}\n")
+    print(f"build from stored rows: {build:.1f}s ({len(index) / build:,.0f} dishes/s)")
+    print(f"bitsets: {stats['bitsets']}, {stats['bitset_bytes'] / 2 ** 20:.1f} MB "
+          f"(boolean columns: {sum(c.nbytes for c in columns.values() if c.dtype == bool) / 2 ** 20:.1f} MB)")
+
+    # Python sets per dish, what filtering stored results without an index means
+    sets = [(set(np.flatnonzero(t)), set(np.flatnonzero(c | p)), checked) for t, c, p, checked in zip(
+        columns["tags"][:100_000], columns["certain"][:100_000], columns["potential"][:100_000], columns["checked"][:100_000]
+    )]
+
+    print(f"\n{'filter':<36} {'scope':<11} {'matches':>8} {'page ms':>8} {'count ms':>9} {'bool cols ms':>13} "
+          f"{'py scan ms*':>12} {'ok':>3}")
+    py_rng = random.Random(args.seed)
+    for label, tags, free_of in FILTERS:
+        for scope in ("restaurant", "catalogue"):
+            targets = [py_rng.randrange(args.restaurants) if scope == "restaurant" else None for _ in range(args.queries)]
+            timings, count_timings, reference_timings, correct = [], [], [], True
+            for target in targets:
+                restaurant = f"restaurant {target}" if target is not None else None
+                started = time.perf_counter()
+                page = index.find(restaurant=restaurant, tags=tags, free_of=free_of, limit=args.page)
+                timings.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                matches = index.count(restaurant=restaurant, tags=tags, free_of=free_of)
+                count_timings.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                expected = reference(columns, target, tags, free_of)
+                reference_timings.append(time.perf_counter() - started)
+                correct &= page == [f"dish-{row}" for row in expected[:args.page]] and matches == len(expected)
+            tag_cols = [TAG_KEYS.index(key(tag)) for tag in tags]
+            allergen_cols = allergen_columns(free_of)
+            started = time.perf_counter()
+            [i for i, (dish_tags, allergens, checked) in enumerate(sets)
+             if all(col in dish_tags for col in tag_cols) and not (free_of and (not checked or allergens & allergen_cols))]
+            # The scan covers the first 100k dishes only; scale it to the index size
+            scan_ms = (time.perf_counter() - started) * 1000 * args.dishes / len(sets)
+            if scope == "restaurant":
+                scan_ms /= args.restaurants
+            print(f"{label:<36} {scope:<11} {matches:>8,} {ms(timings):>8.3f} {ms(count_timings):>9.3f} "
+                  f"{ms(reference_timings):>13.3f} {scan_ms:>12.3f} {'yes' if correct else 'NO':>3}")
+    print("* a scan of per-dish Python sets, measured on 100k dishes and scaled")
+
+    # Results arriving one at a time from process_dish
+    results = [make_result(random.Random(i)) for i in range(2000)]
+    started = time.perf_counter()
+    for result in results:
+        index.add(result, "Restaurant 0")
+    added = len(results) / (time.perf_counter() - started)
+    print(f"\nincremental adds: {added:,.0f} process_dish results/s into a {len(index):,}-dish index")
+
+if __name__ == "__main__":
+    main()
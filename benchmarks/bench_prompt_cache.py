@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Measure prompt-cache savings on input-token cost and time to first token.
+
+Runs N dishes through process_dish and then streams each description,
+against the fake Bedrock client, once with prompt caching disabled and once
+enabled (PROMPT_CACHE_ENABLED). The fake client simulates Bedrock's cache:
+a prefix ending in a cachePoint block is written on first sight and read on
+every later request, and prefill time is charged only for uncached input
+tokens. Reports full-price input tokens, cache reads/writes, the estimated
+input cost relative to no caching, and the median time to first token of the
+streamed descriptions.
+
+Usage:
+    python benchmarks/bench_prompt_cache.py [--dishes 30]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import statistics
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+sys.path.insert(0, BENCH_DIR)
+
+# Keep uploaded test images out of the repository and S3
+UPLOAD_ROOT = tempfile.mkdtemp(prefix="menu-prompt-cache-")
+os.environ["UPLOAD_FOLDER"] = UPLOAD_ROOT
+os.environ["USE_S3"] = "false"
+
+import config  # noqa: E402
+from fake_bedrock import FakeBedrockClient  # noqa: E402
+from orchestrator import OrchestratorAgent  # noqa: E402
+from culinary_wordsmith import CulinaryWordsmithAgent  # noqa: E402
+
+# Nova bills cache reads at a quarter of the input-token price; cache writes
+# are billed as regular input
+CACHE_READ_PRICE = 0.25
+
+def run(records, args, enabled):
+    config.PROMPT_CACHE_ENABLED = enabled
+    client = FakeBedrockClient(latency=args.latency, input_token_latency=args.input_token_latency)
+    orchestrator = OrchestratorAgent(bedrock_client=client)
+    wordsmith = CulinaryWordsmithAgent(client)
+
+    first_tokens = []
+    for index in range(args.dishes):
+        record = records[index % len(records)]
+        dish_name = f"{record['dish_name']} #{index + 1}"
+        result = orchestrator.process_dish(dish_name, b"\xff\xd8dish-%d-%d" % (enabled, index), record.get("spice_level", "Medium"))
+        assert "error" not in result, result
+
+        started = time.perf_counter()
+        stream = wordsmith.stream_description(
+            dish_name, record["chef_analysis"], record["dietary_analysis"], record["sides_analysis"]
+        )
+        next(stream)
+        first_tokens.append(time.perf_counter() - started)
+        for _ in stream:
+            pass
+
+    totals = {"inputTokens": 0, "cacheReadInputTokenCount": 0, "cacheWriteInputTokenCount": 0}
+    for call in client.calls:
+        for key in totals:
+            totals[key] += call["usage"].get(key, 0)
+    return len(client.calls), totals, statistics.median(first_tokens)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dishes", type=int, default=30)
+    parser.add_argument("--workload", default=os.path.join(BENCH_DIR, "workloads", "recorded_dishes.jsonl"))
+    parser.add_argument("--latency", type=float, default=0.005, help="fixed seconds per call")
+    parser.add_argument("--input-token-latency", type=float, default=0.00005, help="prefill seconds per uncached input token")
+    args = parser.parse_args()
+
+    with open(args.workload) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    try:
+        print(f"{args.dishes} dishes, {args.latency * 1000:.0f}ms per call + "
+              f"{args.input_token_latency * 1000:.2f}ms per uncached input token\n")
+        print(f"{'prompt cache':<13} {'calls':>6} {'input tok':>10} {'cache read':>11} {'cache write':>12} "
+              f"{'input cost':>11} {'p50 TTFT ms':>12}")
+        rows = {}
+        for enabled in (False, True):
+            calls, totals, ttft = run(records, args, enabled)
+            cost = (totals["inputTokens"] + totals["cacheWriteInputTokenCount"]
+                    + CACHE_READ_PRICE * totals["cacheReadInputTokenCount"])
+            rows[enabled] = (cost, ttft)
+            print(f"{'on' if enabled else 'off':<13} {calls:>6} {totals['inputTokens']:>10} "
+                  f"{totals['cacheReadInputTokenCount']:>11} {totals['cacheWriteInputTokenCount']:>12} "
+                  f"{cost / rows[False][0]:>11.0%} {ttft * 1000:>12.1f}")
+
+        print(f"\ncaching: {1 - rows[True][0] / rows[False][0]:.0%} lower input-token cost, "
+              f"{1 - rows[True][1] / rows[False][1]:.0%} lower median time to first token")
+    finally:
+        shutil.rmtree(UPLOAD_ROOT, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Report the input-token reduction from prompt compaction per downstream agent.
+
+Replays recorded dishes (benchmarks/workloads/recorded_dishes.jsonl) through
+the Authenticator, Dietary Detective, Side Item Analyzer and Culinary
+Wordsmith against the fake Bedrock client, once with the legacy serialization
+(full analysis, json.dumps(indent=2)) and once with PromptCompactor, and
+compares the estimated input tokens of the prompts actually sent.
+
+Usage:
+    python benchmarks/bench_prompt_compaction.py
+"""
+import os
+import sys
+import json
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_bedrock import FakeBedrockClient  # noqa: E402
+from prompt_compaction import PromptCompactor, estimate_tokens  # noqa: E402
+from authenticator import AuthenticatorAgent  # noqa: E402
+from dietary_detective import DietaryDetectiveAgent  # noqa: E402
+from side_item_analyzer import SideItemAnalyzerAgent  # noqa: E402
+from culinary_wordsmith import CulinaryWordsmithAgent  # noqa: E402
+
+AGENTS = ["authenticator", "dietary_detective", "side_item_analyzer", "culinary_wordsmith"]
+
+class LegacyCompactor(PromptCompactor):
+    """Reproduces the pre-compaction prompts: whole analysis, pretty-printed, indentation kept"""
+
+    def build_prompt(self, agent, render, static_text=""):
+        return render(json.dumps(self.chef_analysis, indent=2))
+
+    def dumps(self, obj):
+        return json.dumps(obj, indent=2)
+
+def run_agents(record, compactor_class):
+    """Run the four text stages for one recorded dish; return {agent: estimated input tokens}"""
+    client = FakeBedrockClient()
+    chef_analysis = record["chef_analysis"]
+    compactor = compactor_class(chef_analysis)
+    image_bytes = b"\xff\xd8recorded"
+
+    AuthenticatorAgent(client).validate_name(record["dish_name"], chef_analysis, compactor=compactor)
+    DietaryDetectiveAgent(client).analyze_dietary(chef_analysis, compactor=compactor)
+    SideItemAnalyzerAgent(client).analyze_sides(record["dish_name"], image_bytes, chef_analysis, compactor=compactor)
+    CulinaryWordsmithAgent(client).generate_description(
+        record["dish_name"], chef_analysis, record["dietary_analysis"], record["sides_analysis"], compactor=compactor
+    )
+
+    tokens = {}
+    for agent, call in zip(AGENTS, client.calls):
+        request = call["request"]
+        text = " ".join(block.get("text", "") for block in request["system"])
+        text += " ".join(block.get("text", "") for block in request["messages"][0]["content"])
+        tokens[agent] = estimate_tokens(text)
+    return tokens
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", default=os.path.join(BENCH_DIR, "workloads", "recorded_dishes.jsonl"))
+    args = parser.parse_args()
+
+    with open(args.workload) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    legacy = {agent: 0 for agent in AGENTS}
+    compact = {agent: 0 for agent in AGENTS}
+    for record in records:
+        for agent, tokens in run_agents(record, LegacyCompactor).items():
+            legacy[agent] += tokens
+        for agent, tokens in run_agents(record, PromptCompactor).items():
+            compact[agent] += tokens
+
+    print(f"{len(records)} recorded dishes (text input tokens, estimated; image tokens excluded)\n")
+    print(f"{'agent':<22} {'legacy/dish':>12} {'compact/dish':>13} {'reduction':>10}")
+    for agent in AGENTS + ["total"]:
+        before = sum(legacy.values()) if agent == "total" else legacy[agent]
+        after = sum(compact.values()) if agent == "total" else compact[agent]
+        reduction = 100.0 * (before - after) / before if before else 0.0
+        print(f"{agent:<22} {before / len(records):>12.0f} {after / len(records):>13.0f} {reduction:>9.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Simulate latency-aware routing across Bedrock regions.
+
+Builds a RegionClientPool over fake Bedrock clients with injected per-region
+latency, sends a stream of requests, and halfway through throttles the
+fastest region. Reports where calls went in each phase, failovers, and call
+latency compared with pinning every call to a single region.
+
+Usage:
+    python benchmarks/bench_region_pool.py [--requests 300]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_bedrock import FakeBedrockClient  # noqa: E402
+from region_pool import RegionClientPool  # noqa: E402
+
+# Typical latency per region in seconds
+REGION_LATENCY = {
+    "us-east-1": 0.012,
+    "us-west-2": 0.020,
+    "us-east-2": 0.030,
+}
+
+BODY = json.dumps({
+    "system": [{"text": "You are the Dietary Detective."}],
+    "messages": [{"role": "user", "content": [{"text": "Identify allergens in a cheeseburger."}]}]
+})
+
+class Throttle:
+    """Throttle rate that can be switched on mid-run"""
+
+    def __init__(self):
+        self.rate = 0.0
+
+    def __call__(self):
+        return self.rate
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100.0), len(ordered) - 1)]
+
+def send(client, requests):
+    latencies = []
+    errors = 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        try:
+            client.invoke_model(modelId="us.amazon.nova-pro-v1:0", body=BODY)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+    return latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="requests per phase")
+    parser.add_argument("--throttle-rate", type=float, default=0.9, help="throttle rate of the fastest region in phase 2")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    throttle = Throttle()
+    fastest = min(REGION_LATENCY, key=REGION_LATENCY.get)
+    clients = {
+        region: FakeBedrockClient(latency=latency, jitter=latency / 2, seed=args.seed,
+                                  throttle_rate=throttle if region == fastest else 0.0)
+        for region, latency in REGION_LATENCY.items()
+    }
+    pool = RegionClientPool(clients, cooldown_seconds=0.5, seed=args.seed)
+    pinned_throttle = Throttle()
+    pinned = FakeBedrockClient(latency=REGION_LATENCY[fastest], jitter=REGION_LATENCY[fastest] / 2,
+                               seed=args.seed, throttle_rate=pinned_throttle)
+
+    regions = list(REGION_LATENCY)
+    print("regions: " + ", ".join(f"{r} ~{REGION_LATENCY[r] * 1000:.0f}ms" for r in regions))
+    print(f"phase 2 throttles {args.throttle_rate:.0%} of calls to {fastest}\n")
+    print(f"{'phase':<24} {'client':<8} {'p50 ms':>7} {'p99 ms':>7} {'errors':>7}   calls per region")
+
+    for phase, rate in (("1: all healthy", 0.0), ("2: " + fastest + " throttled", args.throttle_rate)):
+        throttle.rate = pinned_throttle.rate = rate
+        before = {region: len(client.calls) for region, client in clients.items()}
+        latencies, errors = send(pool, args.requests)
+        spread = ", ".join(f"{r}={len(clients[r].calls) - before[r]}" for r in regions)
+        print(f"{phase:<24} {'pool':<8} {percentile(latencies, 50) * 1000:>7.1f} "
+              f"{percentile(latencies, 99) * 1000:>7.1f} {errors:>7}   {spread}")
+        latencies, errors = send(pinned, args.requests)
+        print(f"{'':<24} {'pinned':<8} {percentile(latencies, 50) * 1000:>7.1f} "
+              f"{percentile(latencies, 99) * 1000:>7.1f} {errors:>7}   {fastest} only")
+
+    print("\n" + json.dumps(pool.stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
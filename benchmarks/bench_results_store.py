@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Measure the SQLite results store at menu-catalogue scale.
+
+Fills a ResultsStore (in a temporary directory) with N synthetic
+process_dish results spread over many restaurants, each with a random set
+of allergens and dietary tags, writing each restaurant's menu in one call.
+Dishes arriving one at a time are then written in a transaction each and
+in batches, to show what batching saves. Finally it times the queries the
+store is for: "gluten-free, nut-free dishes at restaurant X", dishes by
+name prefix and a tag across every restaurant, and checks the first
+against a scan of the restaurant's dishes.
+
+Usage:
+    python benchmarks/bench_results_store.py [--dishes 100000] [--restaurants 1000] [--queries 500]
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import shutil
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+sys.path.insert(0, BENCH_DIR)
+
+from results_store import ResultsStore  # noqa: E402
+from bench_semantic_cache import make_dish, DISHES  # noqa: E402
+
+ALLERGENS = ["Gluten", "Dairy", "Eggs", "Soy", "Tree Nuts", "Peanuts", "Fish", "Shellfish", "Sesame", "Mustard"]
+TAGS = ["Gluten-Free", "Vegetarian", "Vegan", "Dairy-Free", "Nut-Free", "Keto", "Halal", "Low-Carb"]
+NUTS = ["tree nuts", "peanuts"]
+
+def make_result(rng):
+    name, _ = make_dish(rng, DISHES)
+    allergens = rng.sample(ALLERGENS, rng.randint(0, 4))
+    return {
+        "dish_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "input_name": name,
+        "processed_timestamp": "2026-10-19T12:00:00",
+        "refined_name": name,
+        "generated_description": "A dish. " * 20,
+        "dietary_analysis": {
+            "allergens": allergens,
+            "potential_allergens": rng.sample([a for a in ALLERGENS if a not in allergens], rng.randint(0, 2)),
+            "dietary_tags": rng.sample(TAGS, rng.randint(0, 3)),
+            "disclaimer": ""
+        },
+        "skipped_stages": [],
+    }
+
+def percentile(samples, pct):
+    return sorted(samples)[min(int(len(samples) * pct / 100), len(samples) - 1)]
+
+def timed(run, count):
+    samples = []
+    for i in range(count):
+        started = time.perf_counter()
+        found = run(i)
+        samples.append(time.perf_counter() - started)
+    return samples, found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dishes", type=int, default=100_000)
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=500, help="results per batched write")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    restaurants = [f"Restaurant {i}" for i in range(args.restaurants)]
+
+    directory = tempfile.mkdtemp(prefix="menu-results-")
+    try:
+        store = ResultsStore(os.path.join(directory, "results.sqlite"), batch_size=args.batch)
+        # Each restaurant's menu arrives as one bulk run
+        expected = {restaurant: [make_result(rng) for _ in range(args.dishes // len(restaurants))]
+                    for restaurant in restaurants}
+        started = time.perf_counter()
+        for restaurant, menu in expected.items():
+            store.add_many(menu, restaurant)
+        store.flush()
+        fill_rate = len(store) / (time.perf_counter() - started)
+        size_mb = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 2 ** 20
+
+        # Dishes finishing one at a time into the full store, each in its own
+        # transaction and then batched (results re-written under their own ids)
+        sample = [(result, restaurant) for restaurant, menu in expected.items() for result in menu[:2]]
+        rates = {}
+        for batch_size in (1, args.batch):
+            store.batch_size = batch_size
+            started = time.perf_counter()
+            for result, restaurant in sample:
+                store.add(result, restaurant)
+            store.flush()
+            rates[batch_size] = len(sample) / (time.perf_counter() - started)
+        store.batch_size = args.batch
+
+        targets = [rng.choice(restaurants) for _ in range(args.queries)]
+        menu, found = timed(lambda i: store.find(restaurant=targets[i], tags=["gluten-free"], free_of=NUTS), args.queries)
+        # The indexed answer must be the one a scan of the restaurant's dishes gives
+        scan = sorted(
+            result["dish_id"] for result in expected[targets[-1]]
+            if "Gluten-Free" in result["dietary_analysis"]["dietary_tags"]
+            and not {"Tree Nuts", "Peanuts"} & set(result["dietary_analysis"]["allergens"]
+                                                   + result["dietary_analysis"]["potential_allergens"])
+        )
+        correct = sorted(result["dish_id"] for result in found) == scan
+        prefixes = [make_dish(rng, DISHES)[0].split()[0] for _ in range(args.queries)]
+        by_name, _ = timed(lambda i: store.find(name=prefixes[i], limit=20), args.queries)
+        everywhere, _ = timed(lambda i: store.find(tags=["vegan"], free_of=["dairy"], limit=100), args.queries)
+
+        print(f"{len(store):,} dishes over {len(expected):,} restaurants, {size_mb:.0f} MB on disk\n")
+        print(f"bulk fill:                               {fill_rate:,.0f} dishes/s")
+        for batch_size, rate in rates.items():
+            label = "one transaction each" if batch_size == 1 else f"batches of {batch_size}"
+            print(f"single dishes, {label + ':':<26}{rate:,.0f} dishes/s")
+        print(f"gluten-free, nut-free at one restaurant: p50 {percentile(menu, 50) * 1000:.2f} ms, "
+              f"p99 {percentile(menu, 99) * 1000:.2f} ms ({len(found)} dishes, matches a scan: {correct})")
+        print(f"by name prefix (20 dishes):              p50 {percentile(by_name, 50) * 1000:.2f} ms, "
+              f"p99 {percentile(by_name, 99) * 1000:.2f} ms")
+        print(f"vegan, dairy-free anywhere (100 dishes): p50 {percentile(everywhere, 50) * 1000:.2f} ms, "
+              f"p99 {percentile(everywhere, 99) * 1000:.2f} ms")
+        store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
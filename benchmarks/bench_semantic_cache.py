@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Measure the semantic result cache at menu scale.
+
+Fills a SemanticCache (in a temporary directory) with N synthetic dishes,
+then looks up near-duplicates of stored dishes (filler words changed, names
+re-spaced, ingredients reordered or one dropped) and dishes of kinds that are
+not in the cache. Reports fill rate, index size on disk, single-query and
+batched query latency, the hit rate on near-duplicates and the false hit rate
+on new dishes at the configured threshold.
+
+Usage:
+    python benchmarks/bench_semantic_cache.py [--entries 1000000] [--queries 1000]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+
+import numpy as np  # noqa: E402
+from semantic_cache import SemanticCache  # noqa: E402
+
+FILLERS = ["", "Classic", "House", "Signature", "Our Famous", "Homemade"]
+STYLES = ["Grilled", "Crispy", "Spicy", "Smoked", "Braised", "Pan-Seared", "Roasted", "Garlic", "Lemon", "Teriyaki",
+          "Chipotle", "Honey", "Sesame", "Cajun", "Herb", "Buffalo", "Korean", "Thai", "Tuscan", "BBQ"]
+PROTEINS = ["Chicken", "Beef", "Pork", "Salmon", "Shrimp", "Tofu", "Lamb", "Tuna", "Duck", "Turkey", "Cod", "Tempeh",
+            "Mushroom", "Halloumi", "Chickpea", "Scallop", "Crab", "Bean", "Egg", "Paneer"]
+DISHES = {
+    "Burger": ["brioche bun", "lettuce", "tomato", "red onion", "pickles", "ketchup"],
+    "Tacos": ["corn tortilla", "cilantro", "white onion", "lime", "salsa verde", "cotija"],
+    "Salad": ["mixed greens", "cherry tomatoes", "cucumber", "vinaigrette", "croutons", "red onion"],
+    "Bowl": ["jasmine rice", "edamame", "pickled carrot", "scallions", "sesame seeds", "soy glaze"],
+    "Sandwich": ["sourdough", "aioli", "arugula", "tomato", "provolone", "pickled onion"],
+    "Pasta": ["linguine", "parmesan", "garlic", "olive oil", "basil", "chili flakes"],
+    "Curry": ["basmati rice", "coconut milk", "curry paste", "bell pepper", "cilantro", "naan"],
+    "Wrap": ["flour tortilla", "romaine", "tomato", "cheddar cheese", "ranch", "red onion"],
+    "Skewers": ["bell pepper", "red onion", "zucchini", "tzatziki", "pita", "lemon"],
+    "Ramen": ["ramen noodles", "soft egg", "nori", "scallions", "bamboo shoots", "miso broth"],
+}
+# Dish kinds that never appear in the cache, for the false hit check
+NEW_DISHES = {
+    "Pupusas": ["corn masa", "curtido", "cabbage", "tomato salsa", "oregano", "quesillo"],
+    "Pho": ["rice noodles", "beef broth", "star anise", "bean sprouts", "thai basil", "hoisin"],
+    "Paella": ["bomba rice", "saffron", "peas", "chorizo", "mussels", "sofrito"],
+    "Pierogi": ["potato", "farmer cheese", "dough", "sour cream", "fried onion", "dill"],
+}
+EXTRAS = ["avocado", "jalapeno", "bacon", "fried egg", "kimchi", "pickled ginger", "feta", "olives", "corn", "black beans",
+          "sweet potato", "spinach", "mushrooms", "caramelized onion", "sriracha mayo", "peanuts", "mango salsa",
+          "blue cheese", "roasted peppers", "capers", "goat cheese", "walnuts", "pesto", "hummus", "slaw"]
+
+def make_dish(rng, dishes):
+    kind = rng.choice(list(dishes))
+    protein = rng.choice(PROTEINS)
+    name = " ".join(part for part in (rng.choice(FILLERS), rng.choice(STYLES), protein, kind) if part)
+    ingredients = [protein.lower()] + dishes[kind] + rng.sample(EXTRAS, rng.randint(2, 6))
+    return name, ingredients
+
+def near_duplicate(rng, name, ingredients):
+    """The same dish as another restaurant would list it"""
+    words = [w for w in name.split() if w not in " ".join(FILLERS).split()]
+    words = [rng.choice([f for f in FILLERS if f])] + words
+    if rng.random() < 0.5:
+        # "Chicken Burger" -> "ChickenBurger" style re-spacing
+        words[-2:] = [words[-2] + words[-1].lower()]
+    ingredients = list(ingredients)
+    rng.shuffle(ingredients)
+    if rng.random() < 0.5 and len(ingredients) > 10:
+        ingredients.pop()
+    return " ".join(words), ingredients
+
+def percentile(samples, pct):
+    return sorted(samples)[min(int(len(samples) * pct / 100), len(samples) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=64, help="queries per batched lookup")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    directory = tempfile.mkdtemp(prefix="menu-semantic-")
+    try:
+        cache = SemanticCache(directory)
+        payload = {"dietary_detective": {"allergens": ["Dairy"], "potential_allergens": [], "dietary_tags": []}}
+        stored = []
+        started = time.perf_counter()
+        for chunk_start in range(0, args.entries, 50_000):
+            chunk = [make_dish(rng, DISHES) for _ in range(min(50_000, args.entries - chunk_start))]
+            stored.extend(rng.sample(chunk, min(len(chunk), args.queries)))
+            cache.add_many([(name, ingredients, payload) for name, ingredients in chunk])
+        fill_time = time.perf_counter() - started
+        disk_mb = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 2 ** 20
+
+        duplicates = [near_duplicate(rng, *dish) for dish in rng.sample(stored, args.queries)]
+        new_dishes = [make_dish(rng, NEW_DISHES) for _ in range(args.queries)]
+
+        # Warm the page cache the way a long-running process would be
+        cache.lookup_many(duplicates[:args.batch])
+
+        single = []
+        hits = 0
+        for query in duplicates:
+            started = time.perf_counter()
+            results, _ = cache.lookup(*query)
+            single.append(time.perf_counter() - started)
+            hits += results is not None
+        false_hits = sum(results is not None for results, _ in cache.lookup_many(new_dishes))
+
+        started = time.perf_counter()
+        for i in range(0, len(duplicates), args.batch):
+            cache.lookup_many(duplicates[i:i + args.batch])
+        batched = (time.perf_counter() - started) / len(duplicates)
+
+        stats = cache.stats()
+        print(f"{len(cache):,} entries, threshold {cache.threshold}, numpy {np.__version__}\n")
+        print(f"fill:             {len(cache) / fill_time:,.0f} entries/s ({fill_time:.1f}s), {disk_mb:.0f} MB on disk")
+        print(f"single lookup:    p50 {percentile(single, 50) * 1000:.3f} ms, p99 {percentile(single, 99) * 1000:.3f} ms")
+        print(f"batched lookup:   {batched * 1000:.3f} ms per query (batches of {args.batch})")
+        print(f"candidates:       {stats['candidates'] / stats['lookups']:.0f} scored per query")
+        print(f"near-duplicates:  {hits / len(duplicates):.1%} hit")
+        print(f"new dishes:       {false_hits / len(new_dishes):.1%} false hits")
+        print(f"peak RSS:         {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
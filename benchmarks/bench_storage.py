@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark the sharded, mmap-backed local image store against the old flat layout.
+
+Usage:
+    python benchmarks/bench_storage.py --files 100000
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import hashlib
+
+# Point the app at a scratch upload folder before config is imported
+WORK_DIR = tempfile.mkdtemp(prefix="menu-maestro-bench-")
+os.environ["UPLOAD_FOLDER"] = os.path.join(WORK_DIR, "sharded")
+os.environ["USE_S3"] = "false"
+os.environ.setdefault("UPLOAD_MAX_BYTES", "0")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from storage import StorageService, LocalStorageJanitor  # noqa: E402
+import config  # noqa: E402
+
+def timed(label, fn, results):
+    start = time.perf_counter()
+    value = fn()
+    elapsed = time.perf_counter() - start
+    results.append((label, elapsed))
+    return value
+
+def bench_flat(ids, payload, sample, results):
+    """The original layout: every upload in one directory, read back with f.read()"""
+    folder = os.path.join(WORK_DIR, "flat")
+    os.makedirs(folder, exist_ok=True)
+
+    def write_all():
+        for image_id in ids:
+            with open(f"{folder}/{image_id}.jpg", 'wb') as f:
+                f.write(payload)
+
+    def read_sample():
+        total = 0
+        for image_id in sample:
+            with open(f"{folder}/{image_id}.jpg", 'rb') as f:
+                total += len(hashlib.md5(f.read()).digest())
+        return total
+
+    def stat_sample():
+        return sum(os.path.exists(f"{folder}/{image_id}.jpg") for image_id in sample)
+
+    timed("flat: write", write_all, results)
+    timed("flat: exists (sample)", stat_sample, results)
+    timed("flat: read + hash (sample)", read_sample, results)
+    timed("flat: listdir", lambda: len(os.listdir(folder)), results)
+
+def bench_sharded(ids, payload, sample, results):
+    """Sharded layout via StorageService with mmap reads"""
+    storage = StorageService()
+    paths = {}
+
+    def write_all():
+        for image_id in ids:
+            paths[image_id] = storage.save_image(payload, image_id)
+
+    def read_sample():
+        total = 0
+        for image_id in sample:
+            with storage.open_image(paths[image_id]) as buffer:
+                total += len(hashlib.md5(buffer).digest())
+        return total
+
+    def stat_sample():
+        return sum(os.path.exists(paths[image_id]) for image_id in sample)
+
+    timed("sharded: write", write_all, results)
+    timed("sharded: exists (sample)", stat_sample, results)
+    timed("sharded: open_image + hash (sample)", read_sample, results)
+
+    janitor = LocalStorageJanitor(
+        config.UPLOAD_FOLDER,
+        max_bytes=len(payload) * len(ids) // 2
+    )
+    evicted, freed = timed("sharded: janitor pass (cap = 50%)", janitor.run_once, results)
+    print(f"Janitor evicted {evicted} files ({freed} bytes)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100000, help="number of images to store")
+    parser.add_argument("--size", type=int, default=16 * 1024, help="bytes per image")
+    parser.add_argument("--sample", type=int, default=10000, help="random reads to time")
+    args = parser.parse_args()
+
+    payload = os.urandom(args.size)
+    ids = [f"bench-{i:07d}" for i in range(args.files)]
+    sample = random.sample(ids, min(args.sample, len(ids)))
+    results = []
+
+    try:
+        bench_flat(ids, payload, sample, results)
+        bench_sharded(ids, payload, sample, results)
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    print(f"\n{args.files} files x {args.size} bytes, {len(sample)} sampled reads")
+    for label, elapsed in results:
+        print(f"{label:<40} {elapsed * 1000:>10.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Measure how many re-uploaded dish photos the perceptual-hash vision cache
+catches compared to exact (sha256) hashing.
+
+Generates a sample corpus of synthetic dish photos (a plate of coloured
+components on a textured table, saved as JPEG). Each photo is stored, then
+looked up again as the kinds of re-upload seen in practice: the identical
+file, a recompressed copy, a resized copy, a slightly cropped copy and a
+re-shared copy (all three at once). Unrelated photos are looked up to count
+false hits. For dHash and pHash at several distance thresholds, with and
+without the colour-thumbnail check, it reports the hit rate per kind, the
+extra hit rate over exact hashing and the false hit rate, plus the time to
+fingerprint a photo and to look it up.
+
+Usage:
+    python benchmarks/bench_vision_cache.py [--photos 200] [--size 1024x768] [--max-color-diff 8]
+"""
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageDraw, ImageFilter  # noqa: E402
+import config  # noqa: E402
+from vision_cache import HASHES, VisionCache  # noqa: E402
+
+KINDS = ["identical", "recompressed", "resized", "cropped", "re-shared"]
+DISTANCES = [4, 6, 8, 10, 12]
+
+def make_photo(rng, width, height):
+    """A plate of food-coloured blobs on a wood-grain table"""
+    grain = np.random.default_rng(rng.randrange(2 ** 32)).normal(0, 12, (height, width, 1))
+    base = np.array([rng.randint(90, 160), rng.randint(60, 110), rng.randint(30, 70)], dtype=np.float32)
+    table = np.clip(base + grain + np.linspace(-20, 20, width)[None, :, None], 0, 255).astype(np.uint8)
+    image = Image.fromarray(table).filter(ImageFilter.GaussianBlur(2))
+    draw = ImageDraw.Draw(image)
+    cx, cy = width * rng.uniform(0.4, 0.6), height * rng.uniform(0.4, 0.6)
+    radius = min(width, height) * rng.uniform(0.35, 0.45)
+    draw.ellipse((cx - radius, cy - radius * 0.9, cx + radius, cy + radius * 0.9), fill=(235, 235, 228))
+    for _ in range(rng.randint(4, 10)):
+        r = radius * rng.uniform(0.15, 0.4)
+        x, y = cx + rng.uniform(-0.5, 0.5) * radius, cy + rng.uniform(-0.45, 0.45) * radius
+        color = tuple(rng.randint(20, 230) for _ in range(3))
+        draw.ellipse((x - r, y - r * rng.uniform(0.5, 1.0), x + r, y + r * rng.uniform(0.5, 1.0)), fill=color)
+    return _jpeg(image.filter(ImageFilter.GaussianBlur(1.5)), 92)
+
+def _jpeg(image, quality):
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+def variant(rng, photo, kind):
+    """The photo as it comes back after a round trip through some other app"""
+    if kind == "identical":
+        return photo
+    image = Image.open(io.BytesIO(photo))
+    quality = 92
+    if kind in ("recompressed", "re-shared"):
+        quality = rng.randint(55, 80)
+    if kind in ("cropped", "re-shared"):
+        width, height = image.size
+        image = image.crop((int(width * rng.uniform(0, 0.05)), int(height * rng.uniform(0, 0.05)),
+                            int(width * (1 - rng.uniform(0, 0.05))), int(height * (1 - rng.uniform(0, 0.05)))))
+    if kind in ("resized", "re-shared"):
+        scale = rng.uniform(0.3, 0.75)
+        image = image.resize((int(image.width * scale), int(image.height * scale)), Image.BILINEAR)
+    return _jpeg(image, quality)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--photos", type=int, default=200, help="stored photos (and as many unrelated ones)")
+    parser.add_argument("--size", default="1024x768")
+    parser.add_argument("--max-color-diff", type=float, default=config.VISION_CACHE_MAX_COLOR_DIFF)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+    width, height = (int(side) for side in args.size.split("x"))
+
+    rng = random.Random(args.seed)
+    stored = [make_photo(rng, width, height) for _ in range(args.photos)]
+    queries = [(kind, index, variant(rng, photo, kind)) for index, photo in enumerate(stored) for kind in KINDS]
+    unrelated = [make_photo(rng, width, height) for _ in range(args.photos)]
+
+    print(f"{args.photos} stored photos ({width}x{height}), {len(queries)} re-uploads, {len(unrelated)} unrelated photos\n")
+    exact_rate = sum(kind == "identical" for kind, _, _ in queries) / len(queries)
+    print(f"{'hash':<7} {'dist':>4} {'colour':>6} " + " ".join(f"{kind:>12}" for kind in KINDS)
+          + f" {'all':>5} {'vs exact':>9} {'false hits':>11}")
+    print(f"{'sha256':<7} {'':>4} {'':>6} " + " ".join(f"{kind == 'identical':>12.0%}" for kind in KINDS)
+          + f" {exact_rate:>5.0%} {'':>9} {0:>11.1%}")
+
+    directory = tempfile.mkdtemp(prefix="menu-vision-")
+    try:
+        for method in HASHES:
+            cache = VisionCache(os.path.join(directory, method), method=method)
+            started = time.perf_counter()
+            for index, photo in enumerate(stored):
+                cache.add(cache.fingerprint(photo), {"photo": index})
+            hash_ms = (time.perf_counter() - started) * 1000 / len(stored)
+            query_prints = [cache.fingerprint(photo) for _, _, photo in queries]
+            unrelated_prints = [cache.fingerprint(photo) for photo in unrelated]
+
+            for max_color_difference in (None, args.max_color_diff):
+                for distance in DISTANCES:
+                    # No colour check is a difference bound no thumbnail can exceed
+                    cache.max_color_difference = 255 if max_color_difference is None else max_color_difference
+                    cache.max_distance = distance
+                    hits = {kind: 0 for kind in KINDS}
+                    started = time.perf_counter()
+                    for (kind, expected, _), fingerprint in zip(queries, query_prints):
+                        analysis, _ = cache.lookup(fingerprint)
+                        hits[kind] += analysis == {"photo": expected}
+                    lookup_us = (time.perf_counter() - started) * 1e6 / len(queries)
+                    false_hits = sum(cache.lookup(fingerprint)[0] is not None for fingerprint in unrelated_prints)
+                    rate = sum(hits.values()) / len(queries)
+                    colour = "-" if max_color_difference is None else f"{max_color_difference:g}"
+                    print(f"{method:<7} {distance:>4} {colour:>6} "
+                          + " ".join(f"{hits[kind] / args.photos:>12.0%}" for kind in KINDS)
+                          + f" {rate:>5.0%} {rate - exact_rate:>+9.0%} {false_hits / len(unrelated):>11.1%}")
+            print(f"{'':<7} fingerprint {hash_ms:.1f} ms per photo, lookup {lookup_us:.0f} us")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
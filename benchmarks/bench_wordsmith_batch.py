@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Compare per-dish and batched Culinary Wordsmith description generation.
+
+Builds a menu of N dishes from the recorded workloads and generates every
+description twice against the fake Bedrock client: once with one
+generate_description call per dish and once with generate_descriptions_batch.
+Reports Bedrock calls, input/output tokens and wall time for each path.
+Use --drop-rate to make batched answers randomly omit dishes and exercise
+the split-and-retry path.
+
+Usage:
+    python benchmarks/bench_wordsmith_batch.py [--dishes 100] [--drop-rate 0.05]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_bedrock import FakeBedrockClient, batch_descriptions  # noqa: E402
+from budget import WorkflowBudget  # noqa: E402
+from culinary_wordsmith import CulinaryWordsmithAgent  # noqa: E402
+
+def build_menu(records, count):
+    dishes = []
+    for index in range(count):
+        record = records[index % len(records)]
+        chef_analysis = dict(record["chef_analysis"], spice_level=record.get("spice_level", "Medium"))
+        dishes.append({
+            "dish_name": f"{record['dish_name']} #{index + 1}",
+            "chef_analysis": chef_analysis,
+            "dietary_analysis": record["dietary_analysis"],
+            "sides_analysis": record["sides_analysis"]
+        })
+    return dishes
+
+def dropping(drop_rate, seed):
+    """Batch responder that leaves out each dish with probability drop_rate"""
+    rng = random.Random(seed)
+
+    def respond(request):
+        answer = json.loads(batch_descriptions(request))
+        answer["descriptions"] = [d for d in answer["descriptions"] if rng.random() >= drop_rate]
+        return json.dumps(answer)
+    return respond
+
+def run(dishes, args, batched):
+    client = FakeBedrockClient(
+        latency=args.latency,
+        output_token_latency=args.output_token_latency,
+        responses={"several dishes at once": dropping(args.drop_rate, args.seed)}
+    )
+    agent = CulinaryWordsmithAgent(client)
+    budget = WorkflowBudget(max_tokens=0, max_seconds=0, max_calls=0)
+    started = time.perf_counter()
+    with budget.activate():
+        if batched:
+            descriptions = agent.generate_descriptions_batch(dishes)
+        else:
+            descriptions = [
+                agent.generate_description(d["dish_name"], d["chef_analysis"], d["dietary_analysis"], d["sides_analysis"])
+                for d in dishes
+            ]
+    elapsed = time.perf_counter() - started
+    assert len(descriptions) == len(dishes) and all(descriptions)
+    return len(client.calls), budget.input_tokens, budget.output_tokens, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dishes", type=int, default=100)
+    parser.add_argument("--workload", default=os.path.join(BENCH_DIR, "workloads", "recorded_dishes.jsonl"))
+    parser.add_argument("--latency", type=float, default=0.05, help="fixed seconds per call")
+    parser.add_argument("--output-token-latency", type=float, default=0.0005, help="seconds per output token")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="chance a batched answer omits a dish")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with open(args.workload) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    dishes = build_menu(records, args.dishes)
+
+    print(f"{len(dishes)} dishes, {args.latency * 1000:.0f}ms per call + "
+          f"{args.output_token_latency * 1000:.1f}ms per output token, drop rate {args.drop_rate:.0%}\n")
+    print(f"{'path':<10} {'calls':>6} {'input tok':>10} {'output tok':>11} {'wall s':>8}")
+    rows = {}
+    for batched in (False, True):
+        name = "batched" if batched else "per-dish"
+        rows[name] = run(dishes, args, batched)
+        calls, input_tokens, output_tokens, elapsed = rows[name]
+        print(f"{name:<10} {calls:>6} {input_tokens:>10} {output_tokens:>11} {elapsed:>8.2f}")
+
+    before, after = rows["per-dish"], rows["batched"]
+    print(f"\nbatched: {after[0] / before[0]:.0%} of the calls, "
+          f"{after[1] / before[1]:.0%} of the input tokens, {after[3] / before[3]:.0%} of the wall time")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Stand-in for the bedrock-runtime client used by the benchmarks.
+
+FakeBedrockClient answers invoke_model with canned, well-formed Nova responses
+for each agent (recognised by its system prompt), optionally sleeping to
+simulate model latency or throttling, and records every request it receives.
+"""
+import io
+import re
+import json
+import time
+import random
+import threading
+
+def batch_descriptions(request):
+    """Answer a batched Culinary Wordsmith request with one description per dish id"""
+    prompt = request["messages"][0]["content"][-1]["text"]
+    descriptions = []
+    for line in prompt.splitlines():
+        match = re.match(r'\{"id":"([^"]+)","dish_name":"([^"]*)"', line.strip())
+        if match:
+            descriptions.append({
+                "id": match.group(1),
+                "description": f"{match.group(2)}: " + CANNED_RESPONSES["Culinary Wordsmith"],
+            })
+    return json.dumps({"descriptions": descriptions})
+
+# Checked in order against the system prompt; a value may be a callable
+# taking the request and returning the reply text
+CANNED_RESPONSES = {
+    "verification": "yes",
+    "Plate Splitter": {
+        "dishes": [
+            {"name": "Cheeseburger", "box": [40, 80, 520, 900]},
+            {"name": "Caesar Salad", "box": [560, 120, 960, 700]},
+        ],
+    },
+    "Visionary Chef": {
+        "items": [
+            {"item": "beef patty", "confidence": 0.95},
+            {"item": "cheddar cheese", "confidence": 0.9},
+            {"item": "brioche bun", "confidence": 0.88},
+            {"item": "lettuce", "confidence": 0.8},
+            {"item": "tomato", "confidence": 0.75},
+            {"item": "pickles", "confidence": 0.45},
+        ],
+        "cooking_style": "grilled",
+        "presentation": "stacked burger on a wooden board with fries",
+    },
+    "Authenticator": {
+        "validation_status": "Confirmed",
+        "reason": "",
+        "suggested_name": "Classic Cheeseburger",
+    },
+    "Dietary Detective": {
+        "allergens": ["Dairy", "Wheat/Gluten"],
+        "potential_allergens": ["Sesame"],
+        "dietary_tags": [],
+        "disclaimer": "Allergen information is AI-generated.",
+    },
+    "Side Item Analyzer": {
+        "main_dish_components": ["beef patty", "cheddar cheese", "brioche bun"],
+        "side_items": [{"name": "fries", "description": "crispy shoestring fries", "confidence": 0.85}],
+        "sauces_and_garnishes": ["pickles"],
+        "presentation_notes": "fries served to the side",
+    },
+    "several dishes at once": batch_descriptions,
+    "Culinary Wordsmith": (
+        "A flame-grilled beef patty crowned with melted cheddar, crisp lettuce and ripe tomato "
+        "on a toasted brioche bun, served with golden shoestring fries."
+    ),
+}
+
+class FakeStreamingBody:
+    """Mimics botocore's StreamingBody closely enough for the agents"""
+
+    def __init__(self, payload):
+        self._stream = io.BytesIO(payload)
+
+    def read(self, *args):
+        return self._stream.read(*args)
+
+class FakeClientError(Exception):
+    """Carries a botocore-style ``response`` so callers can read the error code"""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code, "Message": code}}
+
+class FakeBedrockClient:
+    """In-process bedrock-runtime stand-in with configurable latency and throttling"""
+
+    def __init__(self, latency=0.0, jitter=0.0, responses=None, seed=None, throttle_rate=0.0, output_token_latency=0.0,
+                 input_token_latency=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        # Extra seconds per generated output token, so long answers take longer
+        self.output_token_latency = output_token_latency
+        # Extra seconds per input token not read from the prompt cache (prefill)
+        self.input_token_latency = input_token_latency
+        # Share of calls (or a callable returning it) rejected with ThrottlingException
+        self.throttle_rate = throttle_rate
+        self.responses = dict(CANNED_RESPONSES, **(responses or {}))
+        self.calls = []
+        # Prompt prefixes (per model) written to the simulated prompt cache
+        self._cached_prefixes = set()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _response_text(self, request):
+        system_text = " ".join(block.get("text", "") for block in request.get("system", []))
+        for marker, response in self.responses.items():
+            if marker in system_text:
+                if callable(response):
+                    return response(request)
+                return response if isinstance(response, str) else json.dumps(response)
+        return "{}"
+
+    def _sleep(self, text="", uncached_input_tokens=0):
+        delay = self.latency(self._random) if callable(self.latency) else self.latency
+        delay += self.output_token_latency * (len(text) // 4)
+        delay += self.input_token_latency * uncached_input_tokens
+        if self.jitter:
+            delay += self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def _receive(self, modelId, body):
+        """Record a request, apply throttling and latency; return its reply text and usage"""
+        request = json.loads(body)
+        call = {"modelId": modelId, "request": request}
+        with self._lock:
+            self.calls.append(call)
+        throttle_rate = self.throttle_rate() if callable(self.throttle_rate) else self.throttle_rate
+        if throttle_rate and self._random.random() < throttle_rate:
+            raise FakeClientError("ThrottlingException")
+        text = self._response_text(request)
+        usage = call["usage"] = self._usage(modelId, request, body, text)
+        self._sleep(text, usage["inputTokens"])
+        return text, usage
+
+    @staticmethod
+    def _cached_prefix(request):
+        """Everything up to the request's last cachePoint block, or None"""
+        blocks = list(request.get("system", []))
+        for message in request.get("messages", []):
+            blocks += message["content"]
+        last = max((i for i, block in enumerate(blocks) if "cachePoint" in block), default=None)
+        return None if last is None else json.dumps(blocks[:last])
+
+    def _usage(self, modelId, request, body, text):
+        """Token usage; a prefix marked with cachePoint is written on first sight and read after"""
+        input_tokens = len(body) // 4
+        usage = {"inputTokens": input_tokens, "outputTokens": len(text) // 4}
+        prefix = self._cached_prefix(request)
+        if prefix is not None:
+            prefix_tokens = len(prefix) // 4
+            with self._lock:
+                seen = (modelId, prefix) in self._cached_prefixes
+                self._cached_prefixes.add((modelId, prefix))
+            usage["cacheReadInputTokenCount" if seen else "cacheWriteInputTokenCount"] = prefix_tokens
+            usage["inputTokens"] = max(input_tokens - prefix_tokens, 0)
+        usage["totalTokens"] = input_tokens + usage["outputTokens"]
+        return usage
+
+    def invoke_model(self, modelId, body, **kwargs):
+        text, usage = self._receive(modelId, body)
+        payload = {
+            "output": {"message": {"role": "assistant", "content": [{"text": text}]}},
+            "stopReason": "end_turn",
+            "usage": usage,
+        }
+        return {"body": FakeStreamingBody(json.dumps(payload).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        """Stream the reply word by word in Nova's event format"""
+        text, usage = self._receive(modelId, body)
+        words = text.split(" ")
+        events = [{"messageStart": {"role": "assistant"}}]
+        events += [
+            {"contentBlockDelta": {"delta": {"text": word if i == 0 else " " + word}, "contentBlockIndex": 0}}
+            for i, word in enumerate(words)
+        ]
+        events += [
+            {"contentBlockStop": {"contentBlockIndex": 0}},
+            {"messageStop": {"stopReason": "end_turn"}},
+            {"metadata": {"usage": usage}},
+        ]
+        return {"body": ({"chunk": {"bytes": json.dumps(event).encode("utf-8")}} for event in events)}
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Import-time profile of the Lambda entry point, checked against a budget.
+
+Each scenario runs in a fresh interpreter with ``-X importtime`` against the
+Lambda layer layout. The script prints the slowest modules per scenario and
+exits non-zero when a scenario exceeds its budget or imports a module that
+must stay lazy (see benchmarks/import_budget.json).
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --top 30
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+LAYER_PATH = os.path.join(ROOT, "lambda_layer", "python")
+FUNCTION_PATH = os.path.join(ROOT, "infra", "lambda", "functions", "orchestrator")
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_budget.json")
+
+def parse_importtime(stderr):
+    """Parse ``-X importtime`` output into [(module, self_us, cumulative_us)]"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_part, cumulative_part, name_part = line[len("import time:"):].split("|")
+        modules.append((name_part.strip(), int(self_part), int(cumulative_part)))
+    return modules
+
+def profile(code):
+    """Run code in a fresh interpreter with the layer on the path and profile its imports"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([LAYER_PATH, FUNCTION_PATH])
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=LAYER_PATH,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Scenario failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+def check_scenario(name, scenario, top):
+    """Profile one scenario, print its report and return a list of budget violations"""
+    modules = profile(scenario["code"])
+    imported = {module for module, _, _ in modules}
+    # Sum top-level imports only; cumulative times already include children
+    total_us = sum(cumulative for module, _, cumulative in modules if module in scenario["roots"])
+
+    print(f"\n== {name}: {scenario['code']}")
+    print(f"{'module':<40} {'self ms':>10} {'cumulative ms':>15}")
+    for module, self_us, cumulative_us in sorted(modules, key=lambda m: m[2], reverse=True)[:top]:
+        print(f"{module:<40} {self_us / 1000:>10.2f} {cumulative_us / 1000:>15.2f}")
+    print(f"total: {total_us / 1000:.2f} ms (budget {scenario['budget_ms']} ms)")
+
+    violations = []
+    if total_us > scenario["budget_ms"] * 1000:
+        violations.append(f"{name}: {total_us / 1000:.2f} ms exceeds budget of {scenario['budget_ms']} ms")
+    for module in scenario.get("forbidden", []):
+        if module in imported:
+            violations.append(f"{name}: imports {module}, which must stay lazy")
+    return violations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="modules to show per scenario")
+    parser.add_argument("--budget", default=BUDGET_FILE, help="budget JSON file")
+    args = parser.parse_args()
+
+    with open(args.budget) as f:
+        budget = json.load(f)
+
+    violations = []
+    for name, scenario in budget["scenarios"].items():
+        violations.extend(check_scenario(name, scenario, args.top))
+
+    if violations:
+        print("\nImport-time budget exceeded:")
+        for violation in violations:
+            print(f"  - {violation}")
+        sys.exit(1)
+    print("\nAll scenarios within budget")
+
+if __name__ == "__main__":
+    main()
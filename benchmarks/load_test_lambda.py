@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Load-test the orchestrator Lambda handler locally, with Bedrock stubbed.
+
+Builds synthetic API Gateway HTTP API (payload format 2.0) events: dishes
+with base64 photos of several sizes, "search" requests and a share of bad
+requests (no image, a photo too small to analyze). A pool of worker
+processes plays Lambda containers: each imports the handler from the
+Lambda layer layout on its first request (a cold start), serves one
+request at a time and retires after --recycle requests, when a fresh
+container takes its place. Every container answers Bedrock calls from its
+own FakeBedrockClient and keeps its caches in its own scratch directory,
+as it would under /tmp.
+
+Reports requests/s, latency percentiles for cold and warm requests, each
+container's peak RSS and the responses by status code. With --rate,
+events arrive at that many per second and latency includes time queued
+for a free container; otherwise every container is kept busy.
+
+Usage:
+    python benchmarks/load_test_lambda.py [--requests 400] [--concurrency 8] [--recycle 100] [--rate 0] [--logs DIR]
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(BENCH_DIR, ".."))
+LAYER_PATH = os.path.join(ROOT, "lambda_layer", "python")
+FUNCTION_PATH = os.path.join(ROOT, "infra", "lambda", "functions", "orchestrator")
+
+# Photo sizes sent, from a phone's downscaled upload to a full-size one
+PHOTO_SIZES = [(640, 480), (1024, 768), (1600, 1200), (2592, 1944)]
+
+class LambdaContext:
+    """The parts of the Lambda context object a handler may read"""
+
+    def __init__(self, container_id, timeout=30):
+        self.function_name = "menu-maestro-orchestrator"
+        self.memory_limit_in_mb = 1024
+        self.log_stream_name = f"container-{container_id}"
+        self.aws_request_id = ""
+        self._deadline = 0.0
+        self._timeout = timeout
+
+    def start(self):
+        self.aws_request_id = str(uuid.uuid4())
+        self._deadline = time.monotonic() + self._timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self._deadline - time.monotonic()) * 1000), 0)
+
+def make_photo(rng, size):
+    """A JPEG of random shapes, sharp and well exposed enough for the quality gate"""
+    from PIL import Image, ImageDraw
+    width, height = size
+    image = Image.new("RGB", size, tuple(rng.randrange(60, 200) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(60):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randrange(width // 40, width // 6)
+        draw.ellipse((x, y, x + radius, y + radius), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=88)
+    return buffer.getvalue()
+
+def api_gateway_event(body):
+    """An API Gateway HTTP API (payload format 2.0) POST event with a JSON body"""
+    now = time.time()
+    return {
+        "version": "2.0",
+        "routeKey": "POST /process",
+        "rawPath": "/process",
+        "rawQueryString": "",
+        "headers": {"content-type": "application/json", "user-agent": "load-test"},
+        "requestContext": {
+            "accountId": "123456789012",
+            "apiId": "local",
+            "http": {"method": "POST", "path": "/process", "protocol": "HTTP/1.1", "sourceIp": "127.0.0.1",
+                     "userAgent": "load-test"},
+            "requestId": str(uuid.uuid4()),
+            "routeKey": "POST /process",
+            "stage": "$default",
+            "time": time.strftime("%d/%b/%Y:%H:%M:%S +0000", time.gmtime(now)),
+            "timeEpoch": int(now * 1000),
+        },
+        "body": json.dumps(body),
+        "isBase64Encoded": False,
+    }
+
+def build_events(args, rng):
+    """(kind, event) pairs in the order they are sent"""
+    with open(args.workload) as f:
+        names = [json.loads(line)["dish_name"] for line in f if line.strip()]
+    photos = {size: [base64.b64encode(make_photo(rng, size)).decode("utf-8") for _ in range(args.photos)]
+              for size in PHOTO_SIZES}
+    tiny = base64.b64encode(make_photo(rng, (160, 120))).decode("utf-8")
+    restaurants = [f"Restaurant {i}" for i in range(10)]
+
+    events = []
+    for _ in range(args.requests):
+        roll = rng.random()
+        if roll < args.search_share:
+            kind = "search"
+            body = {"mode": "search", "restaurant": rng.choice(restaurants), "tags": ["vegetarian"],
+                    "free_of": ["peanuts"]}
+        elif roll < args.search_share + args.bad_share:
+            kind = "bad"
+            body = {"dish_name": rng.choice(names), "spice_level": "Mild"}
+            if rng.random() < 0.5:
+                body["image"] = tiny
+        else:
+            size = rng.choice(PHOTO_SIZES)
+            kind = f"dish {size[0]}x{size[1]}"
+            body = {"dish_name": rng.choice(names), "spice_level": rng.choice(["Mild", "Medium", "Hot"]),
+                    "restaurant": rng.choice(restaurants), "image": rng.choice(photos[size])}
+        events.append((kind, api_gateway_event(body)))
+    return events
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+def container(container_id, tasks, results, options):
+    """One simulated Lambda container: cold init, then requests until retired or stopped"""
+    scratch = tempfile.mkdtemp(prefix=f"lambda-container-{container_id}-")
+    # Photos too small to analyze are turned away, as the "bad" requests expect
+    os.environ.update({"USE_S3": "false", "CACHE_DIR": os.path.join(scratch, "cache"),
+                       "UPLOAD_FOLDER": os.path.join(scratch, "uploads"), "QUALITY_GATE_MODE": "reject"})
+    sys.path[:0] = [LAYER_PATH, FUNCTION_PATH, BENCH_DIR]
+    # What the handler prints goes where CloudWatch would get it, not into the report
+    log_path = os.path.join(options["logs"], f"container-{container_id}.log") if options["logs"] else os.devnull
+    sys.stdout = sys.stderr = open(log_path, "w", buffering=1)
+    served = 0
+    init = None
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            index, kind, scheduled, event = task
+            waited = time.time() - scheduled if scheduled is not None else 0.0
+            cold = init is None
+            started = time.perf_counter()
+            try:
+                if cold:
+                    # The INIT phase, which the first request of a container waits for
+                    import lambda_function
+                    from app import bedrock_utils
+                    from fake_bedrock import FakeBedrockClient
+                    client = FakeBedrockClient(latency=options["latency"], jitter=options["jitter"],
+                                               throttle_rate=options["throttle_rate"], seed=container_id)
+                    bedrock_utils.get_bedrock_client = lambda: client
+                    context = LambdaContext(container_id)
+                    init = time.perf_counter() - started
+                context.start()
+                response = lambda_function.lambda_handler(event, context)
+                status = str(response.get("statusCode", "none"))
+            except Exception as e:
+                status = f"raised {type(e).__name__}"
+            duration = time.perf_counter() - started
+            results.put(("request", index, kind, status, cold, waited + duration, duration))
+            served += 1
+            if options["recycle"] and served >= options["recycle"]:
+                break
+    finally:
+        results.put(("container", container_id, served, init or 0.0, peak_rss_mb()))
+        shutil.rmtree(scratch, ignore_errors=True)
+
+def percentiles(samples):
+    """p50, p90, p99 and max of samples in seconds, in ms"""
+    samples = sorted(samples)
+    return tuple(samples[min(int(len(samples) * pct / 100), len(samples) - 1)] * 1000 for pct in (50, 90, 99, 100))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8, help="containers serving at once")
+    parser.add_argument("--recycle", type=int, default=100, help="requests before a container is replaced (0: never)")
+    parser.add_argument("--rate", type=float, default=0, help="arrivals per second (0: keep every container busy)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per Bedrock call")
+    parser.add_argument("--jitter", type=float, default=0.05, help="extra random seconds per Bedrock call")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of Bedrock calls throttled")
+    parser.add_argument("--search-share", type=float, default=0.1)
+    parser.add_argument("--bad-share", type=float, default=0.05)
+    parser.add_argument("--photos", type=int, default=8, help="distinct photos per size")
+    parser.add_argument("--logs", help="directory for each container's output (default: discarded)")
+    parser.add_argument("--workload", default=os.path.join(BENCH_DIR, "workloads", "recorded_dishes.jsonl"))
+    parser.add_argument("--seed", type=int, default=29)
+    args = parser.parse_args()
+    events = build_events(args, random.Random(args.seed))
+    options = {"latency": args.latency, "jitter": args.jitter, "throttle_rate": args.throttle_rate,
+               "recycle": args.recycle, "logs": args.logs}
+    if args.logs:
+        os.makedirs(args.logs, exist_ok=True)
+
+    # Fresh interpreters, so every container starts as cold as a new Lambda one
+    mp = multiprocessing.get_context("spawn")
+    tasks, results = mp.Queue(), mp.Queue()
+    containers = {}
+    launched = []
+
+    def launch():
+        container_id = len(launched)
+        launched.append(container_id)
+        process = mp.Process(target=container, args=(container_id, tasks, results, options), daemon=True)
+        process.start()
+        containers[container_id] = process
+
+    def feed():
+        for index, (kind, event) in enumerate(events):
+            if args.rate:
+                delay = started + index / args.rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                tasks.put((index, kind, time.time(), event))
+            else:
+                tasks.put((index, kind, None, event))
+
+    for _ in range(args.concurrency):
+        launch()
+    started = time.time()
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+
+    requests, retired = [], []
+    while len(requests) < len(events):
+        message = results.get()
+        if message[0] == "request":
+            requests.append(message[1:])
+        else:
+            retired.append(message[1:])
+            containers.pop(message[1]).join()
+            if len(requests) + len(containers) < len(events):
+                launch()
+    elapsed = time.time() - started
+    for _ in containers:
+        tasks.put(None)
+    while containers:
+        message = results.get()
+        if message[0] == "container":
+            retired.append(message[1:])
+            containers.pop(message[1]).join()
+
+    print(f"{len(requests)} requests, {args.concurrency} containers at once, {len(retired)} in all, "
+          f"Bedrock {args.latency * 1000:g}-{(args.latency + args.jitter) * 1000:g} ms per call, "
+          f"{'open loop at %g/s' % args.rate if args.rate else 'closed loop'}\n")
+    print(f"throughput: {len(requests) / elapsed:.1f} requests/s over {elapsed:.1f}s\n")
+
+    print(f"{'requests':<20} {'count':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'handler p50':>12}")
+    groups = {"all": requests,
+              "cold": [r for r in requests if r[3]],
+              "warm": [r for r in requests if not r[3]]}
+    for kind in sorted({r[1] for r in requests}):
+        groups[kind] = [r for r in requests if r[1] == kind and not r[3]]
+    for label, group in groups.items():
+        if group:
+            p50, p90, p99, worst = percentiles([r[4] for r in group])
+            handler = percentiles([r[5] for r in group])[0]
+            label = label if label in ("all", "cold", "warm") else f"  warm {label}"
+            print(f"{label:<20} {len(group):>6} {p50:>8.1f} {p90:>8.1f} {p99:>8.1f} {worst:>8.1f} {handler:>12.1f}")
+
+    print(f"\n{'container':<10} {'requests':>9} {'init ms':>8} {'peak RSS MB':>12}")
+    for container_id, served, init, rss in sorted(retired):
+        print(f"{container_id:<10} {served:>9} {init * 1000:>8.0f} {rss:>12.1f}")
+    rss = [r[3] for r in retired]
+    print(f"peak RSS: max {max(rss):.1f} MB, mean {sum(rss) / len(rss):.1f} MB")
+
+    print(f"\n{'status':<24} {'count':>6} {'share':>7}  by request")
+    for status in sorted({r[2] for r in requests}):
+        matching = [r for r in requests if r[2] == status]
+        kinds = {}
+        for r in matching:
+            kind = r[1] if r[1] in ("search", "bad") else "dish"
+            kinds[kind] = kinds.get(kind, 0) + 1
+        breakdown = ", ".join(f"{kind} {count}" for kind, count in sorted(kinds.items()))
+        print(f"{status:<24} {len(matching):>6} {len(matching) / len(requests):>7.1%}  {breakdown}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 import os
 import json
-import base64
+import time
 import boto3
 import sys
+from collections import OrderedDict
+from botocore.exceptions import ClientError
 
 # Add shared code layer to path
 sys.path.append('/opt/python')
@@ -15,6 +17,103 @@ from app.agents.side_item_analyzer import SideItemAnalyzerAgent
 from app.agents.culinary_wordsmith import CulinaryWordsmithAgent
 from app.utils.storage import StorageService
 
+# Image cache settings. The cache only serves inline payloads
+# (IMAGE_PAYLOAD_MODE=inline, or images not in S3): in the default auto mode
+# S3 images are passed to Bedrock by reference and never downloaded here
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# Entries validated within this window are served without a conditional GET
+IMAGE_CACHE_REVALIDATE_SECONDS = float(os.environ.get('IMAGE_CACHE_REVALIDATE_SECONDS', '30'))
+
+class ImageCache:
+    """Bounded in-memory cache of S3 images keyed by (S3 URI, ETag).
+
+    Lives at module level so it persists across warm invocations. Stale entries
+    are revalidated with a conditional GET (If-None-Match), so an unchanged
+    object costs a 304 instead of a full download. Only get_image_inputs'
+    inline path reads through it; S3 references skip it entirely.
+    """
+
+    def __init__(self, max_bytes, revalidate_seconds=0):
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self._entries = OrderedDict()  # (uri, etag) -> image bytes
+        self._validated = {}  # uri -> (etag, validated_at)
+        self._size = 0
+        self._s3_client = None
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'evictions': 0}
+
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            self._s3_client = boto3.client('s3')
+        return self._s3_client
+
+    def get(self, image_key, storage):
+        """Return image bytes for an S3 URI, downloading only when needed"""
+        if not image_key.startswith('s3://'):
+            return storage.get_image(image_key)
+
+        bucket = image_key.split('/')[2]
+        key = '/'.join(image_key.split('/')[3:])
+        etag, validated_at = self._validated.get(image_key, (None, 0))
+        cache_key = (image_key, etag)
+
+        if etag is not None and cache_key in self._entries:
+            if time.time() - validated_at < self.revalidate_seconds:
+                self.stats['hits'] += 1
+                self._entries.move_to_end(cache_key)
+                return self._entries[cache_key]
+            try:
+                response = self.s3_client.get_object(Bucket=bucket, Key=key, IfNoneMatch=etag)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in ('304', 'NotModified'):
+                    raise
+                self.stats['revalidated'] += 1
+                self._validated[image_key] = (etag, time.time())
+                self._entries.move_to_end(cache_key)
+                return self._entries[cache_key]
+            # The object changed since it was cached
+            self._drop(cache_key)
+        else:
+            response = self.s3_client.get_object(Bucket=bucket, Key=key)
+
+        self.stats['misses'] += 1
+        image_bytes = response['Body'].read()
+        self._put(image_key, response.get('ETag'), image_bytes)
+        return image_bytes
+
+    def _put(self, image_key, etag, image_bytes):
+        if etag is None or len(image_bytes) > self.max_bytes:
+            return
+        self._entries[(image_key, etag)] = image_bytes
+        self._validated[image_key] = (etag, time.time())
+        self._size += len(image_bytes)
+        while self._size > self.max_bytes:
+            (old_uri, old_etag), old_bytes = self._entries.popitem(last=False)
+            self._size -= len(old_bytes)
+            self.stats['evictions'] += 1
+            if self._validated.get(old_uri, (None,))[0] == old_etag:
+                del self._validated[old_uri]
+
+    def _drop(self, cache_key):
+        image_bytes = self._entries.pop(cache_key, None)
+        if image_bytes is not None:
+            self._size -= len(image_bytes)
+        self._validated.pop(cache_key[0], None)
+
+image_cache = ImageCache(IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_REVALIDATE_SECONDS)
+
+def get_image_inputs(image_key, storage):
+    """Return (image_bytes, image_uri) for an agent call.
+
+    S3 objects are handed to Bedrock by reference, so the image is only
+    downloaded, through the cache, when IMAGE_PAYLOAD_MODE=inline or the
+    key is not an S3 URI; in auto mode the cache is never used for S3.
+    """
+    if image_key.startswith('s3://') and os.environ.get('IMAGE_PAYLOAD_MODE', 'auto').lower() != 'inline':
+        return None, image_key
+    return image_cache.get(image_key, storage), None
+
 def lambda_handler(event, context):
     """Lambda handler for Bedrock Agent action groups"""
     try:
@@ -55,12 +154,12 @@ def handle_image_analysis(parameters, storage):
     image_key = parameters.get('imageKey', '')
     dish_name = parameters.get('dishName', '')
     
-    # Get image from S3
-    image_bytes = storage.get_image(image_key)
+    # Reference the image in S3, or fetch it (cached across actions and warm invocations)
+    image_bytes, image_uri = get_image_inputs(image_key, storage)
     
     # Analyze image
     agent = VisionaryChefAgent()
-    result = agent.analyze_image(dish_name, image_bytes)
+    result = agent.analyze_image(dish_name, image_bytes, image_uri=image_uri)
     
     return {
         'statusCode': 200,
@@ -103,12 +202,12 @@ def handle_side_item_analysis(parameters, storage):
     chef_analysis = parameters.get('chefAnalysis', {})
     image_key = parameters.get('imageKey', '')
     
-    # Get image from S3
-    image_bytes = storage.get_image(image_key)
+    # Reference the image in S3, or fetch it (cached across actions and warm invocations)
+    image_bytes, image_uri = get_image_inputs(image_key, storage)
     
     # Analyze side items
     agent = SideItemAnalyzerAgent()
-    result = agent.analyze_sides(dish_name, image_bytes, chef_analysis)
+    result = agent.analyze_sides(dish_name, image_bytes, chef_analysis, image_uri=image_uri)
     
     return {
         'statusCode': 200,
@@ -1,25 +1,74 @@
-import os
 import json
 import base64
-import boto3
 import sys
 import traceback
 
 # Add shared code layer to path
 sys.path.append('/opt/python')
 
-# Import from shared code
-from app.orchestrator import OrchestratorAgent
+# The orchestrator (and boto3 behind it) is imported on first real request and
+# reused by warm invocations; warm-ups and validation errors never load it
+_orchestrator = None
+
+def get_orchestrator():
+    """Return the container-wide orchestrator, importing it on first use"""
+    global _orchestrator
+    if _orchestrator is None:
+        from app.orchestrator import OrchestratorAgent
+        _orchestrator = OrchestratorAgent()
+    return _orchestrator
 
 def lambda_handler(event, context):
     """Lambda handler for the Orchestrator function"""
     try:
+        # Scheduled warm-up pings only need the container to exist
+        if event.get('warmup') or event.get('source') == 'aws.events':
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'status': 'warm'})
+            }
+        
         # Parse the request body
         body = json.loads(event['body']) if isinstance(event.get('body'), str) else event.get('body', {})
         
-        # Get parameters
+        # Get parameters ("plate" mode splits a photo of several dishes)
         dish_name = body.get('dish_name', '')
         spice_level = body.get('spice_level', 'Medium')
+        restaurant = body.get('restaurant', '')
+        mode = body.get('mode', 'dish')
+        
+        # "search" mode answers from dishes already processed, e.g.
+        # {"restaurant": "X", "tags": ["gluten-free"], "free_of": ["tree nuts", "peanuts"]}
+        if mode == 'search':
+            dishes = get_orchestrator().find_results(
+                restaurant=body.get('restaurant'),
+                tags=body.get('tags', []),
+                free_of=body.get('free_of', []),
+                name=body.get('name'),
+                limit=min(int(body.get('limit', 100)), 1000)
+            )
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'count': len(dishes), 'dishes': dishes})
+            }
+        
+        # "export" mode writes the stored menu, or one restaurant's, as CSV,
+        # Markdown or HTML to storage and returns where, e.g.
+        # {"mode": "export", "format": "html", "restaurant": "X"}
+        if mode == 'export':
+            result = get_orchestrator().publish_menu(body.get('format', 'html'), restaurant=body.get('restaurant'))
+            return {
+                'statusCode': 400 if 'error' in result else 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps(result)
+            }
         
         # Get image from request
         image_base64 = body.get('image', '')
@@ -36,9 +85,28 @@ def lambda_handler(event, context):
         # Decode image
         image_bytes = base64.b64decode(image_base64)
         
-        # Process the dish
-        orchestrator = OrchestratorAgent()
-        result = orchestrator.process_dish(dish_name, image_bytes, spice_level)
+        # Process the dish, or every dish on the plate
+        orchestrator = get_orchestrator()
+        if mode == 'plate':
+            result = orchestrator.process_plate(image_bytes, spice_level, restaurant=restaurant)
+        else:
+            result = orchestrator.process_dish(dish_name, image_bytes, spice_level, restaurant=restaurant)
+        
+        # The container may be frozen or recycled once this returns, which
+        # runs no background flush or atexit hook: store the results now
+        orchestrator.persist_results()
+        
+        # Bedrock is unavailable for this dish right now: tell the client when to retry
+        if 'retry_after' in result:
+            return {
+                'statusCode': 503,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Retry-After': str(result['retry_after'])
+                },
+                'body': json.dumps(result)
+            }
         
         # Check if there was an error
         if 'error' in result:
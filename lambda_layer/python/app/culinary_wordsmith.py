@@ -1,5 +1,45 @@
 import json
-from app.bedrock_utils import get_bedrock_client
+import textwrap
+from app import config
+from app.prompt_compaction import PromptCompactor, estimate_tokens
+from app.prompt_cache import CACHE_POINT
+from app.bedrock_utils import get_bedrock_client, invoke_nova, invoke_nova_stream, extract_json
+
+# Output tokens to allow per dish in a batched request (50-75 words plus JSON)
+BATCH_OUTPUT_TOKENS_PER_DISH = 160
+
+# Instructions shared by every dish; sent ahead of the dish so they can be cached
+DESCRIPTION_GUIDELINES = textwrap.dedent("""
+    Create an engaging, appetizing menu description for the dish given at the end of this message.
+    
+    Your description should:
+    1. Be approximately 50-75 words
+    2. Highlight key ingredients and cooking methods
+    3. Use sensory language (taste, texture, aroma)
+    4. Be enticing and appetizing
+    5. Subtly incorporate relevant dietary information when appropriate
+    6. Accurately reflect the specified spice level
+    7. Mention notable side items if present
+    
+    Provide only the final description text, with no additional commentary.
+""").strip()
+
+BATCH_GUIDELINES = textwrap.dedent("""
+    Create an engaging, appetizing menu description for each dish listed at the end of this message. Each line is one
+    dish as JSON with its id, name, spice level, chef's analysis, dietary analysis and, if present, side items analysis.
+    
+    Each description should:
+    1. Be approximately 50-75 words
+    2. Highlight key ingredients and cooking methods
+    3. Use sensory language (taste, texture, aroma)
+    4. Be enticing and appetizing
+    5. Subtly incorporate relevant dietary information when appropriate
+    6. Accurately reflect the specified spice level
+    7. Mention notable side items if present
+    
+    Format your response as a JSON object with one entry per dish, in the same order:
+    {"descriptions": [{"id": "dish id", "description": "final description text"}, ...]}
+""").strip()
 
 class CulinaryWordsmithAgent:
     """Generates engaging menu descriptions"""
@@ -7,18 +47,44 @@ class CulinaryWordsmithAgent:
     def __init__(self, bedrock_client=None):
         self.bedrock_client = bedrock_client or get_bedrock_client()
     
-    def generate_description(self, dish_name, chef_analysis, dietary_analysis, sides_analysis=None, feedback=None):
+    def generate_description(self, dish_name, chef_analysis, dietary_analysis, sides_analysis=None, feedback=None, compactor=None, max_tokens=500):
         """Generate an engaging menu description"""
-        # Define system prompt
+        request_body = self.build_request(dish_name, chef_analysis, dietary_analysis, sides_analysis, feedback, compactor, max_tokens)
+        
+        # Call the Bedrock API
+        result_text = invoke_nova(self.bedrock_client, request_body, "culinary_wordsmith")
+        
+        # Clean up the result - remove any markdown formatting or extra quotes
+        result_text = result_text.replace('```', '').strip()
+        
+        return result_text
+    
+    def stream_description(self, dish_name, chef_analysis, dietary_analysis, sides_analysis=None, feedback=None, compactor=None, max_tokens=500):
+        """Generate the description, yielding text chunks as the model writes them"""
+        request_body = self.build_request(dish_name, chef_analysis, dietary_analysis, sides_analysis, feedback, compactor, max_tokens)
+        
+        started = False
+        for chunk in invoke_nova_stream(self.bedrock_client, request_body, "culinary_wordsmith"):
+            chunk = chunk.replace('```', '')
+            if not started:
+                chunk = chunk.lstrip()
+                started = bool(chunk)
+            if chunk:
+                yield chunk
+    
+    def build_request(self, dish_name, chef_analysis, dietary_analysis, sides_analysis=None, feedback=None, compactor=None, max_tokens=500):
+        """Build the Nova request payload for a description"""
+        # Define system prompt; it and the guidelines are identical for every
+        # dish, so both end in a prompt-cache checkpoint
         system_list = [{
             "text": "You are the Culinary Wordsmith, a creative writer specializing in appetizing food descriptions. "
                     "Your task is to transform ingredient lists and cooking notes into enticing marketing copy. "
                     "Create descriptions that are engaging, descriptive, and make the reader's mouth water."
-        }]
+        }, CACHE_POINT]
         
-        # Convert analyses to string representations
-        chef_analysis_str = json.dumps(chef_analysis, indent=2)
-        dietary_analysis_str = json.dumps(dietary_analysis, indent=2)
+        # Serialize only the fields this stage uses, without pretty-print whitespace
+        compactor = compactor or PromptCompactor(chef_analysis)
+        dietary_analysis_str = compactor.dumps(dietary_analysis)
         
         # Get spice level from chef analysis
         spice_level = chef_analysis.get("spice_level", "Medium")
@@ -26,7 +92,7 @@ class CulinaryWordsmithAgent:
         # Include sides analysis if provided
         sides_text = ""
         if sides_analysis:
-            sides_analysis_str = json.dumps(sides_analysis, indent=2)
+            sides_analysis_str = compactor.dumps(sides_analysis)
             sides_text = f"""
             Side Items Analysis:
             {sides_analysis_str}
@@ -43,10 +109,10 @@ class CulinaryWordsmithAgent:
             
             Please incorporate this feedback when creating the new description.
             """
-            
-        # Define user message
-        prompt_text = f"""
-        Create an engaging, appetizing menu description for "{dish_name}" based on the following information:
+        
+        # Define user message: static guidelines first, then this dish
+        prompt_text = compactor.build_prompt("culinary_wordsmith", lambda chef_analysis_str: f"""
+        Dish Name: {dish_name}
         
         Chef's Analysis:
         {chef_analysis_str}
@@ -59,22 +125,15 @@ class CulinaryWordsmithAgent:
         {sides_text}
         
         {feedback_text}
-        
-        Your description should:
-        1. Be approximately 50-75 words
-        2. Highlight key ingredients and cooking methods
-        3. Use sensory language (taste, texture, aroma)
-        4. Be enticing and appetizing
-        5. Subtly incorporate relevant dietary information when appropriate
-        6. Accurately reflect the specified spice level
-        7. Mention notable side items if present
-        
-        Provide only the final description text, with no additional commentary.
-        """
+        """, static_text=DESCRIPTION_GUIDELINES)
         
         message_list = [{
             "role": "user",
             "content": [
+                {
+                    "text": DESCRIPTION_GUIDELINES
+                },
+                CACHE_POINT,
                 {
                     "text": prompt_text
                 }
@@ -83,7 +142,7 @@ class CulinaryWordsmithAgent:
         
         # Configure inference parameters
         inf_params = {
-            "maxTokens": 500,
+            "maxTokens": max_tokens,
             "temperature": 0.7,
             "topP": 0.9,
             "topK": 20
@@ -97,17 +156,111 @@ class CulinaryWordsmithAgent:
             "inferenceConfig": inf_params
         }
         
-        # Call the Bedrock API
-        response = self.bedrock_client.invoke_model(
-            modelId="us.amazon.nova-pro-v1:0",
-            body=json.dumps(request_body)
-        )
+        return request_body
+    
+    def generate_descriptions_batch(self, dishes):
+        """Generate descriptions for many dishes with as few calls as possible.
+
+        ``dishes`` is a list of dicts with dish_name, chef_analysis,
+        dietary_analysis and optionally sides_analysis. Dishes are packed into
+        chunks that fit the batch token limits and each chunk is one request
+        with a JSON answer per dish. A chunk that fails is split in half and
+        retried, dishes missing from an answer are retried together, and a
+        single dish goes through generate_description. Returns the
+        descriptions in input order.
+        """
+        entries = [self._batch_entry(f"d{index + 1}", dish) for index, dish in enumerate(dishes)]
+        descriptions = {}
+        for chunk in self._batch_chunks(entries):
+            self._generate_chunk(chunk, descriptions)
+        return [descriptions[entry["id"]] for entry in entries]
+    
+    def _batch_entry(self, dish_id, dish):
+        """Compact one dish's inputs into a prompt block"""
+        chef_analysis = dish["chef_analysis"]
+        compactor = PromptCompactor(chef_analysis)
+        block = {
+            "id": dish_id,
+            "dish_name": dish["dish_name"],
+            "spice_level": chef_analysis.get("spice_level", "Medium"),
+            "chef_analysis": json.loads(compactor.for_agent("culinary_wordsmith")),
+            "dietary_analysis": dish["dietary_analysis"]
+        }
+        if dish.get("sides_analysis"):
+            block["sides_analysis"] = dish["sides_analysis"]
+        text = compactor.dumps(block)
+        return {"id": dish_id, "dish": dish, "text": text, "tokens": estimate_tokens(text)}
+    
+    def _batch_chunks(self, entries):
+        """Group entries so each request stays under the batch input/output/dish limits"""
+        max_dishes = max(min(config.WORDSMITH_BATCH_MAX_DISHES,
+                             config.WORDSMITH_BATCH_MAX_OUTPUT_TOKENS // BATCH_OUTPUT_TOKENS_PER_DISH), 1)
+        chunks = []
+        chunk, chunk_tokens = [], 0
+        for entry in entries:
+            if chunk and (len(chunk) >= max_dishes or chunk_tokens + entry["tokens"] > config.WORDSMITH_BATCH_MAX_INPUT_TOKENS):
+                chunks.append(chunk)
+                chunk, chunk_tokens = [], 0
+            chunk.append(entry)
+            chunk_tokens += entry["tokens"]
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+    
+    def _generate_chunk(self, chunk, descriptions):
+        """Describe one chunk, splitting and retrying whatever comes back missing"""
+        if len(chunk) == 1:
+            # Down to one dish: use the regular per-dish request
+            dish = chunk[0]["dish"]
+            descriptions[chunk[0]["id"]] = self.generate_description(
+                dish["dish_name"], dish["chef_analysis"], dish["dietary_analysis"], dish.get("sides_analysis")
+            )
+            return
         
-        # Parse the response
-        response_body = json.loads(response['body'].read())
-        result_text = response_body["output"]["message"]["content"][0]["text"]
+        try:
+            results = self._invoke_batch(chunk)
+        except Exception as e:
+            print(f"Error in batched descriptions ({len(chunk)} dishes), splitting: {str(e)}")
+            results = {}
+        descriptions.update(results)
         
-        # Clean up the result - remove any markdown formatting or extra quotes
-        result_text = result_text.replace('```', '').strip()
+        missing = [entry for entry in chunk if entry["id"] not in results]
+        if len(missing) == len(chunk):
+            half = len(chunk) // 2
+            self._generate_chunk(chunk[:half], descriptions)
+            self._generate_chunk(chunk[half:], descriptions)
+        elif missing:
+            self._generate_chunk(missing, descriptions)
+    
+    def _invoke_batch(self, chunk):
+        """Send one batched request; return {dish id: description} for the dishes answered"""
+        system_list = [{
+            "text": "You are the Culinary Wordsmith, a creative writer specializing in appetizing food descriptions. "
+                    "Your task is to transform ingredient lists and cooking notes into enticing marketing copy. "
+                    "Create descriptions that are engaging, descriptive, and make the reader's mouth water. "
+                    "You write descriptions for several dishes at once, each independent of the others."
+        }, CACHE_POINT]
+        
+        # Static guidelines first and cached; only the dish list changes per chunk
+        prompt_text = "Dishes:\n" + "\n".join(entry["text"] for entry in chunk)
+        
+        request_body = {
+            "schemaVersion": "messages-v1",
+            "messages": [{"role": "user", "content": [{"text": BATCH_GUIDELINES}, CACHE_POINT, {"text": prompt_text}]}],
+            "system": system_list,
+            "inferenceConfig": {
+                "maxTokens": BATCH_OUTPUT_TOKENS_PER_DISH * len(chunk),
+                "temperature": 0.7,
+                "topP": 0.9,
+                "topK": 20
+            }
+        }
         
-        return result_text
\ No newline at end of file
+        result_text = invoke_nova(self.bedrock_client, request_body, "culinary_wordsmith")
+        ids = {entry["id"] for entry in chunk}
+        results = {}
+        for item in extract_json(result_text).get("descriptions", []):
+            description = str(item.get("description", "")).replace('```', '').strip()
+            if item.get("id") in ids and description:
+                results[item["id"]] = description
+        return results
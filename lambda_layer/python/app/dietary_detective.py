@@ -1,5 +1,62 @@
 import json
-from app.bedrock_utils import get_bedrock_client
+import textwrap
+from app.prompt_compaction import PromptCompactor
+from app.prompt_cache import CACHE_POINT
+from app.bedrock_utils import get_bedrock_client, invoke_nova
+
+# Instructions shared by every dish; sent ahead of the dish so they can be cached
+DIETARY_CHECKLIST = textwrap.dedent("""
+    Analyze the ingredients list and dish name given at the end of this message for ALL potential allergens and dietary classifications.
+    
+    IMPORTANT: Pay special attention to the dish name as it may contain ingredients not visible in the image. For example, if the dish name mentions "chicken", "beef", "pork", "fish", or any other meat, the dish CANNOT be vegetarian or vegan, even if these ingredients are not detected in the image.
+    
+    For each identified ingredient, check against this COMPREHENSIVE list of food allergens and sensitivities:
+    
+    1. Major allergens:
+       - Dairy/Milk products (including lactose)
+       - Eggs
+       - Peanuts
+       - Tree nuts (almonds, walnuts, cashews, etc.)
+       - Fish
+       - Shellfish (shrimp, crab, lobster, etc.)
+       - Wheat/Gluten
+       - Soy
+    
+    2. Additional common allergens:
+       - Sesame
+       - Mustard
+       - Celery
+       - Lupin
+       - Sulfites
+    
+    3. Other potential allergens:
+       - Legumes (beans, lentils, chickpeas, etc.)
+       - Corn
+       - Nightshades (tomatoes, peppers, eggplant, potatoes)
+       - Specific fruits (berries, citrus, etc.)
+       - Specific spices
+       - Food additives and preservatives
+       - Garlic/Onions
+    
+    Also determine dietary categories:
+    - Vegetarian
+    - Vegan
+    - Gluten-free
+    - Dairy-free
+    - Keto-friendly
+    - Paleo-friendly
+    - Low-FODMAP
+    - Halal
+    - Kosher
+    
+    Format your response as a JSON object with the following structure:
+    {
+        "allergens": ["Allergen1", "Allergen2", ...],
+        "potential_allergens": ["PotentialAllergen1", "PotentialAllergen2", ...],
+        "dietary_tags": ["Tag1", "Tag2", ...],
+        "disclaimer": "Standard disclaimer about AI-generated allergen information"
+    }
+""").strip()
 
 class DietaryDetectiveAgent:
     """Identifies allergens and dietary classifications"""
@@ -7,82 +64,45 @@ class DietaryDetectiveAgent:
     def __init__(self, bedrock_client=None):
         self.bedrock_client = bedrock_client or get_bedrock_client()
     
-    def analyze_dietary(self, chef_analysis):
+    def analyze_dietary(self, chef_analysis, compactor=None):
         """Analyze the ingredients for allergens and dietary classifications"""
+        request_body = self.build_request(chef_analysis, compactor)
+        
+        # Call the Bedrock API
+        result_text = invoke_nova(self.bedrock_client, request_body, "dietary_detective")
+        
+        return self.parse_response(result_text)
+    
+    def build_request(self, chef_analysis, compactor=None):
+        """Build the Nova request payload for a dietary analysis"""
         # Extract dish name if available
         dish_name = chef_analysis.get("dish_name", "")
         
-        # Define system prompt
+        # Define system prompt; it and the checklist are identical for every
+        # dish, so both end in a prompt-cache checkpoint
         system_list = [{
             "text": "You are the Dietary Detective, an expert in food allergies, intolerances, and dietary restrictions. "
                     "Your task is to thoroughly identify ALL potential allergens and classify dishes based on dietary restrictions. "
                     "Be comprehensive and safety-focused, erring on the side of caution when identifying potential allergens."
-        }]
+        }, CACHE_POINT]
         
-        # Convert chef analysis to a string representation
-        chef_analysis_str = json.dumps(chef_analysis, indent=2)
-        
-        # Define user message
-        prompt_text = f"""
-        Analyze the following ingredients list and dish name for ALL potential allergens and dietary classifications:
+        # Serialize only the fields this stage uses, without pretty-print whitespace
+        compactor = compactor or PromptCompactor(chef_analysis)
         
+        # Define user message: static checklist first, then this dish
+        prompt_text = compactor.build_prompt("dietary_detective", lambda chef_analysis_str: f"""
         Dish Name: {dish_name}
         
         {chef_analysis_str}
-        
-        IMPORTANT: Pay special attention to the dish name as it may contain ingredients not visible in the image. For example, if the dish name mentions "chicken", "beef", "pork", "fish", or any other meat, the dish CANNOT be vegetarian or vegan, even if these ingredients are not detected in the image.
-        
-        For each identified ingredient, check against this COMPREHENSIVE list of food allergens and sensitivities:
-        
-        1. Major allergens:
-           - Dairy/Milk products (including lactose)
-           - Eggs
-           - Peanuts
-           - Tree nuts (almonds, walnuts, cashews, etc.)
-           - Fish
-           - Shellfish (shrimp, crab, lobster, etc.)
-           - Wheat/Gluten
-           - Soy
-        
-        2. Additional common allergens:
-           - Sesame
-           - Mustard
-           - Celery
-           - Lupin
-           - Sulfites
-        
-        3. Other potential allergens:
-           - Legumes (beans, lentils, chickpeas, etc.)
-           - Corn
-           - Nightshades (tomatoes, peppers, eggplant, potatoes)
-           - Specific fruits (berries, citrus, etc.)
-           - Specific spices
-           - Food additives and preservatives
-           - Garlic/Onions
-        
-        Also determine dietary categories:
-        - Vegetarian
-        - Vegan
-        - Gluten-free
-        - Dairy-free
-        - Keto-friendly
-        - Paleo-friendly
-        - Low-FODMAP
-        - Halal
-        - Kosher
-        
-        Format your response as a JSON object with the following structure:
-        {{
-            "allergens": ["Allergen1", "Allergen2", ...],
-            "potential_allergens": ["PotentialAllergen1", "PotentialAllergen2", ...],
-            "dietary_tags": ["Tag1", "Tag2", ...],
-            "disclaimer": "Standard disclaimer about AI-generated allergen information"
-        }}
-        """
+        """, static_text=DIETARY_CHECKLIST)
         
         message_list = [{
             "role": "user",
             "content": [
+                {
+                    "text": DIETARY_CHECKLIST
+                },
+                CACHE_POINT,
                 {
                     "text": prompt_text
                 }
@@ -105,16 +125,10 @@ class DietaryDetectiveAgent:
             "inferenceConfig": inf_params
         }
         
-        # Call the Bedrock API
-        response = self.bedrock_client.invoke_model(
-            modelId="us.amazon.nova-pro-v1:0",
-            body=json.dumps(request_body)
-        )
-        
-        # Parse the response
-        response_body = json.loads(response['body'].read())
-        result_text = response_body["output"]["message"]["content"][0]["text"]
-        
+        return request_body
+    
+    def parse_response(self, result_text):
+        """Parse a dietary analysis reply, falling back to an empty analysis"""
         # Extract JSON from the response
         try:
             # Find JSON content between triple backticks if present
@@ -140,8 +154,10 @@ class DietaryDetectiveAgent:
             return parsed_result
         except Exception as e:
             print(f"Error parsing Dietary Detective response: {str(e)}")
-            # Return a fallback structure
+            # Return a fallback structure, marked so that its empty lists are
+            # never read as free of allergens
             return {
+                "parsed": False,
                 "allergens": [],
                 "potential_allergens": [],
                 "dietary_tags": [],
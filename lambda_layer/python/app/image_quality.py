@@ -0,0 +1,93 @@
+import io
+import threading
+import numpy as np
+from PIL import Image
+from app import config
+
+# Blur is measured at a fixed size so the threshold doesn't depend on how
+# large the upload is
+ANALYSIS_SIDE = 512
+
+MESSAGES = {
+    "too_small": "The photo is too small ({width}x{height}). Please upload one at least {min_side}px on each side.",
+    "blurry": "The photo looks blurry. Please upload a sharper photo of the dish.",
+    "too_dark": "The photo is too dark. Please retake it with more light.",
+    "overexposed": "The photo is overexposed. Please retake it with less direct light or glare.",
+    "unreadable": "The photo could not be read. Please upload a JPEG, PNG or WebP image.",
+}
+
+_stats = {"checked": 0, "passed": 0, "rejected": 0, "warned": 0}
+_problem_counts = {problem: 0 for problem in MESSAGES}
+_lock = threading.Lock()
+
+def measure(image_bytes):
+    """Size, sharpness (variance of the Laplacian) and exposure of a photo"""
+    image = Image.open(io.BytesIO(image_bytes))
+    width, height = image.size
+    # JPEGs decode straight at a fraction of their size, which is all the
+    # blur and exposure measures need
+    image.draft("L", (ANALYSIS_SIDE, ANALYSIS_SIDE))
+    image = image.convert("L")
+    image.thumbnail((ANALYSIS_SIDE, ANALYSIS_SIDE))
+    pixels = np.asarray(image, dtype=np.float32)
+
+    laplacian = (pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:]
+                 - 4 * pixels[1:-1, 1:-1])
+    histogram = np.bincount(pixels.astype(np.uint8).ravel(), minlength=256) / pixels.size
+    return {
+        "width": width,
+        "height": height,
+        "sharpness": round(float(laplacian.var()), 1),
+        "brightness": round(float(np.dot(histogram, np.arange(256))), 1),
+        "dark_share": round(float(histogram[:config.QUALITY_CLIP_LEVEL].sum()), 3),
+        "bright_share": round(float(histogram[256 - config.QUALITY_CLIP_LEVEL:].sum()), 3),
+    }
+
+def problems_of(metrics):
+    """Names of the quality problems the metrics show, see MESSAGES"""
+    problems = []
+    if min(metrics["width"], metrics["height"]) < config.QUALITY_MIN_SIDE:
+        problems.append("too_small")
+    if metrics["brightness"] < config.QUALITY_MIN_BRIGHTNESS or metrics["dark_share"] > config.QUALITY_MAX_CLIPPED:
+        problems.append("too_dark")
+    elif metrics["brightness"] > config.QUALITY_MAX_BRIGHTNESS or metrics["bright_share"] > config.QUALITY_MAX_CLIPPED:
+        problems.append("overexposed")
+    elif metrics["sharpness"] < config.QUALITY_MIN_SHARPNESS:
+        # Only judged on a usable exposure: a dark photo's low contrast reads as blur
+        problems.append("blurry")
+    return problems
+
+def check_image(image_bytes):
+    """Check a photo before any Bedrock call.
+
+    Returns {"passed", "problems", "messages", "metrics"}. In "warn" mode
+    (QUALITY_GATE_MODE) a photo with problems still passes and the messages
+    are warnings. A photo Pillow can't read has the "unreadable" problem and
+    no metrics.
+    """
+    try:
+        metrics = measure(image_bytes)
+        problems = problems_of(metrics)
+    except Exception:
+        metrics = None
+        problems = ["unreadable"]
+
+    passed = not problems or config.QUALITY_GATE_MODE == "warn"
+    with _lock:
+        _stats["checked"] += 1
+        _stats["passed" if not problems else "warned" if passed else "rejected"] += 1
+        for problem in problems:
+            _problem_counts[problem] += 1
+    return {
+        "passed": passed,
+        "problems": problems,
+        "messages": [MESSAGES[problem].format(min_side=config.QUALITY_MIN_SIDE, **(metrics or {})) for problem in problems],
+        "metrics": metrics
+    }
+
+def stats():
+    """Checked/passed/rejected/warned counts and how often each problem was found"""
+    with _lock:
+        stats = dict(_stats, problems=dict(_problem_counts))
+    stats["rejection_rate"] = round(stats["rejected"] / stats["checked"], 3) if stats["checked"] else 0.0
+    return stats
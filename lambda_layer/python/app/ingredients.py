@@ -0,0 +1,121 @@
+import re
+import threading
+from functools import lru_cache
+
+# Rewrites applied in order to the lowercased item text. Varieties and cuts
+# only go when the ingredient they qualify follows, so "cherry" alone stays
+# a cherry while "cherry tomatoes" becomes tomatoes
+RULES = [(re.compile(pattern), replacement) for pattern, replacement in [
+    (r"\([^)]*\)", " "),
+    (r"[^a-z\s]", " "),
+    (r"^\s*(a|an|some|few|several|one|two|three|half)\s+", " "),
+    (r"\b(slice|piece|chunk|wedge|strip|cube|ring|sprig|floret|leaf|leave|bit|sheet|dollop|drizzle|pinch|handful)s?\s+of\b", " "),
+    (r"\b(roma|cherry|grape|heirloom|plum|beefsteak|vine ripened)\s+(?=tomato)", " "),
+    (r"\b(russet|yukon gold|red|new|baby)\s+(?=potato)", " "),
+    (r"\b(baby|romaine|iceberg|butter|green leaf)\s+(?=lettuce)", " "),
+    (r"\b(extra virgin|virgin|light)\s+(?=olive oil)", " "),
+    (r"\b(red|green|yellow|orange)\s+(?=bell pepper)", " "),
+    (r"\b(black|green|kalamata)\s+(?=olive)", " "),
+    (r"\bwhite\s+(?=rice)", " "),
+    (r"\b(ground|minced|lean)\s+(?=beef|pork|lamb|turkey|chicken)", " "),
+    (r"\b(chicken|beef|pork|lamb|turkey)\s+(breast|thigh|fillet|filet|patty|patties|cutlet|tender|tenders)\b", r"\1"),
+]]
+
+# Preparation, state and size words that say nothing about what the ingredient is
+DESCRIPTORS = {
+    "fresh", "raw", "cooked", "frozen", "dried", "chopped", "diced", "sliced", "minced", "grated", "shredded",
+    "crushed", "crumbled", "mashed", "pureed", "cubed", "halved", "quartered", "julienned", "toasted",
+    "grilled", "roasted", "fried", "deep", "pan", "seared", "sauteed", "steamed", "baked", "boiled", "poached",
+    "caramelized", "charred", "melted", "crispy", "crunchy", "whole", "small", "large", "baby", "thin", "thick",
+    "thinly", "finely", "slice", "slices", "piece", "pieces", "chunk", "chunks", "wedge", "wedges", "cube", "cubes",
+    "sprig", "sprigs", "floret", "florets", "leaf", "ring", "strip", "clove", "garnish", "topping", "crumb",
+    "crumbs", "shaving", "shavings", "some", "of",
+}
+
+# Words that look plural but aren't, and plurals the suffix rules get wrong
+INVARIANT = {"hummus", "asparagus", "couscous", "citrus", "molasses", "swiss", "bass", "grits", "octopus", "schnapps"}
+IRREGULAR = {
+    "leaves": "leaf", "loaves": "loaf", "halves": "half", "cookies": "cookie", "pies": "pie",
+    "brownies": "brownie", "chives": "chive", "olives": "olive", "cloves": "clove",
+}
+
+# Lemmatized phrase -> canonical ingredient id. Only other names for the same
+# ingredient: a "patty" may not be beef and a "sesame bun" is not just a bun
+SYNONYMS = {
+    "scallion": "green_onion", "spring onion": "green_onion", "green onion": "green_onion",
+    "coriander": "cilantro", "coriander leaf": "cilantro",
+    "garbanzo": "chickpea", "garbanzo bean": "chickpea", "chick pea": "chickpea",
+    "prawn": "shrimp", "king prawn": "shrimp",
+    "aubergine": "eggplant", "courgette": "zucchini", "rocket": "arugula",
+    "capsicum": "bell_pepper", "sweet pepper": "bell_pepper", "red pepper": "bell_pepper",
+    "green pepper": "bell_pepper", "yellow pepper": "bell_pepper",
+    "cheddar cheese": "cheddar", "mozzarella cheese": "mozzarella", "parmesan cheese": "parmesan",
+    "parmigiano": "parmesan", "parmigiano reggiano": "parmesan", "feta cheese": "feta",
+    "mayo": "mayonnaise", "tomato ketchup": "ketchup", "catsup": "ketchup",
+    "hamburger bun": "bun", "burger bun": "bun",
+    "french fry": "fries", "fry": "fries",
+    "mixed green": "salad_greens", "green": "salad_greens", "salad green": "salad_greens",
+    "spring mix": "salad_greens", "mesclun": "salad_greens",
+    "egg yolk": "egg", "egg white": "egg", "soft egg": "egg",
+    "yoghurt": "yogurt", "greek yogurt": "yogurt",
+    "heavy cream": "cream", "whipped cream": "cream", "sesame seed": "sesame", "bay": "bay_leaf",
+}
+
+NORMALIZE_CACHE_SIZE = 65536
+
+_stats = {"items": 0, "shared_ids": 0}
+_lock = threading.Lock()
+
+def lemmatize(word):
+    """Singular form of an ingredient word"""
+    if word in INVARIANT or len(word) <= 3:
+        return word
+    if word in IRREGULAR:
+        return IRREGULAR[word]
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("oes") or word.endswith(("ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def canonical_id(name):
+    """Canonical ingredient id of a free-text item, e.g. "Roma tomato slices" -> "tomato" """
+    text = name.lower()
+    for pattern, replacement in RULES:
+        text = pattern.sub(replacement, text)
+    words = [lemmatize(word) for word in text.split()]
+    kept = [word for word in words if word not in DESCRIPTORS]
+    # A name made only of descriptors ("fried") is still something
+    phrase = " ".join(kept or words)
+    if not phrase:
+        return ""
+    return SYNONYMS.get(phrase, phrase.replace(" ", "_"))
+
+def normalize_items(chef_analysis):
+    """Give each analysis item its canonical "ingredient_id". Items keep their
+    own wording and none is dropped, even when two share an id, as the
+    Dietary Detective reads them all. Works in place and returns the analysis."""
+    items = chef_analysis.get("items", [])
+    shared = 0
+    seen = set()
+    for item in items:
+        ingredient_id = canonical_id(item.get("item", "")) if item.get("item") else ""
+        if not ingredient_id:
+            continue
+        item["ingredient_id"] = ingredient_id
+        shared += ingredient_id in seen
+        seen.add(ingredient_id)
+    with _lock:
+        _stats["items"] += len(items)
+        _stats["shared_ids"] += shared
+    return chef_analysis
+
+def stats():
+    info = canonical_id.cache_info()
+    with _lock:
+        stats = dict(_stats)
+    stats.update(distinct_names=info.currsize, memo_hits=info.hits, memo_misses=info.misses)
+    return stats
@@ -0,0 +1,264 @@
+import io
+import os
+import csv
+import html
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app import config
+from app.storage import StorageService
+from app.results_store import dietary_checked
+
+FORMATS = {".csv": "csv", ".md": "markdown", ".html": "html"}
+CSV_COLUMNS = ["restaurant", "dish_id", "name", "description", "allergens", "potential_allergens",
+               "dietary_tags", "allergen_notice", "thumbnail"]
+UNAVAILABLE = "Allergen information unavailable"
+
+HTML_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Menu</title>
+<style>
+body { font-family: Georgia, serif; max-width: 52rem; margin: 2rem auto; color: #222; }
+article { display: flex; gap: 1rem; margin: 1.25rem 0; break-inside: avoid; }
+article img { width: 8rem; height: 8rem; object-fit: cover; border-radius: 6px; }
+.tags span { background: #e6f3e6; color: #2e7d32; padding: 2px 8px; border-radius: 12px; margin-right: 6px; font-size: 0.85em; }
+.allergens, .unavailable, .disclaimer { font-size: 0.85em; color: #8a3b12; }
+</style>
+</head>
+<body>
+"""
+
+_stats = {"exports": 0, "dishes": 0, "export_seconds": 0.0, "thumbnails_written": 0, "thumbnails_reused": 0,
+          "thumbnails_failed": 0}
+_lock = threading.Lock()
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+def _dish(restaurant, result):
+    """The fields every format shows of a stored result"""
+    dietary_analysis = result.get("dietary_analysis", {})
+    return {
+        "restaurant": restaurant,
+        "dish_id": result["dish_id"],
+        "name": result.get("refined_name") or result.get("input_name", ""),
+        "description": result.get("generated_description", ""),
+        "allergens": dietary_analysis.get("allergens", []),
+        "potential_allergens": dietary_analysis.get("potential_allergens", []),
+        "dietary_tags": dietary_analysis.get("dietary_tags", []),
+        "disclaimer": dietary_analysis.get("disclaimer", ""),
+        # Skipped or unparseable: the empty lists say nothing about the dish
+        "unavailable": not dietary_checked(result),
+    }
+
+class ThumbnailWriter:
+    """Writes dish thumbnails on a thread pool while the export is rendered.
+
+    ``submit`` returns the thumbnail's path relative to the export at once, so
+    rendering never waits on an image; at most ``workers`` * 4 images are in
+    flight, which keeps memory flat on large menus. Thumbnails already on
+    disk from an earlier export are reused.
+    """
+
+    def __init__(self, directory, link_prefix="thumbnails", size=None, workers=None, storage=None):
+        self.directory = directory
+        self.link_prefix = link_prefix
+        self.size = size or config.EXPORT_THUMBNAIL_SIZE
+        self.storage = storage or StorageService()
+        workers = workers or config.EXPORT_THUMBNAIL_WORKERS
+        os.makedirs(directory, exist_ok=True)
+        self._slots = threading.BoundedSemaphore(workers * 4)
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="menu-thumbnail")
+
+    def submit(self, dish_id, image_uri):
+        """Queue the thumbnail of a dish's photo; return its link"""
+        name = f"{dish_id}.jpg"
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            _count("thumbnails_reused")
+        else:
+            self._slots.acquire()
+            future = self._executor.submit(self._write, image_uri, path)
+            future.add_done_callback(lambda _: self._slots.release())
+        return f"{self.link_prefix}/{name}"
+
+    def _write(self, image_uri, path):
+        try:
+            from PIL import Image
+            with self.storage.open_image(image_uri) as buffer:
+                image = Image.open(io.BytesIO(buffer))
+                # JPEGs decode straight at a fraction of their size
+                image.draft("RGB", (self.size, self.size))
+                image = image.convert("RGB")
+            image.thumbnail((self.size, self.size))
+            tmp_path = f"{path}.tmp"
+            image.save(tmp_path, format="JPEG", quality=config.EXPORT_THUMBNAIL_QUALITY)
+            os.replace(tmp_path, path)
+            _count("thumbnails_written")
+        except Exception as e:
+            print(f"Error writing thumbnail {path}: {str(e)}")
+            _count("thumbnails_failed")
+
+    def close(self):
+        """Wait for every queued thumbnail"""
+        self._executor.shutdown(wait=True)
+
+def _csv(dishes):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for dish in dishes:
+        writer.writerow([dish["restaurant"], dish["dish_id"], dish["name"], dish["description"],
+                         "; ".join(dish["allergens"]), "; ".join(dish["potential_allergens"]),
+                         "; ".join(dish["dietary_tags"]), UNAVAILABLE if dish["unavailable"] else "",
+                         dish.get("thumbnail", "")])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def _markdown(dishes):
+    yield "# Menu\n"
+    restaurant, disclaimers = None, {}
+    for dish in dishes:
+        if dish["restaurant"] != restaurant:
+            restaurant = dish["restaurant"]
+            yield f"\n## {restaurant or 'Other dishes'}\n"
+        parts = [f"\n### {dish['name']}\n"]
+        if dish.get("thumbnail"):
+            parts.append(f"\n![{dish['name']}]({dish['thumbnail']})\n")
+        if dish["description"]:
+            parts.append(f"\n{dish['description']}\n")
+        if dish["dietary_tags"]:
+            parts.append(f"\n*{' · '.join(dish['dietary_tags'])}*\n")
+        if dish["unavailable"]:
+            parts.append(f"\n**{UNAVAILABLE}**\n")
+        elif dish["allergens"] or dish["potential_allergens"]:
+            parts.append(f"\n**Contains:** {', '.join(dish['allergens']) or 'none identified'}")
+            if dish["potential_allergens"]:
+                parts.append(f". **May contain:** {', '.join(dish['potential_allergens'])}")
+            parts.append("\n")
+        if dish["disclaimer"]:
+            disclaimers[dish["disclaimer"]] = True
+        yield "".join(parts)
+    if disclaimers:
+        yield "\n---\n" + "".join(f"\n*{disclaimer}*\n" for disclaimer in disclaimers)
+
+def _html(dishes):
+    yield HTML_HEAD + "<h1>Menu</h1>\n"
+    restaurant, disclaimers = None, {}
+    for dish in dishes:
+        if dish["restaurant"] != restaurant:
+            yield f"{'</section>' if restaurant is not None else ''}\n<section>\n<h2>{html.escape(dish['restaurant'] or 'Other dishes')}</h2>\n"
+            restaurant = dish["restaurant"]
+        parts = ["<article>"]
+        if dish.get("thumbnail"):
+            parts.append(f'<img src="{html.escape(dish["thumbnail"])}" alt="{html.escape(dish["name"])}" loading="lazy">')
+        parts.append(f"<div><h3>{html.escape(dish['name'])}</h3>")
+        if dish["description"]:
+            parts.append(f"<p>{html.escape(dish['description'])}</p>")
+        if dish["dietary_tags"]:
+            parts.append('<p class="tags">' + "".join(f"<span>{html.escape(tag)}</span>" for tag in dish["dietary_tags"]) + "</p>")
+        if dish["unavailable"]:
+            parts.append(f'<p class="unavailable">{UNAVAILABLE}</p>')
+        elif dish["allergens"] or dish["potential_allergens"]:
+            allergens = f"Contains: {html.escape(', '.join(dish['allergens']) or 'none identified')}"
+            if dish["potential_allergens"]:
+                allergens += f". May contain: {html.escape(', '.join(dish['potential_allergens']))}"
+            parts.append(f'<p class="allergens">{allergens}</p>')
+        parts.append("</div></article>\n")
+        if dish["disclaimer"]:
+            disclaimers[dish["disclaimer"]] = True
+        yield "".join(parts)
+    if restaurant is not None:
+        yield "</section>\n"
+    for disclaimer in disclaimers:
+        yield f'<p class="disclaimer">{html.escape(disclaimer)}</p>\n'
+    yield "</body>\n</html>\n"
+
+RENDERERS = {"csv": _csv, "markdown": _markdown, "html": _html}
+
+def render(results, fmt, thumbnails=None, chunk_size=None):
+    """Render (restaurant, result) pairs as ``fmt`` ("csv", "markdown" or
+    "html"), yielding text chunks of about ``chunk_size`` characters.
+
+    Results are consumed one at a time, so a generator such as
+    ResultsStore.iter_results renders any number of dishes in constant
+    memory. With a ThumbnailWriter, dishes with a stored photo link to its
+    thumbnail.
+    """
+    chunk_size = chunk_size or config.EXPORT_CHUNK_SIZE
+
+    def dishes():
+        for restaurant, result in results:
+            dish = _dish(restaurant, result)
+            if thumbnails is not None and result.get("image_uri"):
+                dish["thumbnail"] = thumbnails.submit(dish["dish_id"], result["image_uri"])
+            yield dish
+
+    pending, size = [], 0
+    for text in RENDERERS[fmt](dishes()):
+        pending.append(text)
+        size += len(text)
+        if size >= chunk_size:
+            yield "".join(pending)
+            pending, size = [], 0
+    if pending:
+        yield "".join(pending)
+
+def stream_menu(fmt, store=None, restaurant=None):
+    """The stored menu as text chunks, e.g. for a streamed HTTP response (no thumbnails)"""
+    from app import results_store
+    store = store or results_store.get_store()
+    yield from render(store.iter_results(restaurant, page_size=config.EXPORT_PAGE_SIZE), fmt)
+
+def export_menu(path, fmt=None, store=None, restaurant=None, thumbnails=True):
+    """Write the stored menu, or one restaurant's, to ``path``; return what was written.
+
+    The format follows the file extension unless ``fmt`` is given. With
+    ``thumbnails``, dishes with a stored photo link to a thumbnail written
+    alongside in a "thumbnails" directory.
+    """
+    from app import results_store
+    fmt = fmt or FORMATS[os.path.splitext(path)[1].lower()]
+    store = store or results_store.get_store()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    writer = ThumbnailWriter(os.path.join(directory, "thumbnails")) if thumbnails else None
+    dishes = 0
+
+    def results():
+        nonlocal dishes
+        for item in store.iter_results(restaurant, page_size=config.EXPORT_PAGE_SIZE):
+            dishes += 1
+            yield item
+
+    started = time.perf_counter()
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            for chunk in render(results(), fmt, thumbnails=writer):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        if writer is not None:
+            writer.close()
+    seconds = time.perf_counter() - started
+    with _lock:
+        _stats["exports"] += 1
+        _stats["dishes"] += dishes
+        _stats["export_seconds"] += seconds
+    return {"path": path, "format": fmt, "dishes": dishes, "seconds": round(seconds, 3)}
+
+def stats():
+    with _lock:
+        stats = dict(_stats)
+    export_seconds = stats.pop("export_seconds")
+    stats["dishes_per_second"] = round(stats["dishes"] / export_seconds) if export_seconds else 0
+    return stats
@@ -0,0 +1,239 @@
+import time
+import threading
+import numpy as np
+from app import config
+from app.results_store import key, allergen_keys, rows_of
+
+WORD_BITS = 64
+
+def _rows_of_words(words, limit=None):
+    """Row numbers of the set bits of a bitset, the first ``limit`` of them"""
+    nonzero = np.flatnonzero(words)
+    if limit is not None:
+        # Every non-zero word holds at least one row
+        nonzero = nonzero[:limit]
+    bits = np.unpackbits(words[nonzero].view(np.uint8), bitorder="little").reshape(-1, WORD_BITS)
+    word_rows, bit_rows = np.nonzero(bits)
+    rows = nonzero[word_rows] * WORD_BITS + bit_rows
+    return rows[:limit] if limit is not None else rows
+
+class MenuIndex:
+    """In-memory allergen and dietary tag bitsets over stored dish results.
+
+    Every dish is a row. Each dietary tag, allergen and potential allergen
+    has a bitset (an array of uint64 words) with one bit per row, so a
+    filter is a few vectorized AND/ANDNOT passes over 1/64th of a byte per
+    dish rather than a query per page view. A restaurant's filter only
+    gathers the bits of its own rows. Dishes are added as their results
+    arrive and bitsets grow by doubling; a dish already indexed is skipped.
+    """
+
+    def __init__(self, capacity=1024):
+        self._capacity = max(capacity, WORD_BITS)
+        self._count = 0
+        self._ids = np.empty(self._capacity, dtype=object)
+        self._row_of = {}
+        self._checked = self._bitset()
+        self._tags = {}
+        self._allergens = {}
+        self._potential = {}
+        self._restaurants = {}
+        self._restaurant_arrays = {}
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "query_seconds": 0.0}
+
+    def _bitset(self):
+        return np.zeros(self._capacity // WORD_BITS, dtype=np.uint64)
+
+    def _bitsets(self):
+        yield self._checked
+        for bitsets in (self._tags, self._allergens, self._potential):
+            yield from bitsets.values()
+
+    def _reserve(self, count):
+        if count <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < count:
+            capacity *= 2
+        words = capacity // WORD_BITS
+
+        def grown(bitset):
+            bigger = np.zeros(words, dtype=np.uint64)
+            bigger[:len(bitset)] = bitset
+            return bigger
+
+        self._checked = grown(self._checked)
+        for bitsets in (self._tags, self._allergens, self._potential):
+            for name in bitsets:
+                bitsets[name] = grown(bitsets[name])
+        ids = np.empty(capacity, dtype=object)
+        ids[:self._count] = self._ids[:self._count]
+        self._ids = ids
+        self._capacity = capacity
+
+    @staticmethod
+    def _set_rows(bitset, rows):
+        rows = np.asarray(rows, dtype=np.uint64)
+        # .at so several rows landing in one word all get their bit
+        np.bitwise_or.at(bitset, rows >> np.uint64(6), np.left_shift(np.uint64(1), rows & np.uint64(63)))
+
+    def _set(self, bitsets, name, rows):
+        if name not in bitsets:
+            bitsets[name] = self._bitset()
+        self._set_rows(bitsets[name], rows)
+
+    def __len__(self):
+        return self._count
+
+    def add_rows(self, dishes, allergens, tags):
+        """Index (dish_id, restaurant_key, dietary_checked) dishes with their
+        (allergen, dish_id, potential) and (tag, dish_id) rows, as stored by
+        ResultsStore, skipping dishes already indexed"""
+        with self._lock:
+            self._reserve(self._count + len(dishes))
+            row_of = {}
+            checked = []
+            for dish_id, restaurant_key, dietary_checked in dishes:
+                # Rows read from the store may include dishes added as they arrived
+                if dish_id in self._row_of or dish_id in row_of:
+                    continue
+                row = self._count
+                self._ids[row] = dish_id
+                row_of[dish_id] = row
+                self._restaurants.setdefault(restaurant_key, []).append(row)
+                self._restaurant_arrays.pop(restaurant_key, None)
+                if dietary_checked:
+                    checked.append(row)
+                self._count += 1
+            self._row_of.update(row_of)
+            if checked:
+                self._set_rows(self._checked, checked)
+
+            by_name = {}
+            for allergen, dish_id, potential in allergens:
+                if dish_id in row_of:
+                    by_name.setdefault((potential, allergen), []).append(row_of[dish_id])
+            for (potential, allergen), rows in by_name.items():
+                self._set(self._potential if potential else self._allergens, allergen, rows)
+            by_name = {}
+            for tag, dish_id in tags:
+                if dish_id in row_of:
+                    by_name.setdefault(tag, []).append(row_of[dish_id])
+            for tag, rows in by_name.items():
+                self._set(self._tags, tag, rows)
+
+    def add_stored(self, rows):
+        """Index rows_of rows, such as those ResultsStore.sync merges in"""
+        dishes, allergens, tags = [], [], []
+        for dish, allergen_rows, tag_rows in rows:
+            # (dish_id, restaurant, restaurant_key, name, name_key, processed_at, dietary_checked, result)
+            dishes.append((dish[0], dish[2], dish[6]))
+            allergens.extend(allergen_rows)
+            tags.extend(tag_rows)
+        self.add_rows(dishes, allergens, tags)
+
+    def add_many(self, results, restaurant=""):
+        """Index process_dish results as they arrive"""
+        self.add_stored([rows_of(result, restaurant) for result in results
+                         if "dish_id" in result and "error" not in result])
+
+    def add(self, result, restaurant=""):
+        self.add_many([result], restaurant)
+
+    def _restaurant_rows(self, restaurant_key):
+        rows = self._restaurant_arrays.get(restaurant_key)
+        if rows is None:
+            rows = np.array(self._restaurants.get(restaurant_key, []), dtype=np.int64)
+            self._restaurant_arrays[restaurant_key] = rows
+        return rows
+
+    def _rows(self, restaurant, tags, free_of, allow_potential, limit):
+        required = []
+        for tag in tags:
+            bitset = self._tags.get(key(tag))
+            if bitset is None:
+                return np.empty(0, dtype=np.int64)
+            required.append(bitset)
+        excluded = []
+        if free_of:
+            # Dishes whose dietary analysis was skipped or unparseable are never free of anything
+            required.append(self._checked)
+            # Matched as canonical allergens, as ResultsStore stores them
+            for allergen in {allergen for text in free_of for allergen in allergen_keys(text)}:
+                for bitsets in ((self._allergens,) if allow_potential else (self._allergens, self._potential)):
+                    if allergen in bitsets:
+                        excluded.append(bitsets[allergen])
+
+        if restaurant is not None:
+            # Gather only the restaurant's bits
+            rows = self._restaurant_rows(key(restaurant))
+            word_index, bit_index = rows >> 6, (rows & 63).astype(np.uint64)
+            selected = np.ones(len(rows), dtype=bool)
+            for bitset in required:
+                selected &= ((bitset[word_index] >> bit_index) & np.uint64(1)).astype(bool)
+            for bitset in excluded:
+                selected &= ~((bitset[word_index] >> bit_index) & np.uint64(1)).astype(bool)
+            rows = rows[selected]
+            return rows[:limit] if limit is not None else rows
+
+        words, tail = divmod(self._count, WORD_BITS)
+        mask = np.full(words + bool(tail), np.uint64(0xFFFFFFFFFFFFFFFF), dtype=np.uint64)
+        if tail:
+            mask[-1] = np.uint64((1 << tail) - 1)
+        for bitset in required:
+            np.bitwise_and(mask, bitset[:len(mask)], out=mask)
+        for bitset in excluded:
+            np.bitwise_and(mask, ~bitset[:len(mask)], out=mask)
+        return _rows_of_words(mask, limit)
+
+    def find(self, restaurant=None, tags=(), free_of=(), allow_potential=False, limit=None):
+        """Ids of the dishes with every tag in ``tags`` and none of the
+        allergens in ``free_of`` (see ResultsStore.find), in the order they
+        were indexed"""
+        started = time.perf_counter()
+        with self._lock:
+            dish_ids = self._ids[self._rows(restaurant, tags, free_of, allow_potential, limit)].tolist()
+            self._stats["queries"] += 1
+            self._stats["query_seconds"] += time.perf_counter() - started
+        return dish_ids
+
+    def count(self, restaurant=None, tags=(), free_of=(), allow_potential=False):
+        """Number of dishes find would return without a limit"""
+        with self._lock:
+            return len(self._rows(restaurant, tags, free_of, allow_potential, None))
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "dishes": self._count,
+                "bitsets": len(self._tags) + len(self._allergens) + len(self._potential) + 1,
+                "bitset_bytes": sum(bitset.nbytes for bitset in self._bitsets()),
+                "queries": self._stats["queries"],
+            }
+            query_seconds = self._stats["query_seconds"]
+        stats["avg_query_us"] = round(query_seconds * 1e6 / stats["queries"], 1) if stats["queries"] else 0.0
+        return stats
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index(store=None):
+    """The process-wide index, built from the results store on first use and
+    kept up to date with what its syncs merge in, or None when disabled"""
+    global _index
+    if not config.MENU_INDEX_ENABLED:
+        return None
+    with _index_lock:
+        if _index is None:
+            index = MenuIndex()
+            if store is not None:
+                # Registered first so a sync running meanwhile is not missed;
+                # dishes seen twice are skipped
+                store.on_merge(index.add_stored)
+                index.add_rows(*store.index_rows())
+            _index = index
+        return _index
+
+def stats():
+    return _index.stats() if _index is not None else {}
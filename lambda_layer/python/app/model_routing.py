@@ -0,0 +1,97 @@
+import threading
+from app import config
+
+# Nova model IDs (cross-region inference profiles), cheapest first.
+# Micro is text-only, so image stages can go no lower than Lite.
+NOVA_MICRO = "us.amazon.nova-micro-v1:0"
+NOVA_LITE = "us.amazon.nova-lite-v1:0"
+NOVA_PRO = "us.amazon.nova-pro-v1:0"
+
+# Default route per agent stage; anything not listed uses config.BEDROCK_MODEL_ID
+DEFAULT_ROUTES = {
+    "food_check": NOVA_LITE,
+    "authenticator": NOVA_MICRO,
+}
+
+class ModelRouter:
+    """Picks the model for each agent stage and escalates low-confidence answers.
+
+    A stage routed to a cheaper model is re-asked on the escalation model
+    (config.BEDROCK_MODEL_ID) when its answer fails the caller's ``accept``
+    check, e.g. it does not parse or is not a clear yes/no.
+    """
+
+    def __init__(self, routes=None, escalation_model=None, cascade=None):
+        self.routes = dict(DEFAULT_ROUTES, **config.MODEL_ROUTES) if routes is None else routes
+        self.escalation_model = escalation_model or config.BEDROCK_MODEL_ID
+        self.cascade = config.MODEL_CASCADE_ENABLED if cascade is None else cascade
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def model_for(self, agent):
+        return self.routes.get(agent, config.BEDROCK_MODEL_ID)
+
+    def should_escalate(self, model_id, accepted):
+        return self.cascade and not accepted and model_id != self.escalation_model
+
+    def _route_stats(self, agent, model_id):
+        return self._stats.setdefault((agent, model_id), {
+            "calls": 0,
+            "total_latency": 0.0,
+            "max_latency": 0.0,
+            "escalations": 0,
+            "input_tokens": 0,
+            "cache_read_tokens": 0,
+            "cache_write_tokens": 0,
+            "streamed_calls": 0,
+            "total_first_token_latency": 0.0
+        })
+
+    def record_call(self, agent, model_id, latency, usage=None, first_token_latency=None):
+        """Record one call on a route (agent, model): latency, token usage
+        including prompt-cache reads/writes, and time to first token for
+        streamed calls"""
+        usage = usage or {}
+        with self._lock:
+            stats = self._route_stats(agent, model_id)
+            stats["calls"] += 1
+            stats["total_latency"] += latency
+            stats["max_latency"] = max(stats["max_latency"], latency)
+            stats["input_tokens"] += usage.get("inputTokens", 0)
+            stats["cache_read_tokens"] += usage.get("cacheReadInputTokenCount", 0)
+            stats["cache_write_tokens"] += usage.get("cacheWriteInputTokenCount", 0)
+            if first_token_latency is not None:
+                stats["streamed_calls"] += 1
+                stats["total_first_token_latency"] += first_token_latency
+
+    def record_escalation(self, agent, model_id):
+        """Record that an answer on this route had to be re-asked"""
+        with self._lock:
+            self._route_stats(agent, model_id)["escalations"] += 1
+
+    def stats(self):
+        """Per-route call counts, latency, escalation rate and prompt-cache usage"""
+        with self._lock:
+            report = {}
+            for (agent, model_id), stats in self._stats.items():
+                calls = stats["calls"]
+                # Bedrock reports cached tokens separately from inputTokens
+                prompt_tokens = stats["input_tokens"] + stats["cache_read_tokens"] + stats["cache_write_tokens"]
+                report[f"{agent}:{model_id}"] = {
+                    "calls": calls,
+                    "avg_latency_ms": round(1000 * stats["total_latency"] / calls, 1),
+                    "max_latency_ms": round(1000 * stats["max_latency"], 1),
+                    "escalations": stats["escalations"],
+                    "escalation_rate": round(stats["escalations"] / calls, 3),
+                    "input_tokens": stats["input_tokens"],
+                    "cache_read_tokens": stats["cache_read_tokens"],
+                    "cache_write_tokens": stats["cache_write_tokens"],
+                    "cache_read_share": round(stats["cache_read_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0
+                }
+                if stats["streamed_calls"]:
+                    report[f"{agent}:{model_id}"]["avg_first_token_ms"] = round(
+                        1000 * stats["total_first_token_latency"] / stats["streamed_calls"], 1
+                    )
+            return report
+
+router = ModelRouter()
@@ -0,0 +1,127 @@
+import io
+import textwrap
+from PIL import Image
+from app import config
+from app.prompt_cache import CACHE_POINT
+from app.bedrock_utils import get_bedrock_client, build_image_block, invoke_nova, extract_json
+
+# Boxes are requested on Nova's 0-1000 grid, independent of image size
+BOX_SCALE = 1000
+
+class PlateSplitterAgent:
+    """Finds the separate dishes on a platter or tasting-menu photo"""
+
+    def __init__(self, bedrock_client=None):
+        self.bedrock_client = bedrock_client or get_bedrock_client()
+
+    def detect_dishes(self, image_bytes=None, image_uri=None):
+        """Detect dish regions; return a list of {"name", "box"} with box as [x1, y1, x2, y2] on a 0-1000 grid"""
+        image_block = build_image_block(image_bytes, image_uri)
+
+        # Define system prompt
+        system_list = [{
+            "text": "You are the Plate Splitter, an expert at locating individual dishes in food photos. "
+                    "Your task is to find every separate dish on a platter, table or tasting menu and give its bounding box."
+        }, CACHE_POINT]
+
+        # Define user message: the instructions are static and cached, the image follows
+        prompt_text = textwrap.dedent(f"""
+        Find each separate dish in the image below. A dish is one plate, bowl or portion that would be its own menu item;
+        sides and garnishes on the same plate belong to that dish.
+
+        Format your response as a JSON object with the following structure:
+        {{
+            "dishes": [
+                {{"name": "short dish name", "box": [x_min, y_min, x_max, y_max]}},
+                ...
+            ]
+        }}
+
+        Box coordinates are integers from 0 to {BOX_SCALE}, relative to the image width and height.
+        List at most {config.PLATE_MAX_DISHES} dishes, largest first.
+        """).strip()
+
+        message_list = [{
+            "role": "user",
+            "content": [
+                {
+                    "text": prompt_text
+                },
+                CACHE_POINT,
+                image_block
+            ]
+        }]
+
+        # Configure inference parameters
+        inf_params = {
+            "maxTokens": 400,
+            "temperature": 0.0,
+            "topP": 1.0,
+            "topK": 1
+        }
+
+        # Create the request payload
+        request_body = {
+            "schemaVersion": "messages-v1",
+            "messages": message_list,
+            "system": system_list,
+            "inferenceConfig": inf_params
+        }
+
+        try:
+            # Call the Bedrock API
+            result_text = invoke_nova(self.bedrock_client, request_body, "plate_splitter")
+            dishes = extract_json(result_text).get("dishes", [])
+        except Exception as e:
+            print(f"Error detecting dishes: {str(e)}")
+            return []
+
+        regions = []
+        for dish in dishes[:config.PLATE_MAX_DISHES]:
+            box = _clamp_box(dish.get("box"))
+            if box:
+                regions.append({"name": dish.get("name", ""), "box": box})
+        return regions
+
+def _clamp_box(box):
+    """Validate a model-supplied box; return it clamped to the grid, or None"""
+    try:
+        x1, y1, x2, y2 = [min(max(int(v), 0), BOX_SCALE) for v in box]
+    except (TypeError, ValueError):
+        return None
+    if x2 <= x1 or y2 <= y1:
+        return None
+    # Ignore slivers: anything under 1% of the image is not a dish
+    if (x2 - x1) * (y2 - y1) < 0.01 * BOX_SCALE * BOX_SCALE:
+        return None
+    return [x1, y1, x2, y2]
+
+def crop_dishes(image_bytes, regions, padding=None, max_side=None):
+    """Crop each region out of the image; return one JPEG per region.
+
+    Boxes are padded a little so rims and garnishes are kept, and crops are
+    downscaled to ``max_side`` so each is smaller than the original upload.
+    """
+    padding = config.PLATE_CROP_PADDING if padding is None else padding
+    max_side = config.PLATE_CROP_MAX_SIDE if max_side is None else max_side
+
+    image = Image.open(io.BytesIO(image_bytes))
+    image = image.convert("RGB")
+    width, height = image.size
+
+    crops = []
+    for region in regions:
+        x1, y1, x2, y2 = region["box"]
+        pad_x = padding * (x2 - x1)
+        pad_y = padding * (y2 - y1)
+        left = max(int((x1 - pad_x) * width / BOX_SCALE), 0)
+        top = max(int((y1 - pad_y) * height / BOX_SCALE), 0)
+        right = min(int((x2 + pad_x) * width / BOX_SCALE + 0.5), width)
+        bottom = min(int((y2 + pad_y) * height / BOX_SCALE + 0.5), height)
+
+        crop = image.crop((left, top, right, bottom))
+        crop.thumbnail((max_side, max_side))
+        buffer = io.BytesIO()
+        crop.save(buffer, format="JPEG", quality=config.PLATE_CROP_QUALITY)
+        crops.append(buffer.getvalue())
+    return crops
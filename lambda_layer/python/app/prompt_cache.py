@@ -0,0 +1,41 @@
+from app import config
+from app.model_routing import NOVA_MICRO, NOVA_LITE, NOVA_PRO
+
+# Marks the end of a static prompt prefix that Bedrock may cache
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+# Models that accept cachePoint blocks in system and messages. Bedrock only
+# caches a prefix once it reaches the model's minimum size (~1K tokens for
+# Nova); shorter prefixes are sent normally and simply report no cache usage.
+PROMPT_CACHE_MODELS = {
+    NOVA_MICRO,
+    NOVA_LITE,
+    NOVA_PRO,
+    "us.amazon.nova-premier-v1:0",
+}
+
+def supports_prompt_cache(model_id):
+    return config.PROMPT_CACHE_ENABLED and model_id in PROMPT_CACHE_MODELS
+
+def _without_cache_points(blocks):
+    return [block for block in blocks if "cachePoint" not in block]
+
+def strip_cache_points(request_body):
+    """Return a copy of the request with every cache checkpoint removed"""
+    request_body = dict(request_body)
+    request_body["system"] = _without_cache_points(request_body.get("system", []))
+    request_body["messages"] = [
+        dict(message, content=_without_cache_points(message["content"]))
+        for message in request_body.get("messages", [])
+    ]
+    return request_body
+
+def for_model(request_body, model_id):
+    """Return the request as it should be sent to model_id.
+
+    Agents always mark their static prefixes with CACHE_POINT; models without
+    prompt caching get a copy with the checkpoints removed.
+    """
+    if supports_prompt_cache(model_id):
+        return request_body
+    return strip_cache_points(request_body)
@@ -0,0 +1,148 @@
+import re
+import json
+import math
+import textwrap
+from app import config
+
+# Fields of the Visionary Chef analysis each downstream agent actually reads.
+# dish_name and spice_level are passed to the prompts separately and is_food
+# is only used by the orchestrator, so none of them are serialized here.
+AGENT_FIELDS = {
+    "authenticator": ("items", "cooking_style"),
+    "dietary_detective": ("items", "cooking_style"),
+    "side_item_analyzer": ("items", "presentation"),
+    "culinary_wordsmith": ("items", "cooking_style", "presentation"),
+}
+
+# Allergen detection errs on the side of caution: a weak match can still be
+# an allergen, so the Dietary Detective gets every item
+AGENT_MIN_CONFIDENCE = {
+    "dietary_detective": 0.0,
+}
+
+# Agents whose items are never dropped to fit the budget; only their
+# descriptive fields go
+KEEP_ALL_ITEMS = {"dietary_detective"}
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]|\s{2,}")
+
+def estimate_tokens(text):
+    """Rough input-token estimate: ~4 characters per word piece, one per symbol or whitespace run"""
+    tokens = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        piece = match.group(0)
+        tokens += math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == "_" else 1
+    return tokens
+
+def dumps(obj):
+    """Serialize to JSON without pretty-print whitespace"""
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+def stage_input_budget(agent):
+    """Input-token budget for an agent's prompt (0 means unlimited)"""
+    return config.STAGE_INPUT_TOKEN_BUDGETS.get(agent, 0)
+
+class PromptCompactor:
+    """Serializes one workflow's Visionary Chef analysis for the downstream agents.
+
+    Each agent gets only the fields it uses, minus items below its confidence
+    threshold. Field fragments are serialized once per workflow and shared by
+    every agent that needs them.
+    """
+
+    def __init__(self, chef_analysis):
+        self.chef_analysis = chef_analysis
+        self._fragments = {}
+        self._payloads = {}
+        self.stats = {}
+
+    def _threshold(self, agent):
+        return AGENT_MIN_CONFIDENCE.get(agent, config.PROMPT_MIN_CONFIDENCE)
+
+    def _items(self, agent):
+        """Items at or above the agent's confidence threshold, most confident first"""
+        threshold = self._threshold(agent)
+        key = ("items", threshold)
+        if key not in self._fragments:
+            items = []
+            for item in self.chef_analysis.get("items", []):
+                confidence = item.get("confidence", 1.0)
+                if confidence >= threshold:
+                    items.append({"item": item.get("item", ""), "confidence": round(confidence, 2)})
+            items.sort(key=lambda i: i["confidence"], reverse=True)
+            self._fragments[key] = items
+        return self._fragments[key]
+
+    def _fragment(self, field, agent, max_items=None):
+        if field == "items":
+            items = self._items(agent)
+            if max_items is not None:
+                items = items[:max_items]
+            key = ("items_json", self._threshold(agent), len(items))
+            if key not in self._fragments:
+                self._fragments[key] = dumps(items)
+            return self._fragments[key]
+        key = (field,)
+        if key not in self._fragments:
+            self._fragments[key] = dumps(self.chef_analysis.get(field, ""))
+        return self._fragments[key]
+
+    def for_agent(self, agent, max_items=None, items_only=False):
+        """Compact JSON of the analysis fields the agent uses"""
+        key = (agent, max_items, items_only)
+        if key not in self._payloads:
+            fields = AGENT_FIELDS.get(agent, tuple(self.chef_analysis))
+            if items_only:
+                fields = tuple(field for field in fields if field == "items")
+            parts = [f'"{field}":{self._fragment(field, agent, max_items)}' for field in fields]
+            self._payloads[key] = "{" + ",".join(parts) + "}"
+        return self._payloads[key]
+
+    def dumps(self, obj):
+        """Serialize any other prompt input (dietary or sides analysis) compactly"""
+        return dumps(obj)
+
+    def build_prompt(self, agent, render, static_text=""):
+        """Render an agent prompt around its compacted analysis.
+
+        ``render`` takes the serialized analysis and returns the prompt text.
+        Common indentation is stripped, and if the prompt (plus any cached
+        ``static_text`` sent ahead of it) is over the stage's input-token
+        budget the least confident items are dropped until it fits, or for
+        KEEP_ALL_ITEMS agents the descriptive fields are. Stages that lost
+        items are listed by ``trimmed_stages``.
+        """
+        budget = stage_input_budget(agent)
+        available = len(self._items(agent))
+        max_items = available
+        static_tokens = estimate_tokens(static_text)
+        items_only = False
+        while True:
+            prompt = textwrap.dedent(render(self.for_agent(agent, max_items, items_only))).strip()
+            tokens = static_tokens + estimate_tokens(prompt)
+            if not budget or tokens <= budget:
+                break
+            if agent in KEEP_ALL_ITEMS:
+                if items_only:
+                    break
+                items_only = True
+            elif max_items == 0:
+                break
+            else:
+                max_items -= 1
+
+        self.stats[agent] = {
+            "input_tokens_estimate": tokens,
+            "items_sent": max_items,
+            "items_below_confidence": len(self.chef_analysis.get("items", [])) - available,
+            "items_dropped": available - max_items,
+            "fields_dropped": items_only,
+        }
+        if budget and tokens > budget:
+            print(f"Warning: {agent} prompt is ~{tokens} tokens, over its {budget} token budget")
+        return prompt
+
+    def trimmed_stages(self):
+        """Agents whose prompt lost items to its token budget, so their answer
+        covers only part of the dish"""
+        return sorted(agent for agent, stats in self.stats.items() if stats["items_dropped"])
@@ -0,0 +1,132 @@
+import time
+import random
+import threading
+from app import config
+from app.circuit_breaker import breakers, CircuitOpenError
+
+# Error codes that mean "this region is busy", not "this request is bad":
+# the call is retried in the next best region
+FAILOVER_ERROR_CODES = {
+    "ThrottlingException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "InternalServerException",
+    "TooManyRequestsException",
+}
+
+def error_code(error):
+    """The AWS error code of a botocore ClientError (or a look-alike), else None"""
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code")
+
+class RegionHealth:
+    """EWMA latency and error rate of one region"""
+
+    def __init__(self, region, alpha):
+        self.region = region
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.failovers = 0
+        self.cooldown_until = 0.0
+
+    def record(self, latency=None, failed=False):
+        self.calls += 1
+        self.error_rate = (1 - self.alpha) * self.error_rate + self.alpha * (1.0 if failed else 0.0)
+        if latency is not None:
+            self.latency = latency if self.latency is None else (1 - self.alpha) * self.latency + self.alpha * latency
+
+    def score(self):
+        """Expected cost of a call here; lower is better. Unmeasured regions go first"""
+        if self.latency is None:
+            return 0.0
+        return self.latency * (1 + 4 * self.error_rate)
+
+class RegionClientPool:
+    """bedrock-runtime clients across several regions, used like a single client.
+
+    Each invoke_model call goes to the healthy region with the lowest EWMA
+    latency (weighted by its recent error rate). A throttled or unavailable
+    region is put in cooldown and the call fails over to the next region, as
+    does a call whose model has an open circuit breaker in that region.
+    A small share of calls probes other regions so their latency stays fresh.
+    """
+
+    def __init__(self, clients, alpha=0.2, cooldown_seconds=None, explore_rate=0.05, seed=None):
+        self.clients = dict(clients)
+        self.alpha = alpha
+        self.cooldown_seconds = config.BEDROCK_REGION_COOLDOWN if cooldown_seconds is None else cooldown_seconds
+        self.explore_rate = explore_rate
+        self.health = {region: RegionHealth(region, alpha) for region in self.clients}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_regions(cls, regions, client_factory, **kwargs):
+        return cls({region: client_factory(region) for region in regions}, **kwargs)
+
+    def ranked_regions(self):
+        """Regions in the order they should be tried for the next call"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [h for h in self.health.values() if h.cooldown_until <= now]
+            cooling = [h for h in self.health.values() if h.cooldown_until > now]
+            healthy.sort(key=lambda h: h.score())
+            if len(healthy) > 1 and self._random.random() < self.explore_rate:
+                probe = healthy.pop(self._random.randrange(1, len(healthy)))
+                healthy.insert(0, probe)
+            # Regions in cooldown are a last resort, soonest-available first
+            cooling.sort(key=lambda h: h.cooldown_until)
+        return [h.region for h in healthy + cooling]
+
+    def invoke_model(self, modelId, body, **kwargs):
+        return self._call("invoke_model", modelId=modelId, body=body, **kwargs)
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        # Only the time to open the stream counts towards the region's latency
+        return self._call("invoke_model_with_response_stream", modelId=modelId, body=body, **kwargs)
+
+    def _call(self, operation, **kwargs):
+        last_error = None
+        # A stream counts against the breaker until it is read to the end
+        through_breaker = breakers.stream if operation == "invoke_model_with_response_stream" else breakers.call
+        for region in self.ranked_regions():
+            health = self.health[region]
+            started = time.perf_counter()
+            client = self.clients[region]
+            try:
+                response = through_breaker(kwargs["modelId"], region, lambda: getattr(client, operation)(**kwargs))
+            except CircuitOpenError as e:
+                # The model is failing in this region; move on without waiting
+                last_error = e
+                continue
+            except Exception as e:
+                if error_code(e) not in FAILOVER_ERROR_CODES:
+                    raise
+                print(f"Bedrock region {region} unavailable ({error_code(e)}), failing over")
+                with self._lock:
+                    health.record(failed=True)
+                    health.failovers += 1
+                    health.cooldown_until = time.monotonic() + self.cooldown_seconds
+                last_error = e
+                continue
+            with self._lock:
+                health.record(latency=time.perf_counter() - started)
+            return response
+        raise last_error
+
+    def stats(self):
+        """Per-region call count, EWMA latency, error rate and failovers"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                region: {
+                    "calls": h.calls,
+                    "ewma_latency_ms": round(1000 * h.latency, 1) if h.latency is not None else None,
+                    "error_rate": round(h.error_rate, 3),
+                    "failovers": h.failovers,
+                    "cooling_down": h.cooldown_until > now
+                }
+                for region, h in self.health.items()
+            }
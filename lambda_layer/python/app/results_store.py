@@ -0,0 +1,448 @@
+import os
+import re
+import json
+import time
+import atexit
+import sqlite3
+import tempfile
+import threading
+from functools import lru_cache
+from app import config
+from app.ingredients import lemmatize
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dishes (
+    dish_id TEXT PRIMARY KEY,
+    restaurant TEXT NOT NULL,
+    restaurant_key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    processed_at TEXT NOT NULL,
+    dietary_checked INTEGER NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dishes_by_restaurant ON dishes (restaurant_key, name_key);
+CREATE INDEX IF NOT EXISTS dishes_by_name ON dishes (name_key);
+CREATE TABLE IF NOT EXISTS dish_allergens (
+    allergen TEXT NOT NULL,
+    dish_id TEXT NOT NULL,
+    potential INTEGER NOT NULL,
+    PRIMARY KEY (allergen, dish_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS dish_allergens_by_dish ON dish_allergens (dish_id, allergen);
+CREATE TABLE IF NOT EXISTS dish_tags (
+    tag TEXT NOT NULL,
+    dish_id TEXT NOT NULL,
+    PRIMARY KEY (tag, dish_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS dish_tags_by_dish ON dish_tags (dish_id, tag);
+"""
+
+# Bumped whenever rows_of derives different rows from the same result;
+# stores written by an older version are re-indexed when opened
+SCHEMA_VERSION = 1
+
+# Lemmatized allergen word or phrase -> the canonical allergens (the EU's 14,
+# under their usual names) it may mean. Umbrella terms name every allergen
+# they may cover: a bare "nut" may be a tree nut or a peanut
+ALLERGEN_TERMS = {
+    **dict.fromkeys(["gluten", "wheat", "barley", "rye", "oat", "spelt", "semolina", "farro", "kamut", "durum",
+                     "triticale", "seitan", "oat milk"], ("gluten",)),
+    **dict.fromkeys(["milk", "dairy", "lactose", "cheese", "butter", "buttermilk", "cream", "yogurt", "yoghurt",
+                     "whey", "casein", "ghee"], ("milk",)),
+    **dict.fromkeys(["egg", "albumen", "mayonnaise", "meringue"], ("egg",)),
+    **dict.fromkeys(["peanut", "groundnut", "peanut butter"], ("peanut",)),
+    **dict.fromkeys(["tree nut", "almond", "walnut", "cashew", "pecan", "pistachio", "hazelnut", "macadamia",
+                     "brazil nut", "pine nut", "almond milk"], ("tree nut",)),
+    **dict.fromkeys(["nut", "nut butter"], ("peanut", "tree nut")),
+    **dict.fromkeys(["soy", "soya", "soybean", "tofu", "edamame", "miso", "tempeh", "soy milk"], ("soy",)),
+    **dict.fromkeys(["fish", "anchovy", "salmon", "tuna", "cod", "haddock", "trout", "sardine", "mackerel", "halibut",
+                     "tilapia", "pollock", "swordfish", "snapper"], ("fish",)),
+    **dict.fromkeys(["crustacean", "shrimp", "prawn", "crab", "lobster", "crayfish", "langoustine", "scampi"],
+                    ("crustacean",)),
+    **dict.fromkeys(["mollusc", "mollusk", "clam", "mussel", "oyster", "scallop", "squid", "calamari", "octopus",
+                     "cuttlefish", "snail", "abalone"], ("mollusc",)),
+    "shellfish": ("crustacean", "mollusc"),
+    **dict.fromkeys(["sesame", "tahini"], ("sesame",)),
+    "mustard": ("mustard",),
+    **dict.fromkeys(["celery", "celeriac"], ("celery",)),
+    **dict.fromkeys(["lupin", "lupine"], ("lupin",)),
+    **dict.fromkeys(["sulphite", "sulfite", "sulphur dioxide", "sulfur dioxide"], ("sulphite",)),
+    # Phrases whose words alone would name an allergen they don't contain
+    "coconut milk": (), "cocoa butter": (), "cream of tartar": (),
+}
+
+@lru_cache(maxsize=65536)
+def key(text):
+    """Lookup key of a restaurant, dish name, allergen or tag: "Tree Nuts" and
+    "tree-nut" both become "tree nut" """
+    return " ".join(lemmatize(word) for word in _WORD.findall(text.lower()))
+
+@lru_cache(maxsize=65536)
+def allergen_keys(text):
+    """Canonical allergens named anywhere in an allergen's text, matched by
+    word or phrase: "Wheat/Gluten" -> ("gluten",), "Tree nuts (almonds,
+    walnuts)" -> ("tree nut",), "Nuts" -> ("peanut", "tree nut"). Text
+    naming none of them ("Corn", "Coconut milk") keeps its own key"""
+    words = key(text).split()
+    found = set()
+    i = 0
+    while i < len(words):
+        # Longest phrase first, so "peanut butter" is never read as butter
+        for length in (3, 2, 1):
+            phrase = " ".join(words[i:i + length])
+            if length <= len(words) - i and phrase in ALLERGEN_TERMS:
+                found.update(ALLERGEN_TERMS[phrase])
+                i += length
+                break
+        else:
+            i += 1
+    if found:
+        return tuple(sorted(found))
+    return (key(text),) if words else ()
+
+def dietary_checked(result):
+    """Whether a result's dietary analysis ran and its reply was parsed.
+
+    A dish whose analysis was skipped, or whose reply could not be parsed,
+    lists no allergens, which must not read as free of them.
+    """
+    return ("dietary_detective" not in result.get("skipped_stages", [])
+            and result.get("dietary_analysis", {}).get("parsed", True))
+
+def rows_of(result, restaurant=""):
+    """(dish row, allergen rows, tag rows) of a process_dish result"""
+    dish_id = result["dish_id"]
+    name = result.get("refined_name") or result.get("input_name", "")
+    dietary_analysis = result.get("dietary_analysis", {})
+    # allergen -> 1 if only potential, 0 if certain
+    allergens = {allergen: 1 for text in dietary_analysis.get("potential_allergens", [])
+                 for allergen in allergen_keys(text)}
+    allergens.update({allergen: 0 for text in dietary_analysis.get("allergens", []) for allergen in allergen_keys(text)})
+    dish = (dish_id, restaurant, key(restaurant), name, key(name), result.get("processed_timestamp", ""),
+            int(dietary_checked(result)), json.dumps(result))
+    allergen_rows = [(allergen, dish_id, potential) for allergen, potential in allergens.items() if allergen]
+    tag_rows = [(tag, dish_id) for tag in {key(tag) for tag in dietary_analysis.get("dietary_tags", [])} if tag]
+    return dish, allergen_rows, tag_rows
+
+class ResultsStore:
+    """Processed dish results in a local SQLite database, indexed for menu queries.
+
+    Results are queued by ``add`` and written in one transaction per batch of
+    ``batch_size``, or ``flush_seconds`` after the first one queued. Allergens
+    and dietary tags live in their own tables keyed by (allergen or tag,
+    dish), so "gluten-free dishes without nuts at restaurant X" is a few
+    index lookups however many dishes are stored.
+
+    With ``s3_key`` set, ``sync`` merges the copy in S3_BUCKET into the
+    local database and uploads the result, so stores in several processes
+    converge; it runs on open and at most every RESULTS_STORE_SYNC_SECONDS
+    after a write. Callbacks registered with ``on_merge`` get the rows_of
+    rows of every dish a sync brings in.
+    """
+
+    def __init__(self, path=None, batch_size=None, flush_seconds=None, s3_key=None):
+        self.path = path or config.RESULTS_STORE_PATH
+        self.batch_size = batch_size or config.RESULTS_STORE_BATCH_SIZE
+        self.flush_seconds = config.RESULTS_STORE_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.s3_key = s3_key
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._reindex()
+        self._pending = []
+        self._pending_since = None
+        self._last_sync = 0.0
+        self._unsynced = False
+        self._stats = {"flushes": 0, "written": 0, "flush_seconds": 0.0, "queries": 0, "query_seconds": 0.0,
+                       "syncs": 0}
+        self._merge_callbacks = []
+        self._wake = threading.Event()
+        self._closed = False
+        if self.s3_key:
+            self.sync()
+        self._flusher = threading.Thread(target=self._flush_loop, name="results-store-flusher", daemon=True)
+        self._flusher.start()
+
+    def add(self, result, restaurant=""):
+        """Queue a process_dish result for the next batched write"""
+        self.add_many([result], restaurant)
+
+    def add_many(self, results, restaurant=""):
+        rows = [rows_of(result, restaurant) for result in results if "dish_id" in result]
+        with self._lock:
+            self._pending.extend(rows)
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+        else:
+            self._wake.set()
+
+    def _write(self, rows):
+        """Write rows_of rows in one transaction; the caller holds the lock"""
+        with self._conn:
+            dish_ids = [(dish[0],) for dish, _, _ in rows]
+            # A re-processed dish replaces its old allergens and tags
+            self._conn.executemany("DELETE FROM dish_allergens WHERE dish_id = ?", dish_ids)
+            self._conn.executemany("DELETE FROM dish_tags WHERE dish_id = ?", dish_ids)
+            self._conn.executemany("INSERT OR REPLACE INTO dishes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   [dish for dish, _, _ in rows])
+            self._conn.executemany("INSERT OR REPLACE INTO dish_allergens VALUES (?, ?, ?)",
+                                   [row for _, allergen_rows, _ in rows for row in allergen_rows])
+            self._conn.executemany("INSERT OR REPLACE INTO dish_tags VALUES (?, ?)",
+                                   [row for _, _, tag_rows in rows for row in tag_rows])
+
+    def _reindex(self):
+        """Derive every dish's rows again from its stored result (see SCHEMA_VERSION)"""
+        with self._lock:
+            rows = [rows_of(json.loads(result), restaurant)
+                    for restaurant, result in self._conn.execute("SELECT restaurant, result FROM dishes ORDER BY rowid")]
+            self._write(rows)
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def flush(self):
+        """Write every queued result now"""
+        with self._lock:
+            rows, self._pending, self._pending_since = self._pending, [], None
+            if rows:
+                started = time.perf_counter()
+                self._write(rows)
+                self._unsynced = True
+                self._stats["flushes"] += 1
+                self._stats["written"] += len(rows)
+                self._stats["flush_seconds"] += time.perf_counter() - started
+        if rows and self.s3_key and time.monotonic() - self._last_sync >= config.RESULTS_STORE_SYNC_SECONDS:
+            self.sync()
+
+    def persist(self):
+        """Write every queued result and, with ``s3_key``, upload any not yet
+        synced, without waiting for the flusher thread or the sync interval"""
+        self.flush()
+        if self.s3_key and self._unsynced:
+            self.sync()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_seconds or None)
+            self._wake.clear()
+            with self._lock:
+                since = self._pending_since
+            if since is not None:
+                delay = since + self.flush_seconds - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Error writing results store: {str(e)}")
+
+    def find(self, restaurant=None, tags=(), free_of=(), name=None, allow_potential=False, limit=100):
+        """Stored results matching every filter, by name.
+
+        ``tags`` are dietary tags every dish must have ("gluten-free"),
+        ``free_of`` allergens no dish may list ("tree nuts", "peanuts"), as
+        certain or, unless ``allow_potential``, as potential allergens, both
+        matched as canonical allergens (see allergen_keys); dishes whose
+        dietary analysis was skipped or unparseable never count as free of
+        anything.
+        ``name`` matches the start of the refined dish name.
+        """
+        self.flush()
+        sql = ["SELECT result FROM dishes d WHERE 1 = 1"]
+        params = []
+        if restaurant is not None:
+            sql.append("AND d.restaurant_key = ?")
+            params.append(key(restaurant))
+        if name:
+            # A prefix range keeps the name index usable
+            sql.append("AND d.name_key >= ? AND d.name_key < ?")
+            params += [key(name), key(name) + "\uffff"]
+        for tag in tags:
+            sql.append("AND EXISTS (SELECT 1 FROM dish_tags t WHERE t.tag = ? AND t.dish_id = d.dish_id)")
+            params.append(key(tag))
+        if free_of:
+            allergens = sorted({allergen for text in free_of for allergen in allergen_keys(text)})
+            sql.append("AND d.dietary_checked = 1")
+            sql.append(f"AND NOT EXISTS (SELECT 1 FROM dish_allergens a WHERE a.dish_id = d.dish_id "
+                       f"AND a.allergen IN ({', '.join('?' * len(allergens))})"
+                       f"{' AND a.potential = 0' if allow_potential else ''})")
+            params += allergens
+        sql.append("ORDER BY d.name_key LIMIT ?")
+        params.append(limit)
+        started = time.perf_counter()
+        with self._lock:
+            rows = self._conn.execute(" ".join(sql), params).fetchall()
+            self._stats["queries"] += 1
+            self._stats["query_seconds"] += time.perf_counter() - started
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, dish_id):
+        self.flush()
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM dishes WHERE dish_id = ?", (dish_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, dish_ids):
+        """Stored results of the given dishes, in the order given"""
+        self.flush()
+        found = {}
+        with self._lock:
+            for start in range(0, len(dish_ids), 500):
+                chunk = dish_ids[start:start + 500]
+                found.update(self._conn.execute(
+                    f"SELECT dish_id, result FROM dishes WHERE dish_id IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        return [json.loads(found[dish_id]) for dish_id in dish_ids if dish_id in found]
+
+    def iter_results(self, restaurant=None, page_size=500):
+        """(restaurant, result) of every stored dish, or every dish of one
+        restaurant, by restaurant then name.
+
+        Results are read a page of ``page_size`` at a time, each page starting
+        after the last row of the one before, so memory stays flat however
+        many dishes there are and writes can go on between pages.
+        """
+        self.flush()
+        sql = "SELECT restaurant_key, name_key, rowid, restaurant, result FROM dishes"
+        if restaurant is not None:
+            sql += " WHERE restaurant_key = ? AND (restaurant_key, name_key, rowid) > (?, ?, ?)"
+        else:
+            sql += " WHERE (restaurant_key, name_key, rowid) > (?, ?, ?)"
+        sql += " ORDER BY restaurant_key, name_key, rowid LIMIT ?"
+        last = ("", "", -1)
+        while True:
+            params = ((key(restaurant),) if restaurant is not None else ()) + last + (page_size,)
+            with self._lock:
+                rows = self._conn.execute(sql, params).fetchall()
+            for row in rows:
+                yield row[3], json.loads(row[4])
+            if len(rows) < page_size:
+                return
+            last = rows[-1][:3]
+
+    def index_rows(self):
+        """(dish rows, allergen rows, tag rows) of every stored dish, for building a MenuIndex"""
+        self.flush()
+        with self._lock:
+            dishes = self._conn.execute("SELECT dish_id, restaurant_key, dietary_checked FROM dishes ORDER BY rowid").fetchall()
+            allergens = self._conn.execute("SELECT allergen, dish_id, potential FROM dish_allergens").fetchall()
+            tags = self._conn.execute("SELECT tag, dish_id FROM dish_tags").fetchall()
+        return dishes, allergens, tags
+
+    def restaurants(self):
+        self.flush()
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT restaurant FROM dishes ORDER BY restaurant")]
+
+    def __len__(self):
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM dishes").fetchone()[0]
+
+    def on_merge(self, callback):
+        """Call callback(rows) with the rows_of rows of the dishes each sync merges in"""
+        with self._lock:
+            self._merge_callbacks.append(callback)
+
+    def sync(self):
+        """Merge the S3 copy into the local database, then upload the merged database"""
+        import boto3
+        from botocore.exceptions import ClientError
+        s3_client = boto3.client('s3')
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, remote_path = tempfile.mkstemp(suffix=".sqlite", dir=directory)
+            os.close(fd)
+            try:
+                s3_client.download_file(config.S3_BUCKET, self.s3_key, remote_path)
+                with self._lock:
+                    self._conn.execute("ATTACH DATABASE ? AS remote", (remote_path,))
+                    try:
+                        # Rows are derived again here, as the copy may come
+                        # from an older version of rows_of
+                        merged = self._conn.execute(
+                            "SELECT restaurant, result FROM remote.dishes WHERE dish_id NOT IN "
+                            "(SELECT dish_id FROM main.dishes) ORDER BY rowid"
+                        ).fetchall()
+                    finally:
+                        self._conn.execute("DETACH DATABASE remote")
+                    merged = [rows_of(json.loads(result), restaurant) for restaurant, result in merged]
+                    self._write(merged)
+                    callbacks = list(self._merge_callbacks)
+                if merged:
+                    for callback in callbacks:
+                        callback(merged)
+            except ClientError as e:
+                # Nothing uploaded yet
+                if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey"):
+                    raise
+            finally:
+                os.remove(remote_path)
+
+            # Upload a consistent snapshot rather than the live WAL database
+            fd, snapshot_path = tempfile.mkstemp(suffix=".sqlite", dir=directory)
+            os.close(fd)
+            try:
+                snapshot = sqlite3.connect(snapshot_path)
+                with self._lock:
+                    self._conn.backup(snapshot)
+                snapshot.close()
+                s3_client.upload_file(snapshot_path, config.S3_BUCKET, self.s3_key)
+            finally:
+                os.remove(snapshot_path)
+            self._last_sync = time.monotonic()
+            with self._lock:
+                self._unsynced = False
+                self._stats["syncs"] += 1
+        except Exception as e:
+            print(f"Error syncing results store: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, pending=len(self._pending))
+        flush_seconds, query_seconds = stats.pop("flush_seconds"), stats.pop("query_seconds")
+        stats["avg_flush_ms"] = round(flush_seconds * 1000 / stats["flushes"], 2) if stats["flushes"] else 0.0
+        stats["avg_query_ms"] = round(query_seconds * 1000 / stats["queries"], 3) if stats["queries"] else 0.0
+        return stats
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """The process-wide store at RESULTS_STORE_PATH, or None when disabled"""
+    global _store
+    if not config.RESULTS_STORE_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ResultsStore(s3_key=config.RESULTS_STORE_S3_KEY if config.RESULTS_STORE_S3_SYNC else None)
+            # Queued results are written before the process exits
+            atexit.register(_store.flush)
+        return _store
+
+def persist():
+    """Persist the process-wide store, if one is open (see ResultsStore.persist).
+
+    Called at the end of each Lambda invocation: a frozen or recycled
+    container runs neither the flusher thread nor atexit hooks.
+    """
+    if _store is not None:
+        _store.persist()
+
+def stats():
+    return _store.stats() if _store is not None else {}
@@ -0,0 +1,361 @@
+import os
+import re
+import json
+import zlib
+import time
+import threading
+import numpy as np
+from app import config
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Menu filler that says nothing about what the dish is
+FILLER_WORDS = {"the", "our", "classic", "house", "signature", "special", "homemade", "famous", "original", "traditional"}
+
+def _hashed(features, dim):
+    """Signed feature hashing of a list of string features into a unit vector"""
+    counts = [0.0] * dim
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        counts[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    vector = np.array(counts, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def name_features(dish_name):
+    """Character trigrams of the name without filler words or spaces, so
+    'House Cheese Burger' matches 'Classic Cheeseburger'"""
+    joined = "".join(word for word in _WORD.findall(dish_name.lower()) if word not in FILLER_WORDS)
+    return [joined[i:i + 3] for i in range(max(len(joined) - 2, 1))]
+
+def ingredient_features(ingredients):
+    """Whole ingredient names plus their words, order-independent"""
+    features = []
+    for ingredient in sorted({" ".join(_WORD.findall(i.lower())) for i in ingredients}):
+        features.append("i:" + ingredient)
+        features.extend("w:" + word for word in ingredient.split())
+    return features
+
+def ingredients_of(chef_analysis):
+    """Canonical ids of the analysis items (see ingredients.normalize_items), or
+    their text, each once"""
+    return list(dict.fromkeys(item.get("ingredient_id") or item["item"]
+                              for item in chef_analysis.get("items", []) if item.get("item")))
+
+def vectorize(dish_name, ingredients, dim=None, name_weight=None):
+    """Embed a dish as [name trigrams | ingredients] so cosine = weighted mix of both similarities"""
+    dim = dim or config.SEMANTIC_CACHE_DIM
+    name_weight = config.SEMANTIC_CACHE_NAME_WEIGHT if name_weight is None else name_weight
+    half = dim // 2
+    return np.concatenate([
+        np.sqrt(name_weight) * _hashed(name_features(dish_name), half),
+        np.sqrt(1 - name_weight) * _hashed(ingredient_features(ingredients), dim - half),
+    ]).astype(np.float32)
+
+class SemanticCache:
+    """Stage results of earlier dishes, looked up by dish similarity.
+
+    Each entry is a dish vector (see ``vectorize``, stored quantized to int8)
+    and the JSON results worth reusing for it. Vectors, LSH bucket ids and
+    payload offsets live in memory-mapped files under ``directory`` that grow by doubling, so an index
+    of a million entries costs little resident memory and survives restarts.
+
+    A lookup hashes the query with ``tables`` random-hyperplane LSH tables of
+    ``bits`` bits each, probes its bucket and the buckets one flip away of
+    its ``probe_bits`` least certain bits in each table (binary search over
+    per-table sorted bucket ids, bucket match in the entries written since
+    the last re-index), and re-ranks each query's candidates by exact cosine.
+    Probing is vectorized over the whole batch of queries: one binary search
+    over a single key array of all tables.
+
+    One process should write to a directory at a time.
+    """
+
+    def __init__(self, directory=None, dim=None, threshold=None, tables=10, bits=24, seed=0, reindex_every=4096,
+                 probe_bits=4):
+        self.directory = directory or config.SEMANTIC_CACHE_DIR
+        self.threshold = config.SEMANTIC_CACHE_THRESHOLD if threshold is None else threshold
+        self.reindex_every = reindex_every
+        self.probe_bits = probe_bits
+        os.makedirs(self.directory, exist_ok=True)
+
+        meta = self._read_meta()
+        if meta is None:
+            meta = {"dim": dim or config.SEMANTIC_CACHE_DIM, "tables": tables, "bits": bits, "seed": seed,
+                    "count": 0, "capacity": 0, "indexed": 0}
+        self.meta = meta
+        self.dim, self.tables, self.bits = meta["dim"], meta["tables"], meta["bits"]
+        rng = np.random.default_rng(meta["seed"])
+        self._planes = rng.standard_normal((self.dim, self.tables * self.bits)).astype(np.float32)
+        self._weights = (1 << np.arange(self.bits)).astype(np.uint32)
+        # Table number in the high bits, so all tables share one sorted key array
+        self._table_keys = (np.arange(self.tables, dtype=np.uint64) << np.uint64(self.bits))[:, None]
+
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "adds": 0, "candidates": 0, "lookup_seconds": 0.0}
+        self._open_arrays(max(meta["capacity"], 1024))
+        self._payloads = open(self._path("payloads.jsonl"), "ab+")
+        self._load_index()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._path("meta.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_meta(self):
+        tmp_path = self._path("meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self._path("meta.json"))
+
+    def _memmap(self, name, dtype, shape):
+        path = self._path(name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _open_arrays(self, capacity):
+        self._vectors = self._memmap("vectors.i8", np.int8, (capacity, self.dim))
+        self._buckets = self._memmap("buckets.u32", np.uint32, (capacity, self.tables))
+        self._offsets = self._memmap("offsets.i64", np.int64, (capacity, 2))
+        # Plain ndarray views for reads; memmap indexing adds overhead per call
+        self._vector_rows = self._vectors.view(np.ndarray)
+        self._offset_rows = self._offsets.view(np.ndarray)
+        self.meta["capacity"] = capacity
+
+    def _load_index(self):
+        if self.meta["indexed"]:
+            # Plain views of the mappings; memmap slicing is slow in the probe loop
+            self._order = np.asarray(np.load(self._path("order.npy"), mmap_mode="r"))
+            self._sorted = np.asarray(np.load(self._path("sorted.npy"), mmap_mode="r"))
+        else:
+            self._order = np.zeros(0, dtype=np.int32)
+            self._sorted = np.zeros(0, dtype=np.uint64)
+
+    def _bucket_ids(self, vectors):
+        """LSH bucket id of each vector in each table, shape (n, tables)"""
+        signs = (vectors @ self._planes > 0).reshape(len(vectors), self.tables, self.bits)
+        return (signs * self._weights).sum(axis=2, dtype=np.uint32)
+
+    def _probes(self, vectors):
+        """Keys of the buckets to probe for each query, shape (n, tables, probe_bits + 1):
+        its own bucket in each table, then the buckets one flip away of the
+        ``probe_bits`` bits whose hyperplanes it lies closest to (the likeliest
+        to differ for a near-duplicate)"""
+        projections = (vectors @ self._planes).reshape(len(vectors), self.tables, self.bits)
+        buckets = ((projections > 0) * self._weights).sum(axis=2, dtype=np.uint32)
+        closest = np.argpartition(np.abs(projections), self.probe_bits - 1, axis=2)[:, :, :self.probe_bits]
+        flips = np.concatenate([np.zeros(closest.shape[:2] + (1,), dtype=np.uint64),
+                                np.uint64(1) << closest.astype(np.uint64)], axis=2)
+        return (buckets.astype(np.uint64) | self._table_keys.T)[:, :, None] ^ flips
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def add_many(self, entries):
+        """Store (dish_name, ingredients, results) entries; return their row ids"""
+        if not entries:
+            return []
+        vectors = np.stack([vectorize(name, ingredients, self.dim) for name, ingredients, _ in entries])
+        payloads = [json.dumps({"dish_name": name, "results": results}).encode("utf-8") + b"\n"
+                    for name, _, results in entries]
+        with self._lock:
+            start = self.meta["count"]
+            end = start + len(entries)
+            if end > self.meta["capacity"]:
+                self._flush()
+                capacity = self.meta["capacity"]
+                while capacity < end:
+                    capacity *= 2
+                self._open_arrays(capacity)
+
+            self._vectors[start:end] = np.round(vectors * 127)
+            self._buckets[start:end] = self._bucket_ids(vectors)
+            self._payloads.seek(0, os.SEEK_END)
+            offset = self._payloads.tell()
+            for row, payload in enumerate(payloads, start):
+                self._offsets[row] = (offset, len(payload))
+                offset += len(payload)
+            self._payloads.write(b"".join(payloads))
+
+            self.meta["count"] = end
+            self._stats["adds"] += len(entries)
+            if end - self.meta["indexed"] >= self.reindex_every:
+                self._reindex()
+            self._flush()
+        return list(range(start, end))
+
+    def add(self, dish_name, ingredients, results):
+        return self.add_many([(dish_name, ingredients, results)])[0]
+
+    def _reindex(self):
+        """Sort the (table, bucket id) keys of every entry so lookups can binary-search them"""
+        count = self.meta["count"]
+        keys = (np.asarray(self._buckets[:count]).T.astype(np.uint64) | self._table_keys).ravel()
+        order = np.argsort(keys, kind="stable")
+        for name, array in (("order.npy", (order % max(count, 1)).astype(np.int32)), ("sorted.npy", keys[order])):
+            tmp_path = self._path(name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, self._path(name))
+        self.meta["indexed"] = count
+        self._load_index()
+
+    def _flush(self):
+        self._vectors.flush()
+        self._buckets.flush()
+        self._offsets.flush()
+        self._payloads.flush()
+        self._write_meta()
+
+    def _candidates(self, vectors):
+        """Candidate rows for each query: the entries in its probed buckets,
+        binary-searched in the index and matched directly in the unindexed tail"""
+        probes = self._probes(vectors).reshape(len(vectors), -1)
+        keys = probes.ravel()
+        # In ascending order each binary search starts where the last one
+        # ended, so the probes touch far fewer pages of the sorted keys
+        order = np.argsort(keys)
+        lo, hi = np.empty_like(order), np.empty_like(order)
+        lo[order] = np.searchsorted(self._sorted, keys[order], side="left")
+        hi[order] = np.searchsorted(self._sorted, keys[order], side="right")
+        lengths = hi - lo
+        # Expand every [lo, hi) range at once instead of slicing bucket by bucket
+        ends = np.cumsum(lengths)
+        positions = np.repeat(lo - (ends - lengths), lengths) + np.arange(ends[-1] if len(ends) else 0)
+        rows = self._order[positions]
+        per_query = np.add.reduceat(lengths, np.arange(0, len(lengths), probes.shape[1])) if len(lengths) else []
+        candidates = np.split(rows, np.cumsum(per_query)[:-1])
+
+        indexed, count = self.meta["indexed"], self.meta["count"]
+        if count > indexed:
+            tail_keys = np.asarray(self._buckets[indexed:count]).astype(np.uint64) | self._table_keys.T
+            for i, part in enumerate(candidates):
+                tail = np.flatnonzero(np.isin(tail_keys, probes[i]).any(axis=1)).astype(np.int32) + indexed
+                candidates[i] = np.concatenate([tail, part])
+        return [np.unique(part) for part in candidates]
+
+    def lookup_many(self, queries):
+        """Best stored match for each (dish_name, ingredients) query.
+
+        Returns a list of (results, similarity) pairs; results is None when
+        nothing reaches the threshold.
+        """
+        if not queries:
+            return []
+        started = time.perf_counter()
+        vectors = np.stack([vectorize(name, ingredients, self.dim) for name, ingredients in queries])
+        matches = [(None, 0.0)] * len(queries)
+        with self._lock:
+            if self.meta["count"]:
+                candidates = self._candidates(vectors)
+                for i, rows in enumerate(candidates):
+                    if not len(rows):
+                        continue
+                    # Matrix-vector re-rank per query keeps the working set in cache
+                    scores = self._vector_rows[rows].astype(np.float32) @ (vectors[i] / 127)
+                    best = int(scores.argmax())
+                    if scores[best] >= self.threshold:
+                        matches[i] = (self._payload(int(rows[best]))["results"], float(scores[best]))
+                    self._stats["candidates"] += len(rows)
+            self._stats["lookups"] += len(queries)
+            self._stats["hits"] += sum(1 for results, _ in matches if results is not None)
+            self._stats["lookup_seconds"] += time.perf_counter() - started
+        return matches
+
+    def lookup(self, dish_name, ingredients):
+        return self.lookup_many([(dish_name, ingredients)])[0]
+
+    def _payload(self, row):
+        offset, length = self._offset_rows[row]
+        self._payloads.seek(int(offset))
+        return json.loads(self._payloads.read(int(length)))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=self.meta["count"], threshold=self.threshold)
+        lookups = stats["lookups"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["avg_lookup_ms"] = round(1000 * stats.pop("lookup_seconds") / lookups, 3) if lookups else 0.0
+        return stats
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """The process-wide cache in SEMANTIC_CACHE_DIR, or None when disabled"""
+    global _cache
+    if not config.SEMANTIC_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+        return _cache
+
+def stats():
+    return _cache.stats() if _cache is not None else {}
+
+def _reusable(results, dish_name, ingredients):
+    """Turn a cached entry's results into stage results for this dish.
+
+    A dietary analysis is only reused (with SEMANTIC_CACHE_REUSE_DIETARY) for
+    exactly the ingredients it was made for: a similar dish may differ by the
+    one ingredient that carries an allergen.
+    """
+    reused = {}
+    if "authenticator" in results:
+        # Only plain confirmations are stored: confirm this dish under its own name
+        reused["authenticator"] = {"validation_status": "Confirmed", "reason": "", "suggested_name": dish_name}
+    dietary = results.get("dietary_detective")
+    if (config.SEMANTIC_CACHE_REUSE_DIETARY and dietary and "ingredients" in dietary
+            and dietary["ingredients"] == sorted(set(ingredients))):
+        reused["dietary_detective"] = dietary["analysis"]
+    return reused
+
+def reusable_results_many(dishes):
+    """Reusable {stage: result} for each (dish_name, chef_analysis), looked up as one batch"""
+    cache = get_cache()
+    if cache is None or not dishes:
+        return [{} for _ in dishes]
+    queries = [(dish_name, ingredients_of(chef_analysis)) for dish_name, chef_analysis in dishes]
+    return [
+        _reusable(results, dish_name, ingredients) if results is not None else {}
+        for (dish_name, ingredients), (results, _) in zip(queries, cache.lookup_many(queries))
+    ]
+
+def reusable_results(dish_name, chef_analysis):
+    return reusable_results_many([(dish_name, chef_analysis)])[0]
+
+def remember_many(dishes):
+    """Store freshly computed stage results of (dish_name, chef_analysis, {stage: result}) dishes.
+
+    A validation is only kept when it confirmed the name as given, and a
+    dietary analysis only when it found something (an empty one may be a
+    parse fallback), along with the ingredient set it was made for.
+    """
+    cache = get_cache()
+    if cache is None:
+        return
+    entries = []
+    for dish_name, chef_analysis, fresh in dishes:
+        results = {}
+        auth_result = fresh.get("authenticator")
+        if auth_result and auth_result.get("validation_status") == "Confirmed" and auth_result.get("suggested_name") == dish_name:
+            results["authenticator"] = {"validation_status": "Confirmed"}
+        ingredients = ingredients_of(chef_analysis)
+        dietary_analysis = fresh.get("dietary_detective")
+        if dietary_analysis and (dietary_analysis.get("allergens") or dietary_analysis.get("dietary_tags")):
+            results["dietary_detective"] = {"ingredients": sorted(set(ingredients)), "analysis": dietary_analysis}
+        if results:
+            entries.append((dish_name, ingredients, results))
+    cache.add_many(entries)
+
+def remember(dish_name, chef_analysis, fresh):
+    remember_many([(dish_name, chef_analysis, fresh)])
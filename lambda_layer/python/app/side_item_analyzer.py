@@ -1,6 +1,34 @@
 import json
-import base64
-from app.bedrock_utils import get_bedrock_client
+import textwrap
+from app.prompt_compaction import PromptCompactor
+from app.prompt_cache import CACHE_POINT
+from app.bedrock_utils import get_bedrock_client, build_image_block, invoke_nova
+
+# Instructions shared by every dish; sent ahead of the image so they can be cached
+SIDE_ITEM_INSTRUCTIONS = textwrap.dedent("""
+    You will be given a food image, its dish name and the chef's analysis of its components after these instructions.
+    
+    Please identify:
+    1. Which items are likely part of the main dish
+    2. Which items appear to be side dishes or accompaniments
+    3. Any sauces, garnishes, or condiments
+    4. How the sides complement the main dish
+    
+    Format your response as a JSON object with the following structure:
+    {
+        "main_dish_components": ["item1", "item2", ...],
+        "side_items": [
+            {
+                "name": "side item name",
+                "description": "brief description",
+                "confidence": 0.XX
+            },
+            ...
+        ],
+        "sauces_and_garnishes": ["item1", "item2", ...],
+        "presentation_notes": "how sides are arranged relative to main dish"
+    }
+""").strip()
 
 class SideItemAnalyzerAgent:
     """Analyzes the image to identify side items and accompaniments"""
@@ -8,59 +36,47 @@ class SideItemAnalyzerAgent:
     def __init__(self, bedrock_client=None):
         self.bedrock_client = bedrock_client or get_bedrock_client()
     
-    def analyze_sides(self, dish_name, image_bytes, chef_analysis):
+    def analyze_sides(self, dish_name, image_bytes, chef_analysis, image_uri=None, compactor=None):
         """Identify side items and accompaniments in the dish"""
-        # Encode image as base64
-        base64_string = base64.b64encode(image_bytes).decode('utf-8')
+        request_body = self.build_request(dish_name, image_bytes, chef_analysis, image_uri, compactor)
+        
+        # Call the Bedrock API
+        result_text = invoke_nova(self.bedrock_client, request_body, "side_item_analyzer")
+        
+        return self.parse_response(result_text)
+    
+    def build_request(self, dish_name, image_bytes, chef_analysis, image_uri=None, compactor=None):
+        """Build the Nova request payload for a side item analysis"""
+        # Reference the stored image by URI when possible, otherwise inline it
+        image_block = build_image_block(image_bytes, image_uri)
         
-        # Define system prompt
+        # Define system prompt; it and the instructions are identical for
+        # every dish, so both end in a prompt-cache checkpoint
         system_list = [{
             "text": "You are the Side Item Analyzer, a culinary expert specializing in identifying accompaniments and side dishes. "
                     "Your task is to carefully examine food images and distinguish between the main dish and its accompanying sides. "
                     "Provide detailed analysis of garnishes, sauces, and complementary items that enhance the main dish."
-        }]
+        }, CACHE_POINT]
         
-        # Convert chef analysis to a string representation
-        chef_analysis_str = json.dumps(chef_analysis, indent=2)
+        # Serialize only the fields this stage uses, without pretty-print whitespace
+        compactor = compactor or PromptCompactor(chef_analysis)
         
-        # Define user message with image and text
-        prompt_text = f"""
+        # Define user message: static instructions first, then the image and this dish
+        prompt_text = compactor.build_prompt("side_item_analyzer", lambda chef_analysis_str: f"""
         Analyze this image of "{dish_name}" and identify all side items and accompaniments.
         
         Chef's Analysis:
         {chef_analysis_str}
-        
-        Please identify:
-        1. Which items are likely part of the main dish
-        2. Which items appear to be side dishes or accompaniments
-        3. Any sauces, garnishes, or condiments
-        4. How the sides complement the main dish
-        
-        Format your response as a JSON object with the following structure:
-        {{
-            "main_dish_components": ["item1", "item2", ...],
-            "side_items": [
-                {{
-                    "name": "side item name",
-                    "description": "brief description",
-                    "confidence": 0.XX
-                }},
-                ...
-            ],
-            "sauces_and_garnishes": ["item1", "item2", ...],
-            "presentation_notes": "how sides are arranged relative to main dish"
-        }}
-        """
+        """, static_text=SIDE_ITEM_INSTRUCTIONS)
         
         message_list = [{
             "role": "user",
             "content": [
                 {
-                    "image": {
-                        "format": "jpeg",
-                        "source": {"bytes": base64_string}
-                    }
+                    "text": SIDE_ITEM_INSTRUCTIONS
                 },
+                CACHE_POINT,
+                image_block,
                 {
                     "text": prompt_text
                 }
@@ -83,16 +99,10 @@ class SideItemAnalyzerAgent:
             "inferenceConfig": inf_params
         }
         
-        # Call the Bedrock API
-        response = self.bedrock_client.invoke_model(
-            modelId="us.amazon.nova-pro-v1:0",
-            body=json.dumps(request_body)
-        )
-        
-        # Parse the response
-        response_body = json.loads(response['body'].read())
-        result_text = response_body["output"]["message"]["content"][0]["text"]
-        
+        return request_body
+    
+    def parse_response(self, result_text):
+        """Parse a side item analysis reply, falling back to an empty analysis"""
         # Extract JSON from the response
         try:
             # Find JSON content between triple backticks if present
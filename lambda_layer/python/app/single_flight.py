@@ -0,0 +1,65 @@
+import copy
+import hashlib
+import threading
+from concurrent.futures import Future
+
+_groups = {}
+
+def digest(*parts):
+    """Stable sha256 hex digest of bytes/str parts, for use in flight keys"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, (bytes, bytearray, memoryview)) else str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def stats():
+    """Call and coalesced counters for every SingleFlight group"""
+    return {name: group.stats() for name, group in _groups.items()}
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for the same result instead of repeating the work.
+    Nothing is cached once the call finishes.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "coalesced": 0}
+        _groups[name] = self
+
+    def do(self, key, fn):
+        """Run fn() once per in-flight key; return (result, shared)"""
+        with self._lock:
+            self._stats["calls"] += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            # Waiters get their own copy so they can't mutate each other's result
+            return copy.deepcopy(future.result()), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+        future.set_result(result)
+        return result, False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, in_flight=len(self._in_flight))
+        return stats
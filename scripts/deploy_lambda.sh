@@ -14,7 +14,7 @@ echo "Copying only necessary files..."
 
 # Copy only the essential Python files needed for the Lambda function
 mkdir -p lambda_layer_temp/python/app
-cp app/authenticator.py app/bedrock_utils.py app/config.py app/culinary_wordsmith.py app/dietary_detective.py app/side_item_analyzer.py app/storage.py app/visionary_chef.py lambda_layer_temp/python/app/
+cp app/authenticator.py app/bedrock_utils.py app/budget.py app/bulk_inference.py app/circuit_breaker.py app/config.py app/culinary_wordsmith.py app/dietary_detective.py app/hedging.py app/image_quality.py app/ingredients.py app/menu_export.py app/menu_index.py app/model_routing.py app/orchestrator.py app/plate_splitter.py app/prompt_cache.py app/prompt_compaction.py app/region_pool.py app/results_store.py app/semantic_cache.py app/side_item_analyzer.py app/single_flight.py app/storage.py app/vision_cache.py app/visionary_chef.py lambda_layer_temp/python/app/
 touch lambda_layer_temp/python/app/__init__.py
 
 # Create a minimal requirements.txt for Lambda